@@ -0,0 +1,167 @@
+import math
+import os
+import threading
+import time
+from collections import deque
+
+# STT admission settings. Limits apply per process: with several web servers and
+# workers sharing one quota, give each its share.
+STT_RATE_LIMIT = float(os.getenv('STT_RATE_LIMIT', '0'))  # Recognizer calls started per second (0 = unlimited)
+STT_BURST = int(os.getenv('STT_BURST', '10'))  # Calls that may start back to back after a quiet spell
+STT_ADMISSION_TIMEOUT = float(os.getenv('STT_ADMISSION_TIMEOUT', '10'))  # Seconds a chunk may wait for its turn
+STT_MAX_BACKLOG = int(os.getenv('STT_MAX_BACKLOG', '200'))  # Chunks waiting for a recognizer before new work is refused
+STT_BREAKER_WINDOW = int(os.getenv('STT_BREAKER_WINDOW', '20'))  # Recent calls the error rate is measured over
+STT_BREAKER_ERROR_RATE = float(os.getenv('STT_BREAKER_ERROR_RATE', '0.5'))  # Error rate that opens the circuit
+STT_BREAKER_COOLDOWN = float(os.getenv('STT_BREAKER_COOLDOWN', '30'))  # Seconds the circuit stays open
+DEFAULT_RETRY_AFTER = 5  # Seconds suggested to clients when nothing better is known
+
+# Circuit states
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'  # One trial call is let through to see if the service is back
+
+# Admission control in front of the speech recognizer: a token bucket keeps calls
+# under the provider's rate limit, a circuit breaker stops calling it while most
+# calls fail, and the backlog of queued chunks decides when new recordings are
+# refused outright. Concurrency is already bounded by the shared STT pool
+# (STT_MAX_WORKERS in transcription.py).
+
+
+# Raised instead of calling the recognizer when it must not be called now
+class Overloaded(Exception):
+    def __init__(self, message, retry_after=DEFAULT_RETRY_AFTER, reason='overloaded'):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+# Rate limiter allowing rate calls per second on average and burst back to back
+class TokenBucket:
+    def __init__(self, rate=STT_RATE_LIMIT, burst=STT_BURST):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    # Take a token, waiting up to timeout seconds for one; False if none came in time
+    def acquire(self, timeout=STT_ADMISSION_TIMEOUT):
+        if self.rate <= 0:
+            return True
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+# Opens when the error rate over the last window calls reaches error_rate, refuses
+# calls for cooldown seconds, then lets a single trial call decide whether to close
+class CircuitBreaker:
+    def __init__(self, window=STT_BREAKER_WINDOW, error_rate=STT_BREAKER_ERROR_RATE, cooldown=STT_BREAKER_COOLDOWN):
+        self.window = window
+        self.error_rate = error_rate
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self._results = deque(maxlen=window)  # True for a failed call
+        self._opened_at = 0.0
+        self._trial = False  # A half-open trial call is in flight
+        self._lock = threading.Lock()
+
+    # Seconds until calls are allowed again; 0 unless open
+    def retry_after(self):
+        with self._lock:
+            if self.state != OPEN:
+                return 0
+            return max(self._opened_at + self.cooldown - time.monotonic(), 0)
+
+    # Raise Overloaded unless a call may go ahead; True if the call is the half-open trial
+    def allow(self):
+        with self._lock:
+            if self.state == OPEN and time.monotonic() >= self._opened_at + self.cooldown:
+                self.state = HALF_OPEN
+            if self.state == CLOSED or (self.state == HALF_OPEN and not self._trial):
+                self._trial = self.state == HALF_OPEN
+                return self._trial
+            remaining = max(self._opened_at + self.cooldown - time.monotonic(), 0)
+        raise Overloaded("Speech recognition is failing; calls are paused",
+                         math.ceil(remaining) or DEFAULT_RETRY_AFTER, 'circuit_open')
+
+    # Give up a call allow() let through without making it
+    def release(self, trial):
+        if trial:
+            with self._lock:
+                self._trial = False
+
+    # Record how a call allow() let through went; the trial decides whether the circuit closes
+    def record(self, failed, trial=False):
+        with self._lock:
+            if trial:
+                self._trial = False
+                if failed:
+                    self._open()
+                elif self.state == HALF_OPEN:
+                    self.state = CLOSED
+                    self._results.clear()
+                return
+            if self.state != CLOSED:
+                return  # Calls started before the circuit opened say nothing about the service now
+            self._results.append(failed)
+            if len(self._results) == self.window and sum(self._results) >= self.error_rate * self.window:
+                self._open()
+                print(f"Speech recognition circuit opened for {self.cooldown:.0f}s after repeated failures")
+
+    # Caller must hold the lock
+    def _open(self):
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+        self._results.clear()
+
+
+# The token bucket and circuit breaker together, plus the backlog check for new work
+class Admission:
+    def __init__(self, bucket=None, breaker=None, max_backlog=STT_MAX_BACKLOG, timeout=STT_ADMISSION_TIMEOUT):
+        self.bucket = bucket or TokenBucket()
+        self.breaker = breaker or CircuitBreaker()
+        self.max_backlog = max_backlog
+        self.timeout = timeout
+
+    # Call recognize(audio) if admitted. Exceptions in failures count against the circuit;
+    # during the half-open trial any exception does, so only a real success closes it.
+    def call(self, recognize, audio, failures=(Exception,)):
+        trial = self.breaker.allow()
+        if not self.bucket.acquire(self.timeout):
+            self.breaker.release(trial)
+            raise Overloaded("Speech recognition rate limit reached", self.backlog_delay(1), 'rate_limited')
+        try:
+            result = recognize(audio)
+        except BaseException as e:
+            if trial or isinstance(e, failures):
+                self.breaker.record(True, trial)
+            raise
+        self.breaker.record(False, trial)
+        return result
+
+    # Seconds a client should wait before starting new work, or 0 to go ahead.
+    # backlog is the number of chunks already waiting for a recognizer.
+    def retry_after(self, backlog):
+        wait = self.breaker.retry_after()
+        if wait:
+            return math.ceil(wait)
+        if backlog >= self.max_backlog:
+            return self.backlog_delay(backlog)
+        return 0
+
+    # Seconds a backlog of chunks takes to drain at the rate limit
+    def backlog_delay(self, backlog):
+        if self.bucket.rate > 0:
+            return max(math.ceil(backlog / self.bucket.rate), 1)
+        return DEFAULT_RETRY_AFTER
@@ -1,21 +1,38 @@
-from flask import Flask, jsonify, send_file, render_template, Response, request
-import sounddevice as sd
+from flask import Flask, jsonify, send_file, render_template, Response, request, stream_with_context, url_for, g
+from werkzeug.http import http_date
 import numpy as np
-import wave
 import os
-import sys
-import requests
 import speech_recognition as sr
-from pydub import AudioSegment
-import math
 from dotenv import load_dotenv
 import random
-from difflib import SequenceMatcher
-import pymongo
 from bson.objectid import ObjectId
+from bson.errors import InvalidId
 from datetime import datetime
 import base64
+import hashlib
 import io
+import atexit
+import json
+import threading
+import time
+from db import database
+from metrics import (REGISTRY, REQUEST_SECONDS, STT_FAILURES, AUDIO_BYTES_STORED, CHUNKS, LOAD_SHED,
+                     RECORDINGS_PENDING_RETRY, stage, create_profiler)
+from repository import RecordingRepository, ResultBatcher, new_recording, score_fields, PENDING_RETRY
+from jobs import JobQueue, job_status
+from admission import Admission
+from sessions import SessionManager, RECEIVING, RECORDING, PROCESSING
+from transcription import transcribe_chunks, StreamingTranscriber, IncompleteTranscript, backlog as stt_backlog
+from scoring import calculate_score, RunningScore, MAX_WORD_COUNT
+from prompts import PromptRegistry, load_prompts
+from rescore import rescore, CHECKPOINTS_COLLECTION, RESCORE_BATCH_SIZE, RESCORE_WORKERS
+from stt import get_backend
+from leaderboard import Leaderboard
+from stats import StatsRollup, STATS_REBUILD_INTERVAL
+from storage import AudioStore, StoredAudio
+from transcript_cache import create_cache, chunk_key, recording_key
+from audio import (decode_wav, encode_wav, split_samples, split_on_silence, synthetic_speech, to_audio_data,
+                   to_processing_rate, VAD_ENABLED, VAD_SETTINGS)
 
 # Load environment variables
 load_dotenv('api.env')
@@ -23,230 +40,376 @@ load_dotenv('api.env')
 app = Flask(__name__)
 app.config['UPLOAD_FOLDER'] = os.path.dirname(os.path.abspath(__file__))
 
-# MongoDB connection setup
-MONGO_URI = os.getenv('MONGO_URI', 'mongodb://localhost:27017')
-mongo_client = pymongo.MongoClient(MONGO_URI)
-db = mongo_client['ice_breaker_app']
-recordings_collection = db['recordings']
+# MongoDB setup; the pooled client connects on first use (see db.py for its settings)
+db = database
+recordings = RecordingRepository(db)
+recordings_collection = recordings.collection
+audio_store = AudioStore(db, writes=recordings.writes)  # Uploads count towards /admin/write_stats
+transcript_cache = create_cache(db)  # None when TRANSCRIPT_CACHE=off
+stats_rollup = StatsRollup(db, recordings_collection)
+leaderboard = Leaderboard(db, recordings_collection)
+job_queue = JobQueue(db)  # Processing jobs for worker.py
+stt_admission = Admission()  # Rate limit and circuit breaker in front of the recognizer (see admission.py)
+
+# History pagination settings
+HISTORY_PAGE_SIZE = 20  # Recordings per /get_history page by default
+HISTORY_MAX_PAGE_SIZE = 200
 
 # Audio settings
-SAMPLE_RATE = 44100  # 44.1kHz standard sampling rate
-DURATION = 120  # 60 seconds of recording
+SAMPLE_RATE = int(os.getenv('CAPTURE_SAMPLE_RATE', '44100'))  # Rate the microphone is recorded at
+PROCESSING_SAMPLE_RATE = int(os.getenv('PROCESSING_SAMPLE_RATE', '16000'))  # Rate used for STT and storage
+KEEP_ORIGINAL_AUDIO = os.getenv('KEEP_ORIGINAL_AUDIO', '0') == '1'  # Also store the capture at its original rate
+DURATION = int(os.getenv('RECORDING_DURATION', '120'))  # Seconds of recording
 CHANNELS = 1  # Mono audio
+STREAM_GRACE = 10  # Extra seconds a browser upload may run past DURATION
+CHUNK_LENGTH = int(os.getenv('CHUNK_LENGTH', '120'))  # Seconds per transcription chunk; shorter chunks transcribe in parallel
+AUDIO_SOURCE = os.getenv('AUDIO_SOURCE', 'microphone')  # microphone (sounddevice), or fake for synthetic speech
+FAKE_AUDIO_REALTIME = os.getenv('FAKE_AUDIO_REALTIME', '1') == '1'  # Fake captures take as long as real ones
+
+# sounddevice tracks a single current recording per process: each sd.rec() stops the
+# stream of the one before it, so microphone captures from concurrent sessions must take turns
+microphone_lock = threading.Lock()
+
+# Page settings
+STATIC_MAX_AGE = 365 * 24 * 3600  # Seconds browsers keep fingerprinted CSS/JS
+asset_fingerprints = {}  # Static file -> content hash, computed on first use
+home_page = None  # (html, etag), rendered on the first request
+
+# Admin settings
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN', '')  # Required in X-Admin-Token for /admin routes; they are disabled when unset
 
-# Ice Breaker questions list
-ICE_BREAKER_QUESTIONS = [
-    "Tell us about a hobby you're passionate about.",
-    "What's a skill you'd like to learn in the next year?",
-    "Share a memorable travel experience you've had.",
-    "If you could have dinner with any historical figure, who would it be and why?",
-    "What's your favorite book or movie and why does it resonate with you?",
-    "Tell us about a challenge you've overcome and what you learned from it.",
-    "What's something most people don't know about you?",
-    "If you could live anywhere in the world, where would it be?",
-    "Share a personal goal you're currently working towards.",
-    "What's the best advice someone has given you?",
-    "Tell us about someone who has influenced your life significantly.",
-    "What's a cause or issue you feel strongly about?",
-    "Share a proud accomplishment from your life.",
-    "If you had a time machine, which era would you visit?",
-    "What's something you're looking forward to in the near future?",
-    "Tell us about your ideal weekend.",
-    "What's a lesson you've learned from a mistake?",
-    "Share a tradition (family, cultural, personal) that's important to you.",
-    "What's a quality you appreciate most in other people?",
-    "If you could instantly master any skill, what would it be?"
-]
+prompt_registry = PromptRegistry()
+
+# Function to register the questions (plus any configured extras) under stable ids and
+# precompute what scoring needs, so scoring only has to vectorize transcripts. Extra
+# prompts may come from Mongo, so this runs at startup rather than on import.
+def load_prompt_registry():
+    if not len(prompt_registry):
+        load_prompts(prompt_registry, db)
+        prompt_registry.prepare()
 
 # Function to get random ice breaker question
 def get_random_ice_breaker():
-    return random.choice(ICE_BREAKER_QUESTIONS)
+    return prompt_registry.random()
+
+# Function to capture seconds of audio from the configured source as (frames, CHANNELS) int16
+def capture_audio(seconds):
+    if AUDIO_SOURCE == 'fake':
+        # Different speech every time, so recordings are not identical for the recognizer or cache
+        if FAKE_AUDIO_REALTIME:
+            time.sleep(seconds)
+        samples = synthetic_speech(seconds, SAMPLE_RATE, seed=random.getrandbits(32))
+        return np.repeat(samples[:, np.newaxis], CHANNELS, axis=1)
+    if AUDIO_SOURCE != 'microphone':
+        raise ValueError(f"Unknown AUDIO_SOURCE '{AUDIO_SOURCE}'; choose microphone or fake")
+
+    import sounddevice as sd  # Only needed on a machine with a microphone
+
+    # Only the capture is serialized; transcription and scoring of sessions still overlap
+    with microphone_lock:
+        audio_data = sd.rec(int(SAMPLE_RATE * seconds), samplerate=SAMPLE_RATE, channels=CHANNELS, dtype=np.int16)
+        sd.wait()  # Wait for recording to complete
+    return audio_data
 
 # Function to record audio
-def record_audio():
+def record_audio(filename='recorded_audio.wav'):
     print("Recording started...")
 
     # Record audio for the specified duration
-    audio_data = sd.rec(int(SAMPLE_RATE * DURATION), samplerate=SAMPLE_RATE, channels=CHANNELS, dtype=np.int16)
-    sd.wait()  # Wait for recording to complete
+    with stage('capture'):
+        audio_data = capture_audio(DURATION)
     print("Recording finished.")
 
-    # Save as WAV file
-    audio_file = os.path.join(app.config['UPLOAD_FOLDER'], 'recorded_audio.wav')
-    with wave.open(audio_file, 'wb') as wf:
-        wf.setnchannels(CHANNELS)
-        wf.setsampwidth(2)
-        wf.setframerate(SAMPLE_RATE)
-        wf.writeframes(audio_data.tobytes())
+    samples = audio_data.mean(axis=1).astype(np.int16) if CHANNELS > 1 else audio_data[:, 0]
+    audio_file = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+
+    with stage('wav_write'):
+        if KEEP_ORIGINAL_AUDIO:
+            with open(original_audio_path(audio_file), 'wb') as f:
+                f.write(encode_wav(samples, SAMPLE_RATE))
+
+        # Save as WAV file at the processing rate
+        samples, sample_rate = to_processing_rate(samples, SAMPLE_RATE, PROCESSING_SAMPLE_RATE)
+        with open(audio_file, 'wb') as f:
+            f.write(encode_wav(samples, sample_rate))
 
     print(f"Audio saved to {audio_file}")
     return audio_file
 
+# Function to get where the original-rate copy of a capture is kept
+def original_audio_path(audio_file):
+    return os.path.splitext(audio_file)[0] + '_original.wav'
+
 # Function to save audio to MongoDB
-def save_audio_to_db(audio_file, user_id="anonymous", prompt=""):
+def save_audio_to_db(audio_file, user_id="anonymous", prompt="", original_file=None, prompt_id=None):
     # Read the audio file
     with open(audio_file, 'rb') as f:
         audio_data = f.read()
     
-    # Convert to base64 for storage
-    audio_base64 = base64.b64encode(audio_data).decode('utf-8')
-    
-    # Save to MongoDB
-    record = {
-        'user_id': user_id,
-        'prompt': prompt,
-        'audio_data': audio_base64,
-        'timestamp': datetime.now()
-    }
+    # Keep the original-rate capture alongside when configured
+    original_data = None
+    if original_file:
+        with open(original_file, 'rb') as f:
+            original_data = f.read()
     
-    # Insert and return the record ID
-    result = recordings_collection.insert_one(record)
-    return str(result.inserted_id)
+    return save_audio_data_to_db(audio_data, os.path.basename(audio_file), user_id, prompt, original_data, prompt_id)
 
-# Function to get audio from MongoDB
-def get_audio_from_db(record_id):
-    record = recordings_collection.find_one({'_id': ObjectId(record_id)})
+# Function to save WAV bytes to MongoDB. Passing the results stores the recording
+# complete in one insert instead of an insert followed by an update.
+def save_audio_data_to_db(audio_data, filename, user_id="anonymous", prompt="", original_data=None, prompt_id=None,
+                          results=None, status=None):
+    with stage('save_audio'):
+        # Store the blob separately so the recording document stays small
+        audio_meta = audio_store.put(audio_data, filename)
+        AUDIO_BYTES_STORED.inc(audio_meta['length'])
+
+        original_meta = None
+        if original_data:
+            original_meta = audio_store.put(original_data, os.path.splitext(filename)[0] + '_original.wav')
+            AUDIO_BYTES_STORED.inc(original_meta['length'])
+
+        record = new_recording(user_id, prompt, prompt_id, audio_meta, original_meta, status)
+        if results:
+            record.update(score_fields(
+                results['transcribed_text'],
+                results['full_word_count'],
+                results['similarity_percentage'],
+                results['score']
+            ))
+
+        # Insert and return the record ID
+        record_id = recordings.insert(record)
+    if results:
+        record_saved_score(record, results['score'], is_new=True)
+    return record_id
+
+# Function to load only the audio fields of a recording
+def find_audio_record(record_id):
+    return recordings.find_audio(record_id)
+
+# Function to open the stored audio of a recording for streaming, without decoding it
+def open_audio_from_db(record_id):
+    record = find_audio_record(record_id)
+    if record and 'audio' in record:
+        return audio_store.open(record['audio'])
     if record and 'audio_data' in record:
-        # Decode base64 audio data
+        # Legacy record that has not been migrated yet
         audio_data = base64.b64decode(record['audio_data'])
-        return audio_data, record.get('prompt', '')
-    return None, None
-
-# Function to split long audio into smaller chunks (max 120 sec each)
-def split_audio(audio_file, chunk_length=120):  # 120 seconds per chunk
-    audio = AudioSegment.from_wav(audio_file)
-    total_length = len(audio) / 1000  # Convert ms to seconds
-    num_chunks = math.ceil(total_length / chunk_length)
-    
-    chunk_files = []
-    for i in range(num_chunks):
-        start_time = i * chunk_length * 1000  # Convert to ms
-        end_time = min((i + 1) * chunk_length * 1000, len(audio))
-        chunk = audio[start_time:end_time]
-        
-        chunk_filename = f"chunk_{i}.wav"
-        chunk.export(chunk_filename, format="wav")
-        chunk_files.append(chunk_filename)
-    
-    return chunk_files
+        return StoredAudio(io.BytesIO(audio_data), len(audio_data), 'audio/wav',
+                           f'{record_id}-{len(audio_data)}', record.get('timestamp'))
+    return None
 
-# Function to split audio data directly
-def split_audio_data(audio_data, chunk_length=120):
-    # Convert bytes to AudioSegment
-    audio_file = io.BytesIO(audio_data)
-    audio = AudioSegment.from_wav(audio_file)
-    
-    total_length = len(audio) / 1000  # Convert ms to seconds
-    num_chunks = math.ceil(total_length / chunk_length)
-    
-    chunk_files = []
-    for i in range(num_chunks):
-        start_time = i * chunk_length * 1000  # Convert to ms
-        end_time = min((i + 1) * chunk_length * 1000, len(audio))
-        chunk = audio[start_time:end_time]
-        
-        chunk_filename = f"chunk_{i}.wav"
-        chunk.export(chunk_filename, format="wav")
-        chunk_files.append(chunk_filename)
-    
-    return chunk_files
+# Function to get audio from MongoDB as WAV bytes
+def get_audio_from_db(record_id):
+    record = find_audio_record(record_id)
+    if not record:
+        return None, None
+    return read_record_audio(record), record.get('prompt', '')
+
+# Function to read a recording's audio as WAV bytes
+def read_record_audio(record):
+    if 'audio' in record:
+        return audio_store.read_wav(record['audio'])
+    if 'audio_data' in record:
+        # Decode base64 audio data from a record that has not been migrated yet
+        return base64.b64decode(record['audio_data'])
+    return None
+
+# Function to split long audio into smaller chunks (max CHUNK_LENGTH sec each)
+def split_audio(audio_file, chunk_length=CHUNK_LENGTH):
+    with open(audio_file, 'rb') as f:
+        return split_audio_data(f.read(), chunk_length)
+
+# Function to split audio data directly into recognizer-ready chunks.
+# Chunks are views over the decoded PCM, so nothing is copied or written to disk.
+# With VAD on, cuts land in pauses near chunk_length and silent chunks are dropped.
+def split_audio_data(audio_data, chunk_length=CHUNK_LENGTH):
+    with stage('split'):
+        samples, sample_rate = decode_wav(audio_data)
+        samples, sample_rate = to_processing_rate(samples, sample_rate, PROCESSING_SAMPLE_RATE)
+        if VAD_ENABLED:
+            chunks = split_on_silence(samples, sample_rate, chunk_length)
+        else:
+            chunks = split_samples(samples, sample_rate, chunk_length)
+        return [to_audio_data(chunk, sample_rate) for chunk in chunks]
+
+# Function to recognize a single chunk with the configured STT backend;
+# request errors propagate so they can be retried. Calls go through admission
+# control, which raises Overloaded instead of calling a rate-limited or failing service.
+def recognize_chunk(audio_chunk):
+    if isinstance(audio_chunk, str):
+        with sr.AudioFile(audio_chunk) as source:
+            audio_chunk = sr.Recognizer().record(source)
+    backend = get_backend()
 
-# Function to convert audio to text
-def audio_to_text(audio_file):
-    recognizer = sr.Recognizer()
-    with sr.AudioFile(audio_file) as source:
-        audio_data = recognizer.record(source)
+    # Counted only when the recognizer is really called: not on cache hits or refused calls
+    def send(chunk):
+        CHUNKS.inc()
+        return backend.recognize(chunk)
+
+    def recognize():
+        try:
+            with stage('stt_chunk'):
+                return stt_admission.call(send, audio_chunk, failures=(sr.RequestError,))
+        except sr.RequestError:
+            STT_FAILURES.inc(reason='request_error')
+            raise
+
+    if transcript_cache is None:
+        text = recognize()
+    else:
+        # Identical audio (re-processing, repeated silence) is only recognized once
+        text = transcript_cache.get_or_compute(chunk_key(audio_chunk, backend), recognize)
+    if not text:
+        print("Could not understand audio chunk")
+    return text
+
+# Function to convert audio (a chunk or a WAV file path) to text
+def audio_to_text(audio_chunk):
     try:
-        return recognizer.recognize_google(audio_data)  # Using Google STT API
-    except sr.UnknownValueError:
-        print(f"Could not understand audio in {audio_file}")
-        return ""
+        return recognize_chunk(audio_chunk)
     except sr.RequestError as e:
-        print(f"Google STT API request failed: {e}")
+        print(f"Speech recognition request failed: {e}")
         return ""
 
-# Function to calculate similarity between two texts
-def calculate_similarity(text1, text2):
-    # Convert both texts to lowercase for better comparison
-    text1 = text1.lower()
-    text2 = text2.lower()
-    
-    # Use SequenceMatcher to get a similarity ratio
-    return SequenceMatcher(None, text1, text2).ratio()
-
-# Function to calculate score based on word count and prompt similarity
-def calculate_score(word_count, prompt_text, speech_text, max_word_count=170):
-    # Base score based on word count (60% of total score)
-    word_count_score = min((word_count / max_word_count) * 60, 60)
-    
-    # Similarity score (40% of total score)
-    similarity_ratio = calculate_similarity(prompt_text, speech_text)
-    similarity_score = similarity_ratio * 40
-    
-    # Total score
-    total_score = word_count_score + similarity_score
-    
-    return round(total_score, 2), round(similarity_ratio * 100, 2)
+# Function to transcribe chunks concurrently, keeping them in order
+def transcribe_audio_chunks(chunks, on_chunk=None):
+    return transcribe_chunks(chunks, recognize_chunk, retry_on=(sr.RequestError,), on_chunk=on_chunk)
 
 # Function to save score to MongoDB
 def save_score_to_db(record_id, transcribed_text, word_count, similarity_percentage, score):
-    # Update the existing record with the results
-    recordings_collection.update_one(
-        {'_id': ObjectId(record_id)},
-        {'$set': {
-            'transcribed_text': transcribed_text,
-            'word_count': word_count,
-            'similarity_percentage': similarity_percentage,
-            'score': score,
-            'processed_at': datetime.now()
-        }}
-    )
+    # Update the existing record with the results, reading back what the rollups need
+    with stage('save_score'):
+        previous = recordings.save_score(record_id, transcribed_text, word_count, similarity_percentage, score)
+    if previous:
+        record_saved_score(previous, score)
     return record_id
 
-# Process the audio file
-def process_audio_file(audio_file='recorded_audio.wav', prompt_text=""):
-    # Split audio into smaller chunks
-    chunk_files = split_audio(audio_file)
+# Function to queue results for a batched write, for processing nobody is waiting on.
+# record is the recording as loaded by find_audio_record.
+def queue_score_to_db(record, results):
+    result_batcher.add(
+        record,
+        results['transcribed_text'],
+        results['full_word_count'],
+        results['similarity_percentage'],
+        results['score']
+    )
+    return str(record['_id'])
 
-    full_text = ""
+# Function to keep the per-user and per-prompt statistics and the leaderboards
+# current after a score is saved. record is the recording as it was before the
+# save, or with is_new, a recording inserted together with its first score.
+def record_saved_score(record, score, is_new=False):
+    stats_rollup.record(record, score, is_new)
+    leaderboard.record(record, score)
 
-    # Process each chunk
-    for chunk_file in chunk_files:
-        text = audio_to_text(chunk_file)
-        full_text += text + " "
-        os.remove(chunk_file)  # Remove temporary chunk file
+result_batcher = ResultBatcher(recordings, on_saved=record_saved_score)
 
-    # Count words in the full transcribed text
-    full_word_count = len(full_text.split())
+# Function to transcribe, score and save a stored recording; None if it is missing.
+# Used by /process_audio and by the queue workers (worker.py), which pass batched=True
+# and flush result_batcher before marking their jobs done.
+def process_recording(record_id, batched=False):
+    try:
+        full_text, record = transcribe_recording(record_id)
+    except IncompleteTranscript:
+        recordings.mark_pending_retry(record_id)
+        raise
+    if full_text is None:
+        return None
 
-    # Calculate score based on word count and similarity to prompt
-    score, similarity_percentage = calculate_score(full_word_count, prompt_text, full_text)
+    results = score_transcript(full_text, record.get('prompt', ''), record.get('prompt_id'))
 
+    if batched:
+        # Nobody is waiting: the results go out with others in one bulk write
+        queue_score_to_db(record, results)
+        return results
+
+    # Save results to MongoDB
+    save_score_to_db(
+        record_id,
+        results['transcribed_text'],
+        results['full_word_count'],
+        results['similarity_percentage'],
+        results['score']
+    )
+    return results
+
+# Function to get the seconds clients should wait before starting work that needs
+# speech recognition, or 0 when it is accepting work
+def stt_retry_after():
+    return stt_admission.retry_after(stt_backlog())
+
+# Function to answer a request refused by admission control
+def overloaded_response(retry_after):
+    LOAD_SHED.inc(endpoint=request.endpoint or '')
+    response = jsonify({'message': 'Speech recognition is busy; try again later', 'retry_after': retry_after})
+    response.headers['Retry-After'] = str(retry_after)
+    return response, 429
+
+# Function to queue a saved recording whose transcript came back incomplete, for a
+# worker to process once the recognizer should accept work again. Returns what the
+# client is told instead of a score.
+def defer_recording(record_id, error):
+    RECORDINGS_PENDING_RETRY.inc()
+    retry_after = error.retry_after or stt_retry_after()
+    job_id = job_queue.enqueue(record_id, delay=retry_after)
     return {
-        'transcribed_text': full_text.strip(),
-        'full_word_count': full_word_count,
-        'score': score,
-        'similarity_percentage': similarity_percentage
+        'record_id': record_id,
+        'status': PENDING_RETRY,
+        'job_id': job_id,
+        'retry_after': retry_after,
+        'message': 'Speech recognition is busy; the recording was saved and will be scored shortly'
     }
 
+# Transcribe a stored recording. Returns (full_text, record), or (None, None) if it is missing.
+# With the transcript cache, a recording whose audio was transcribed before with the
+# same backend and settings is not even downloaded.
+def transcribe_recording(record_id):
+    record = find_audio_record(record_id)
+    if not record:
+        return None, None
+
+    key = None
+    content_hash = record.get('audio', {}).get('sha256')
+    if transcript_cache is not None and content_hash:
+        key = recording_key(content_hash, get_backend(), PROCESSING_SAMPLE_RATE, CHUNK_LENGTH, *VAD_SETTINGS)
+        full_text = transcript_cache.get(key)
+        if full_text is not None:
+            return full_text, record
+
+    audio_data = read_record_audio(record)
+    if not audio_data:
+        return None, None
+    full_text = " ".join(transcribe_audio_chunks(split_audio_data(audio_data)))
+    if key:
+        transcript_cache.put(key, full_text)
+    return full_text, record
+
+# Process the audio file
+def process_audio_file(audio_file='recorded_audio.wav', prompt_text="", on_chunk=None, prompt_id=None):
+    with open(audio_file, 'rb') as f:
+        return process_audio_data(f.read(), prompt_text, on_chunk, prompt_id)
+
 # Process audio data directly
-def process_audio_data(audio_data, prompt_text=""):
+def process_audio_data(audio_data, prompt_text="", on_chunk=None, prompt_id=None):
     # Split audio into smaller chunks
-    chunk_files = split_audio_data(audio_data)
+    chunks = split_audio_data(audio_data)
 
-    full_text = ""
+    # Transcribe all chunks concurrently, keeping them in order
+    full_text = " ".join(transcribe_audio_chunks(chunks, on_chunk))
 
-    # Process each chunk
-    for chunk_file in chunk_files:
-        text = audio_to_text(chunk_file)
-        full_text += text + " "
-        os.remove(chunk_file)  # Remove temporary chunk file
+    return score_transcript(full_text, prompt_text, prompt_id)
 
+# Score a finished transcript against a prompt given by id or, for older records, by text
+def score_transcript(full_text, prompt_text="", prompt_id=None):
     # Count words in the full transcribed text
     full_word_count = len(full_text.split())
 
-    # Calculate score based on word count and similarity to prompt
-    score, similarity_percentage = calculate_score(full_word_count, prompt_text, full_text)
+    # Calculate score based on word count and similarity to the prompt's precomputed vector
+    prompt = prompt_registry.resolve(prompt_id, prompt_text)
+    with stage('similarity'):
+        score, similarity_percentage = calculate_score(full_word_count, prompt, full_text)
 
     return {
         'transcribed_text': full_text.strip(),
@@ -255,419 +418,352 @@ def process_audio_data(audio_data, prompt_text=""):
         'similarity_percentage': similarity_percentage
     }
 
-# Create a HTML template for the home page
+# Returns an on_chunk callback that pushes each recognized chunk and the running
+# word count and provisional score to the session's event stream
+def partial_results_publisher(manager, session):
+    running = RunningScore(prompt_registry.resolve(session.prompt_id, session.prompt))
+
+    def on_chunk(index, text):
+        score, similarity_percentage = running.add(text, index)
+        manager.publish(session, 'partial', {
+            'index': index,
+            'text': text,
+            'word_count': running.word_count,
+            'score': score,
+            'similarity_percentage': similarity_percentage
+        })
+
+    return on_chunk
+
+# Background job for a recording session: capture, store, transcribe and score.
+# The capture is stored before it is transcribed, at the cost of a second write for
+# the results, so a process that dies during speech recognition cannot lose it: the
+# sweep in worker.py finds the unscored recording and queues it.
+def run_recording_session(manager, session):
+    manager.set_state(session, RECORDING)
+    audio_file = record_audio(f'recorded_{session.id}.wav')
+    original_file = original_audio_path(audio_file) if KEEP_ORIGINAL_AUDIO else None
+
+    try:
+        record_id = save_audio_to_db(audio_file, session.user_id, session.prompt, original_file, session.prompt_id)
+        manager.set_state(session, PROCESSING)
+
+        # Process the recorded audio
+        try:
+            results = process_audio_file(
+                audio_file, session.prompt, partial_results_publisher(manager, session), session.prompt_id
+            )
+        except IncompleteTranscript as e:
+            # Scoring the words that did come back would understate the score
+            recordings.mark_pending_retry(record_id)
+            return defer_recording(record_id, e)
+        except Exception:
+            # Queue the stored audio, so a worker processes the recording again later
+            job_queue.enqueue(record_id)
+            raise
+
+        save_score_to_db(record_id, results['transcribed_text'], results['full_word_count'],
+                         results['similarity_percentage'], results['score'])
+    finally:
+        # Keep the latest capture available to /get_audio and /process_audio
+        os.replace(audio_file, os.path.join(app.config['UPLOAD_FOLDER'], 'recorded_audio.wav'))
+        if original_file:
+            os.remove(original_file)
+
+    return {
+        'transcribed_text': results['transcribed_text'],
+        'word_count': results['full_word_count'],
+        'score': results['score'],
+        'similarity_percentage': results['similarity_percentage'],
+        'record_id': record_id
+    }
+
+# Background job that finishes a browser-uploaded session once the last block is in.
+# Most chunks were already transcribed while the user was speaking. The uploaded
+# audio only lives in memory until now, so storing it first would protect nothing:
+# it is written once, with its results.
+def finish_streaming_session(manager, session):
+    stream = session.stream
+
+    try:
+        full_text = " ".join(stream.finish())
+    except IncompleteTranscript as e:
+        record_id = save_audio_data_to_db(
+            encode_wav(np.frombuffer(stream.pcm(), dtype='<i2'), stream.sample_rate), f'recorded_{session.id}.wav',
+            session.user_id, session.prompt, prompt_id=session.prompt_id, status=PENDING_RETRY
+        )
+        return defer_recording(record_id, e)
+    results = score_transcript(full_text, session.prompt, session.prompt_id)
+
+    # Save the audio and the results to MongoDB in one write
+    samples = np.frombuffer(stream.pcm(), dtype='<i2')
+    record_id = save_audio_data_to_db(
+        encode_wav(samples, stream.sample_rate), f'recorded_{session.id}.wav', session.user_id, session.prompt,
+        prompt_id=session.prompt_id, results=results
+    )
+
+    return {
+        'transcribed_text': results['transcribed_text'],
+        'word_count': results['full_word_count'],
+        'score': results['score'],
+        'similarity_percentage': results['similarity_percentage'],
+        'record_id': record_id
+    }
+
+session_manager = SessionManager(run_recording_session)
+
+# Time every request; with PROFILE_SLOW_REQUESTS set, slow ones are also profiled
+profiler = create_profiler()
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    g.profile_token = profiler.begin() if profiler else None
+
+@app.after_request
+def observe_request_time(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        duration = time.perf_counter() - started
+        endpoint = request.endpoint or 'unmatched'
+        REQUEST_SECONDS.observe(duration, endpoint=endpoint)
+        token = g.pop('profile_token', None)
+        if token is not None:
+            path = profiler.end(token, duration, endpoint)
+            if path:
+                print(f"Slow request to {request.path} ({duration:.2f}s) profiled in {path}")
+    return response
+
+# Metrics for Prometheus to scrape: stage and request latencies, STT failures, bytes and chunks
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+# Function to build a static asset URL carrying a hash of the file's content,
+# so an edited file gets a new URL and the old one can be cached for good
+@app.template_global()
+def asset_url(filename):
+    fingerprint = asset_fingerprints.get(filename)
+    if fingerprint is None or app.debug:
+        with open(os.path.join(app.static_folder, filename), 'rb') as f:
+            fingerprint = asset_fingerprints[filename] = hashlib.sha256(f.read()).hexdigest()[:12]
+    return url_for('static', filename=filename, v=fingerprint)
+
+# Let browsers keep fingerprinted assets without revalidating; a request for
+# any other version (or none) gets Flask's default revalidation
+@app.after_request
+def cache_static_assets(response):
+    if (request.endpoint == 'static' and response.status_code in (200, 304)
+            and request.args.get('v') == asset_fingerprints.get(request.view_args.get('filename'))):
+        response.headers['Cache-Control'] = f'public, max-age={STATIC_MAX_AGE}, immutable'
+    return response
+
+# The home page is the same for everyone (the question is fetched by the page),
+# so it is rendered once and revalidated by ETag
 @app.route('/')
 def home():
-    ice_breaker = get_random_ice_breaker()
-    return f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>Ice Breaker Speech App</title>
-        <style>
-            body {{
-                font-family: Arial, sans-serif;
-                max-width: 800px;
-                margin: 0 auto;
-                padding: 20px;
-                text-align: center;
-            }}
-            .question {{
-                font-size: 24px;
-                margin: 30px 0;
-                padding: 20px;
-                background-color: #f0f8ff;
-                border-radius: 10px;
-            }}
-            button {{
-                background-color: #4CAF50;
-                color: white;
-                padding: 15px 32px;
-                text-align: center;
-                font-size: 16px;
-                margin: 10px 2px;
-                cursor: pointer;
-                border: none;
-                border-radius: 5px;
-            }}
-            button:hover {{
-                background-color: #45a049;
-            }}
-            .results {{
-                margin-top: 20px;
-                text-align: left;
-                display: none;
-            }}
-            .loading {{
-                display: none;
-                margin: 20px 0;
-            }}
-            #history-section {{
-                margin-top: 40px;
-                display: none;
-            }}
-            table {{
-                width: 100%;
-                border-collapse: collapse;
-                margin-top: 20px;
-            }}
-            th, td {{
-                border: 1px solid #ddd;
-                padding: 8px;
-                text-align: left;
-            }}
-            th {{
-                background-color: #f2f2f2;
-            }}
-            .user-section {{
-                margin-bottom: 20px;
-            }}
-            input[type=text], input[type=email], input[type=password] {{
-                width: 100%;
-                padding: 12px 20px;
-                margin: 8px 0;
-                display: inline-block;
-                border: 1px solid #ccc;
-                border-radius: 4px;
-                box-sizing: border-box;
-            }}
-            /* Countdown Timer Styles */
-            .countdown-container {{
-                display: none;
-                margin: 20px auto;
-                width: 300px;
-            }}
-            .countdown-timer {{
-                font-size: 36px;
-                font-weight: bold;
-                color: #333;
-                margin: 10px 0;
-            }}
-            .countdown-progress {{
-                width: 100%;
-                background-color: #f3f3f3;
-                border-radius: 10px;
-                height: 20px;
-                margin-top: 10px;
-            }}
-            .countdown-bar {{
-                height: 20px;
-                background-color: #4CAF50;
-                border-radius: 10px;
-                width: 100%;
-                transition: width 1s linear;
-            }}
-            .recording-indicator {{
-                color: #f44336;
-                font-weight: bold;
-                margin-top: 5px;
-            }}
-        </style>
-    </head>
-    <body>
-        <h1>Ice Breaker Speech Challenge</h1>
-        
-        <div class="user-section">
-            <input type="text" id="user-name" placeholder="Your Name (optional)">
-        </div>
-        
-        <div class="question">
-            <p>Please speak about the following topic for up to 120 seconds:</p>
-            <p><strong id="ice-breaker-text">{ice_breaker}</strong></p>
-            <button id="new-question">Get New Question</button>
-        </div>
-        
-        <button id="start-recording">Start Recording</button>
-        
-        <!-- Countdown Timer Container -->
-        <div class="countdown-container" id="countdown-container">
-            <div class="countdown-timer" id="countdown-timer">120</div>
-            <div class="countdown-progress">
-                <div class="countdown-bar" id="countdown-bar"></div>
-            </div>
-            <div class="recording-indicator">Recording in progress...</div>
-        </div>
-        
-        <div class="loading" id="loading">Processing your speech...</div>
-        
-        <div class="results" id="results">
-            <h2>Results</h2>
-            <h3>Transcription:</h3>
-            <div id="transcription"></div>
-            
-            <h3>Stats:</h3>
-            <div id="word-count"></div>
-            <div id="similarity"></div>
-            <div id="score"></div>
-            <div id="record-id" style="font-size: 12px; color: #888;"></div>
-        </div>
-        
-        <button id="view-history" style="margin-top: 30px; background-color: #3498db;">View History</button>
-        
-        <div id="history-section">
-            <h2>Your Recording History</h2>
-            <table id="history-table">
-                <thead>
-                    <tr>
-                        <th>Date</th>
-                        <th>Prompt</th>
-                        <th>Score</th>
-                        <th>Actions</th>
-                    </tr>
-                </thead>
-                <tbody id="history-body">
-                    <!-- History data will be loaded here -->
-                </tbody>
-            </table>
-        </div>
-        
-        <script>
-            // Store the current question
-            let currentQuestion = document.getElementById('ice-breaker-text').textContent;
-            let currentRecordId = null;
-            let countdownInterval = null;
-            let remainingTime = {DURATION}; // Recording duration in seconds
-            
-            document.getElementById('new-question').addEventListener('click', function() {{
-                fetch('/get_ice_breaker')
-                    .then(response => response.json())
-                    .then(data => {{
-                        document.getElementById('ice-breaker-text').textContent = data.question;
-                        currentQuestion = data.question;
-                    }});
-            }});
-            
-            function startCountdown() {{
-                const countdownContainer = document.getElementById('countdown-container');
-                const countdownTimer = document.getElementById('countdown-timer');
-                const countdownBar = document.getElementById('countdown-bar');
-                
-                countdownContainer.style.display = 'block';
-                remainingTime = {DURATION};
-                countdownTimer.textContent = remainingTime;
-                countdownBar.style.width = '100%';
-                
-                // Update countdown every second
-                countdownInterval = setInterval(function() {{
-                    remainingTime--;
-                    countdownTimer.textContent = remainingTime;
-                    
-                    // Update progress bar
-                    const percentageLeft = (remainingTime / {DURATION}) * 100;
-                    countdownBar.style.width = percentageLeft + '%';
-                    
-                    // Change color as time gets low
-                    if (remainingTime <= 10) {{
-                        countdownTimer.style.color = '#f44336'; // Red
-                        countdownBar.style.backgroundColor = '#f44336';
-                    }}
-                    
-                    if (remainingTime <= 0) {{
-                        clearInterval(countdownInterval);
-                    }}
-                }}, 1000);
-            }}
-            
-            function stopCountdown() {{
-                clearInterval(countdownInterval);
-                document.getElementById('countdown-container').style.display = 'none';
-                document.getElementById('countdown-timer').style.color = '#333'; // Reset color
-                document.getElementById('countdown-bar').style.backgroundColor = '#4CAF50'; // Reset color
-            }}
-            
-            document.getElementById('start-recording').addEventListener('click', function() {{
-                this.disabled = true;
-                document.getElementById('loading').style.display = 'none';
-                
-                // Start countdown
-                startCountdown();
-                
-                const userName = document.getElementById('user-name').value || 'anonymous';
-                
-                fetch('/start_recording', {{
-                    method: 'POST',
-                    headers: {{
-                        'Content-Type': 'application/json'
-                    }},
-                    body: JSON.stringify({{
-                        prompt: currentQuestion,
-                        user_id: userName
-                    }})
-                }})
-                .then(response => response.json())
-                .then(data => {{
-                    // Stop countdown
-                    stopCountdown();
-                    
-                    document.getElementById('loading').style.display = 'none';
-                    document.getElementById('results').style.display = 'block';
-                    document.getElementById('transcription').textContent = data.transcribed_text;
-                    document.getElementById('word-count').textContent = 'Word Count: ' + data.word_count;
-                    document.getElementById('similarity').textContent = 'Relevance to Topic: ' + data.similarity_percentage.toFixed(2) + '%';
-                    document.getElementById('score').textContent = 'Overall Score: ' + data.score.toFixed(2) + '%';
-                    document.getElementById('record-id').textContent = 'Record ID: ' + data.record_id;
-                    currentRecordId = data.record_id;
-                    this.disabled = false;
-                }})
-                .catch(error => {{
-                    console.error('Error:', error);
-                    // Stop countdown
-                    stopCountdown();
-                    
-                    document.getElementById('loading').style.display = 'none';
-                    alert('An error occurred during recording. Please try again.');
-                    this.disabled = false;
-                }});
-            }});
-            
-            document.getElementById('view-history').addEventListener('click', function() {{
-                const historySection = document.getElementById('history-section');
-                
-                if (historySection.style.display === 'block') {{
-                    historySection.style.display = 'none';
-                    this.textContent = 'View History';
-                }} else {{
-                    const userName = document.getElementById('user-name').value || 'anonymous';
-                    
-                    fetch('/get_history', {{
-                        method: 'POST',
-                        headers: {{
-                            'Content-Type': 'application/json'
-                        }},
-                        body: JSON.stringify({{
-                            user_id: userName
-                        }})
-                    }})
-                    .then(response => response.json())
-                    .then(data => {{
-                        const historyBody = document.getElementById('history-body');
-                        historyBody.innerHTML = '';
-                        
-                        if (data.recordings.length === 0) {{
-                            historyBody.innerHTML = '<tr><td colspan="4">No recordings found</td></tr>';
-                        }} else {{
-                            data.recordings.forEach(recording => {{
-                                const row = document.createElement('tr');
-                                
-                                // Date column
-                                const dateCell = document.createElement('td');
-                                const recordDate = new Date(recording.timestamp);
-                                dateCell.textContent = recordDate.toLocaleString();
-                                row.appendChild(dateCell);
-                                
-                                // Prompt column
-                                const promptCell = document.createElement('td');
-                                promptCell.textContent = recording.prompt;
-                                row.appendChild(promptCell);
-                                
-                                // Score column
-                                const scoreCell = document.createElement('td');
-                                scoreCell.textContent = recording.score ? recording.score.toFixed(2) + '%' : 'N/A';
-                                row.appendChild(scoreCell);
-                                
-                                // Actions column
-                                const actionsCell = document.createElement('td');
-                                
-                                const playButton = document.createElement('button');
-                                playButton.textContent = 'Play';
-                                playButton.style.padding = '5px 10px';
-                                playButton.style.marginRight = '5px';
-                                playButton.addEventListener('click', function() {{
-                                    window.location.href = '/play_audio/' + recording._id;
-                                }});
-                                actionsCell.appendChild(playButton);
-                                
-                                const viewButton = document.createElement('button');
-                                viewButton.textContent = 'Details';
-                                viewButton.style.padding = '5px 10px';
-                                viewButton.addEventListener('click', function() {{
-                                    window.location.href = '/recording_details/' + recording._id;
-                                }});
-                                actionsCell.appendChild(viewButton);
-                                
-                                row.appendChild(actionsCell);
-                                historyBody.appendChild(row);
-                            }});
-                        }}
-                        
-                        historySection.style.display = 'block';
-                        this.textContent = 'Hide History';
-                    }})
-                    .catch(error => {{
-                        console.error('Error:', error);
-                        alert('Failed to load history.');
-                    }});
-                }}
-            }});
-        </script>
-    </body>
-    </html>
-    """
+    global home_page
+    if home_page is None or app.debug:
+        html = render_template('home.html', duration=DURATION)
+        home_page = (html, hashlib.sha256(html.encode('utf-8')).hexdigest()[:16])
+    html, etag = home_page
+
+    response = Response(html, mimetype='text/html')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'  # Always revalidate, so a new deploy shows up at once
+    return response.make_conditional(request)
 
 # API to get a random ice breaker question
 @app.route('/get_ice_breaker', methods=['GET'])
 def get_ice_breaker():
-    return jsonify({'question': get_random_ice_breaker()})
+    prompt = get_random_ice_breaker()
+    return jsonify({'question': prompt.text, 'prompt_id': prompt.id})
+
+# API to start a recording session; capture and processing run in the background.
+# With source 'browser' the page captures audio and uploads it to /sessions/<id>/audio.
+@app.route('/sessions', methods=['POST'])
+def create_session():
+    data = request.get_json(silent=True) or {}
+    # Prefer the registry id; free text still works and gets a text-derived id
+    prompt = prompt_registry.resolve(data.get('prompt_id'), data.get('prompt', ''))
+    user_id = data.get('user_id', 'anonymous')
+    source = data.get('source', 'server')
+
+    # Refuse new recordings while the recognizer is backed up or failing
+    retry_after = stt_retry_after()
+    if retry_after:
+        return overloaded_response(retry_after)
+
+    if source == 'browser':
+        session = session_manager.create(user_id, prompt.text, source, prompt.id)
+        session.stream = StreamingTranscriber(
+            recognize_chunk,
+            PROCESSING_SAMPLE_RATE,
+            retry_on=(sr.RequestError,),
+            max_seconds=DURATION + STREAM_GRACE,
+            on_chunk=partial_results_publisher(session_manager, session)
+        )
+    elif source == 'server':
+        session = session_manager.submit(user_id, prompt.text, prompt.id)
+    else:
+        return jsonify({'message': f'Unknown source: {source}'}), 400
+
+    response = {
+        'session_id': session.id,
+        'state': session.state,
+        'status_url': f'/sessions/{session.id}',
+        'events_url': f'/sessions/{session.id}/events'
+    }
+    if source == 'browser':
+        response['audio_url'] = f'/sessions/{session.id}/audio'
+        response['finish_url'] = f'/sessions/{session.id}/finish'
+        response['sample_rate'] = PROCESSING_SAMPLE_RATE
+    return jsonify(response), 202
+
+# API to upload the next block of a browser session's audio.
+# The body is mono little-endian int16 PCM at the sample_rate the session was created
+# with; ?seq= orders blocks and makes retries safe. Other rates are refused rather than
+# resampled, since resampling each block on its own leaves filter artifacts at the seams.
+@app.route('/sessions/<session_id>/audio', methods=['POST'])
+def upload_session_audio(session_id):
+    session = session_manager.get(session_id)
+    if not session or session.source != 'browser':
+        return jsonify({'message': 'Session not found'}), 404
+    if session.state != RECEIVING:
+        return jsonify({'message': 'Session is no longer accepting audio'}), 409
+
+    seq = request.args.get('seq', type=int)
+    sample_rate = request.headers.get('X-Sample-Rate', session.stream.sample_rate, type=int)
+    if sample_rate != session.stream.sample_rate:
+        return jsonify({'message': f'Audio must be sent at {session.stream.sample_rate} Hz'}), 400
+    pcm = request.get_data()
+    if len(pcm) % 2:
+        return jsonify({'message': 'Audio must be 16-bit PCM'}), 400
+
+    try:
+        accepted = session.stream.feed(pcm, seq)
+    except RuntimeError as e:
+        return jsonify({'message': str(e)}), 409
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 413
+
+    return jsonify({'accepted': accepted, 'seconds': round(session.stream.seconds, 2)})
+
+# API to mark a browser session's upload as complete and get it scored
+@app.route('/sessions/<session_id>/finish', methods=['POST'])
+def finish_session(session_id):
+    session = session_manager.get(session_id)
+    if not session or session.source != 'browser':
+        return jsonify({'message': 'Session not found'}), 404
+    if not session_manager.transition(session, RECEIVING, PROCESSING):
+        return jsonify({'message': 'Session already finished'}), 409
+
+    session_manager.schedule(session, finish_streaming_session)
+    return jsonify({'session_id': session.id, 'state': session.state}), 202
 
-# API to start recording and process immediately
+# API to get the state and results of a recording session
+@app.route('/sessions/<session_id>', methods=['GET'])
+def get_session(session_id):
+    session = session_manager.get(session_id)
+    if not session:
+        return jsonify({'message': 'Session not found'}), 404
+    return jsonify(session.to_dict())
+
+# Server-sent-events stream of a recording session's progress
+@app.route('/sessions/<session_id>/events', methods=['GET'])
+def session_events(session_id):
+    session = session_manager.get(session_id)
+    if not session:
+        return jsonify({'message': 'Session not found'}), 404
+
+    last_event_id = request.headers.get('Last-Event-ID', '0')
+    last_event_id = int(last_event_id) if last_event_id.isdigit() else 0
+
+    return Response(
+        stream_with_context(session_manager.stream(session, last_event_id)),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+# Legacy API: start recording and wait for the result.
+# New clients should use /sessions, which does not hold a worker for the recording.
 @app.route('/start_recording', methods=['POST'])
 def start_recording():
     # Get the prompt and user ID from the request
     data = request.get_json()
-    prompt = data.get('prompt', '')
+    prompt = prompt_registry.resolve(data.get('prompt_id'), data.get('prompt', ''))
     user_id = data.get('user_id', 'anonymous')
-    
-    audio_file = record_audio()
-    
-    # Save audio to MongoDB
-    record_id = save_audio_to_db(audio_file, user_id, prompt)
-    
-    # Process the recorded audio
-    results = process_audio_file(audio_file, prompt)
-    
-    # Save the results to MongoDB
-    save_score_to_db(
-        record_id, 
-        results['transcribed_text'], 
-        results['full_word_count'], 
-        results['similarity_percentage'], 
-        results['score']
-    )
-    
-    return jsonify({
-        'message': 'Recording and processing completed',
-        'transcribed_text': results['transcribed_text'],
-        'word_count': results['full_word_count'],
-        'score': results['score'],
-        'similarity_percentage': results['similarity_percentage'],
-        'record_id': record_id
-    })
 
-# API to get user recording history
-@app.route('/get_history', methods=['POST'])
+    retry_after = stt_retry_after()
+    if retry_after:
+        return overloaded_response(retry_after)
+
+    session = session_manager.submit(user_id, prompt.text, prompt.id)
+    session_manager.wait(session)
+
+    if session.error:
+        return jsonify({'message': 'Recording failed', 'error': session.error}), 500
+
+    if session.result.get('status') == PENDING_RETRY:
+        # Saved but not scored yet: answer as /process_audio does for a deferred recording
+        response = jsonify(dict(session.result, status_url=url_for('get_job', job_id=session.result['job_id'])))
+        if session.result['retry_after']:
+            response.headers['Retry-After'] = str(session.result['retry_after'])
+        return response, 202
+
+    return jsonify(dict(session.result, message='Recording and processing completed'))
+
+# Function to encode the keyset cursor that resumes history after a recording
+def encode_history_cursor(recording):
+    return f"{recording['timestamp'].isoformat()}_{recording['_id']}"
+
+# Function to turn a history cursor back into the (timestamp, _id) it resumes after
+def decode_history_cursor(after):
+    timestamp, _, record_id = after.rpartition('_')
+    return datetime.fromisoformat(timestamp), ObjectId(record_id)
+
+# API to get user recording history, newest first, one page at a time.
+# Pass the returned 'next' as ?after= (or "after" in the JSON body) for the following page.
+@app.route('/get_history', methods=['GET', 'POST'])
 def get_history():
-    data = request.get_json()
-    user_id = data.get('user_id', 'anonymous')
-    
-    # Query MongoDB for user recordings
-    recordings = list(recordings_collection.find(
-        {'user_id': user_id},
-        {'audio_data': 0}  # Exclude audio data for performance
-    ).sort('timestamp', -1))  # Sort by newest first
-    
-    # Convert ObjectId to string for JSON serialization
-    for recording in recordings:
-        recording['_id'] = str(recording['_id'])
-        
-        # Convert datetime objects to ISO format strings
-        if 'timestamp' in recording:
-            recording['timestamp'] = recording['timestamp'].isoformat()
-        if 'processed_at' in recording:
-            recording['processed_at'] = recording['processed_at'].isoformat()
-    
-    return jsonify({
-        'recordings': recordings
-    })
+    data = request.get_json(silent=True) or {}
+    user_id = request.args.get('user_id', data.get('user_id', 'anonymous'))
+    after = request.args.get('after', data.get('after'))
+    try:
+        limit = min(max(int(request.args.get('limit', data.get('limit', HISTORY_PAGE_SIZE))), 1), HISTORY_MAX_PAGE_SIZE)
+        position = decode_history_cursor(after) if after else None
+    except (TypeError, ValueError, InvalidId):
+        return jsonify({'message': 'Invalid limit or after'}), 400
+
+    # Walks the user_history index; only the fields the history table shows are read
+    cursor = recordings.history(user_id, limit, position)
+
+    # Serialize row by row instead of building the whole page in memory
+    def generate():
+        yield '{"recordings": ['
+        last = None
+        try:
+            for count, recording in enumerate(cursor):
+                if count == limit:
+                    break
+                last = recording
+                yield (', ' if count else '') + json.dumps({
+                    '_id': str(recording['_id']),
+                    'timestamp': recording['timestamp'].isoformat(),
+                    'prompt': recording.get('prompt'),
+                    'score': recording.get('score'),
+                    'status': recording.get('status')
+                })
+            else:
+                last = None  # Fewer than limit + 1 rows: this is the last page
+        finally:
+            cursor.close()
+        yield '], "next": ' + json.dumps(encode_history_cursor(last) if last else None) + '}'
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
 
 # API to get the recorded audio file
 @app.route('/get_audio', methods=['GET'])
@@ -677,26 +773,73 @@ def get_audio():
         return send_file(audio_file, as_attachment=True)
     return jsonify({'message': 'No recorded file found'}), 404
 
-# API to play a specific recording
+# API to play a specific recording; supports Range requests and conditional GET
 @app.route('/play_audio/<record_id>', methods=['GET'])
 def play_audio(record_id):
-    audio_data, prompt = get_audio_from_db(record_id)
-    if audio_data:
-        # Create a response with the audio data
-        return Response(
-            audio_data,
-            mimetype='audio/wav',
-            headers={
-                'Content-Disposition': f'inline; filename=recording_{record_id}.wav'
-            }
-        )
-    return jsonify({'message': 'Recording not found'}), 404
+    audio = open_audio_from_db(record_id)
+    if not audio:
+        return jsonify({'message': 'Recording not found'}), 404
+
+    extension = audio.mimetype.split('/')[-1]
+    headers = {
+        'Accept-Ranges': 'bytes',
+        'ETag': f'"{audio.etag}"',
+        'Cache-Control': 'private, max-age=86400',
+        'Content-Disposition': f'inline; filename=recording_{record_id}.{extension}'
+    }
+    if audio.last_modified:
+        headers['Last-Modified'] = http_date(audio.last_modified)
+
+    # Conditional GET: the stored blob never changes, so a matching validator means 304
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(audio.etag)
+    else:
+        since = request.if_modified_since
+        not_modified = bool(since and audio.last_modified and audio.last_modified.replace(microsecond=0) <= since)
+    if not_modified:
+        audio.close()
+        return Response(status=304, headers=headers)
+
+    # A Range is only honoured if If-Range (when sent) still matches this blob
+    byte_range = request.range
+    if_range = request.if_range
+    if byte_range and (if_range.etag or if_range.date):
+        if if_range.etag:
+            range_valid = if_range.etag == audio.etag
+        else:
+            range_valid = bool(audio.last_modified and audio.last_modified.replace(microsecond=0) <= if_range.date)
+        if not range_valid:
+            byte_range = None
+
+    start, end, status = 0, audio.length, 200
+    if byte_range:
+        span = byte_range.range_for_length(audio.length)
+        if span is None:
+            audio.close()
+            headers['Content-Range'] = f'bytes */{audio.length}'
+            return Response(status=416, headers=headers)
+        start, end = span
+        status = 206
+        headers['Content-Range'] = f'bytes {start}-{end - 1}/{audio.length}'
+
+    headers['Content-Length'] = str(end - start)
+
+    # Stream the requested bytes straight from storage
+    response = Response(
+        audio.iter_range(start, end),
+        status=status,
+        mimetype=audio.mimetype,
+        headers=headers,
+        direct_passthrough=True
+    )
+    response.call_on_close(audio.close)  # HEAD requests never iterate the body
+    return response
 
 # Page to view recording details
 @app.route('/recording_details/<record_id>', methods=['GET'])
 def recording_details(record_id):
     # Get the recording from MongoDB
-    recording = recordings_collection.find_one({'_id': ObjectId(record_id)})
+    recording = recordings.find_details(record_id)
     
     if not recording:
         return "Recording not found", 404
@@ -708,124 +851,55 @@ def recording_details(record_id):
     word_count = recording.get('word_count', 'N/A')
     similarity = recording.get('similarity_percentage', 'N/A')
     score = recording.get('score', 'N/A')
+    if recording.get('status') == PENDING_RETRY:
+        transcribed_text = 'Speech recognition was unavailable; this recording will be transcribed shortly'
+    audio_type = recording.get('audio', {}).get('mimetype', 'audio/wav')
     
-    # Create the HTML page
-    return f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>Recording Details</title>
-        <style>
-            body {{
-                font-family: Arial, sans-serif;
-                max-width: 800px;
-                margin: 0 auto;
-                padding: 20px;
-            }}
-            h1 {{
-                color: #333;
-            }}
-            .details-container {{
-                background-color: #f9f9f9;
-                padding: 20px;
-                border-radius: 5px;
-                margin-top: 20px;
-            }}
-            .detail-row {{
-                margin-bottom: 15px;
-            }}
-            .detail-label {{
-                font-weight: bold;
-                display: inline-block;
-                width: 150px;
-            }}
-            .audio-container {{
-                margin: 20px 0;
-            }}
-            button {{
-                background-color: #4CAF50;
-                color: white;
-                padding: 10px 20px;
-                border: none;
-                border-radius: 5px;
-                cursor: pointer;
-                margin-top: 20px;
-            }}
-            button:hover {{
-                background-color: #45a049;
-            }}
-        </style>
-    </head>
-    <body>
-        <h1>Recording Details</h1>
-        
-        <div class="details-container">
-            <div class="detail-row">
-                <span class="detail-label">Date:</span>
-                <span>{timestamp}</span>
-            </div>
-            
-            <div class="detail-row">
-                <span class="detail-label">Prompt:</span>
-                <span>{prompt}</span>
-            </div>
-            
-            <div class="detail-row">
-                <span class="detail-label">Word Count:</span>
-                <span>{word_count}</span>
-            </div>
-            
-            <div class="detail-row">
-                <span class="detail-label">Relevance:</span>
-                <span>{similarity}%</span>
-            </div>
-            
-            <div class="detail-row">
-                <span class="detail-label">Score:</span>
-                <span>{score}%</span>
-            </div>
-        </div>
-        
-        <h2>Transcription</h2>
-        <div class="details-container">
-            <p>{transcribed_text}</p>
-        </div>
-        
-        <div class="audio-container">
-            <h2>Audio Recording</h2>
-            <audio controls>
-                <source src="/play_audio/{record_id}" type="audio/wav">
-                Your browser does not support the audio element.
-            </audio>
-        </div>
-        
-        <button onclick="window.location.href='/'">Back to Home</button>
-    </body>
-    </html>
-    """
+    return render_template(
+        'recording_details.html',
+        timestamp=timestamp,
+        prompt=prompt,
+        word_count=word_count,
+        similarity=similarity,
+        score=score,
+        transcribed_text=transcribed_text,
+        record_id=record_id,
+        audio_type=audio_type
+    )
 
-# API to process existing audio file
+# API to process existing audio file. With "async": true a stored recording is
+# queued for the workers instead, and the response points at the job's status.
 @app.route('/process_audio', methods=['GET', 'POST'])
 def process_existing_audio():
     data = request.get_json()
     record_id = data.get('record_id')
     
+    if record_id and data.get('async'):
+        if not ObjectId.is_valid(record_id) or not find_audio_record(record_id):
+            return jsonify({'message': 'Recording not found'}), 404
+        job_id = job_queue.enqueue(record_id)
+        return jsonify({
+            'message': 'Processing queued',
+            'job_id': job_id,
+            'status_url': url_for('get_job', job_id=job_id)
+        }), 202
+
+    retry_after = stt_retry_after()
+    if retry_after:
+        return overloaded_response(retry_after)
+
     if record_id:
         # Process from MongoDB
-        audio_data, prompt = get_audio_from_db(record_id)
-        if not audio_data:
+        try:
+            results = process_recording(record_id)
+        except IncompleteTranscript as e:
+            deferred = defer_recording(record_id, e)
+            response = jsonify(dict(deferred, status_url=url_for('get_job', job_id=deferred['job_id'])))
+            if deferred['retry_after']:
+                response.headers['Retry-After'] = str(deferred['retry_after'])
+            return response, 202
+        if results is None:
             return jsonify({'message': 'Recording not found'}), 404
-        
-        results = process_audio_data(audio_data, prompt)
-        
-        # Save results to MongoDB
-        save_score_to_db(
-            record_id, 
-            results['transcribed_text'], 
-            results['full_word_count'], 
-            results['similarity_percentage'], 
-            results['score']
-        )
     else:
         # Process local file
         audio_file = os.path.join(app.config['UPLOAD_FOLDER'], 'recorded_audio.wav')
@@ -834,7 +908,14 @@ def process_existing_audio():
         
         prompt = data.get('prompt', '')
         
-        results = process_audio_file(audio_file, prompt)
+        try:
+            results = process_audio_file(audio_file, prompt, prompt_id=data.get('prompt_id'))
+        except IncompleteTranscript as e:
+            response = jsonify({'message': 'Speech recognition is unavailable; try again later',
+                                'retry_after': e.retry_after})
+            if e.retry_after:
+                response.headers['Retry-After'] = str(e.retry_after)
+            return response, 503
     
     return jsonify({
         'transcribed_text': results['transcribed_text'],
@@ -843,5 +924,134 @@ def process_existing_audio():
         'similarity_percentage': results['similarity_percentage']
     })
 
+# API for the state of a processing job queued by /process_audio
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_queue.get(job_id)
+    if not job:
+        return jsonify({'message': 'Job not found'}), 404
+    return jsonify(job_status(job))
+
+# State of the background rescoring job started from /admin/rescore
+rescore_state = {'state': 'idle', 'rescored': 0, 'error': None}
+rescore_lock = threading.Lock()
+
+# Function to run a rescoring job and record its progress
+def run_rescore(options):
+    def on_progress(count):
+        rescore_state['rescored'] = count
+
+    try:
+        count = rescore(recordings_collection, db[CHECKPOINTS_COLLECTION], prompt_registry,
+                        on_progress=on_progress, **options)
+        # Bulk rescoring bypasses save_score_to_db, so recompute the rollups afterwards
+        stats_rollup.rebuild()
+        leaderboard.rebuild()
+        rescore_state.update(state='completed', rescored=count, finished_at=datetime.now().isoformat())
+    except Exception as e:
+        rescore_state.update(state='failed', error=str(e), finished_at=datetime.now().isoformat())
+
+# Admin API to rescore stored transcripts in the background (POST) or report progress (GET).
+# Same job as `python rescore.py`; an interrupted job resumes from its checkpoint.
+@app.route('/admin/rescore', methods=['GET', 'POST'])
+def admin_rescore():
+    if not ADMIN_TOKEN or request.headers.get('X-Admin-Token') != ADMIN_TOKEN:
+        return jsonify({'message': 'Forbidden'}), 403
+
+    if request.method == 'GET':
+        return jsonify(rescore_state)
+
+    data = request.get_json(silent=True) or {}
+    options = {
+        'batch_size': int(data.get('batch_size', RESCORE_BATCH_SIZE)),
+        'workers': int(data.get('workers', RESCORE_WORKERS)),
+        'max_word_count': int(data.get('max_word_count', MAX_WORD_COUNT)),
+        'restart': bool(data.get('restart', False))
+    }
+    with rescore_lock:
+        if rescore_state['state'] == 'running':
+            return jsonify(dict(rescore_state, message='A rescoring job is already running')), 409
+        rescore_state.clear()
+        rescore_state.update(state='running', rescored=0, error=None, options=options,
+                             started_at=datetime.now().isoformat())
+    threading.Thread(target=run_rescore, args=(options,), name='rescore', daemon=True).start()
+    return jsonify(rescore_state), 202
+
+# Admin API reporting what recording writes cost: round trips, document writes
+# and bytes sent per recording with results, plus the results waiting in the batch
+@app.route('/admin/write_stats', methods=['GET'])
+def admin_write_stats():
+    if not ADMIN_TOKEN or request.headers.get('X-Admin-Token') != ADMIN_TOKEN:
+        return jsonify({'message': 'Forbidden'}), 403
+    return jsonify(dict(recordings.writes.snapshot(), pending_batched_results=result_batcher.pending()))
+
+# Admin API counting the processing jobs in each state
+@app.route('/admin/jobs', methods=['GET'])
+def admin_jobs():
+    if not ADMIN_TOKEN or request.headers.get('X-Admin-Token') != ADMIN_TOKEN:
+        return jsonify({'message': 'Forbidden'}), 403
+    return jsonify(job_queue.counts())
+
+# API for score statistics of a user (?user_id=) or a prompt (?prompt_id=), read from rollups
+@app.route('/stats', methods=['GET'])
+def get_stats():
+    prompt_id = request.args.get('prompt_id')
+    if prompt_id:
+        return jsonify(stats_rollup.prompt_summary(prompt_id))
+
+    summary = stats_rollup.user_summary(request.args.get('user_id', 'anonymous'))
+    for prompt_stats in summary['prompts']:
+        prompt = prompt_registry.get(prompt_stats['prompt_id'])
+        prompt_stats['prompt'] = prompt.text if prompt else None
+    return jsonify(summary)
+
+# Function to rebuild the rollups in the background: once if they have never been
+# built, then every STATS_REBUILD_INTERVAL seconds to correct any drift
+def rebuild_stats_periodically():
+    due = stats_rollup.users.estimated_document_count() == 0
+    while due or STATS_REBUILD_INTERVAL:
+        if not due:
+            time.sleep(STATS_REBUILD_INTERVAL)
+        due = False
+        try:
+            stats_rollup.rebuild()
+        except Exception as e:
+            print(f"Stats rebuild failed: {e}")
+
+# API for the top scores overall, or for one prompt with ?prompt_id=; served from memory
+@app.route('/leaderboard', methods=['GET'])
+def get_leaderboard():
+    prompt_id = request.args.get('prompt_id')
+    try:
+        limit = int(request.args.get('limit', 0)) or None
+    except ValueError:
+        return jsonify({'message': 'Invalid limit'}), 400
+
+    entries = [{
+        'rank': rank,
+        'record_id': str(entry['record_id']),
+        'user_id': entry['user_id'],
+        'prompt_id': entry['prompt_id'],
+        'score': entry['score'],
+        'timestamp': entry['at'].isoformat() if entry.get('at') else None
+    } for rank, entry in enumerate(leaderboard.top(prompt_id, limit), 1)]
+    return jsonify({'prompt_id': prompt_id, 'entries': entries})
+
+# Function to create indexes, load the leaderboards and start the background
+# threads; deferred to the first request so importing the app never touches Mongo
+@app.before_first_request
+def startup():
+    load_prompt_registry()
+    recordings.ensure_indexes()
+    leaderboard.ensure_indexes()
+    job_queue.ensure_indexes()
+    leaderboard.warm()
+    leaderboard.start()
+    result_batcher.start()
+    threading.Thread(target=rebuild_stats_periodically, name='stats', daemon=True).start()
+
+# Write any batched results before the process exits
+atexit.register(result_batcher.flush)
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,269 @@
+import io
+import os
+import struct
+import wave
+from functools import lru_cache
+from math import gcd
+
+import numpy as np
+import speech_recognition as sr
+from pydub import AudioSegment
+
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+RESAMPLE_HALF_WIDTH = 10  # Filter half-length in units of max(up, down), as in scipy's resample_poly
+RESAMPLE_BLOCK = 65536  # Output samples computed per vectorized block
+
+# Voice activity detection settings
+VAD_ENABLED = os.getenv('VAD_ENABLED', '1') == '1'
+VAD_FRAME_MS = 30  # Analysis frame length
+VAD_ENERGY_RATIO = float(os.getenv('VAD_ENERGY_RATIO', '4'))  # Speech must be this many times louder than the noise floor
+VAD_MIN_ENERGY = float(os.getenv('VAD_MIN_ENERGY', '90000'))  # Mean-square floor, about RMS 300 in int16 units
+VAD_HANGOVER_MS = 300  # Padding kept around speech so word onsets and tails survive
+VAD_ZCR_THRESHOLD = 0.25  # Zero-crossing rate that marks quieter frames as unvoiced speech
+# Every setting that changes where audio is cut, e.g. for keys of cached transcripts
+VAD_SETTINGS = (VAD_ENABLED, VAD_FRAME_MS, VAD_ENERGY_RATIO, VAD_MIN_ENERGY, VAD_HANGOVER_MS, VAD_ZCR_THRESHOLD)
+
+
+# Function to locate the fmt and data chunks of a RIFF/WAVE buffer.
+# Returns (audio_format, channels, sample_rate, bits, data_view) or None.
+def _parse_wav(buffer):
+    view = memoryview(buffer).cast('B')
+    if len(view) < 12 or view[0:4] != b'RIFF' or view[8:12] != b'WAVE':
+        return None
+
+    fmt = None
+    pos = 12
+    while pos + 8 <= len(view):
+        chunk_id = view[pos:pos + 4].tobytes()
+        size = int.from_bytes(view[pos + 4:pos + 8], 'little')
+        body = pos + 8
+        if chunk_id == b'fmt ' and size >= 16:
+            audio_format, channels, sample_rate = struct.unpack_from('<HHI', view, body)
+            bits = struct.unpack_from('<H', view, body + 14)[0]
+            fmt = (audio_format, channels, sample_rate, bits)
+        elif chunk_id == b'data' and fmt:
+            # Streaming writers sometimes leave the size unset; clamp to what is there
+            end = min(body + size, len(view))
+            return fmt + (view[body:end],)
+        pos = body + size + (size & 1)  # Chunks are word aligned
+    return None
+
+
+# Function to decode WAV bytes into mono int16 samples and their sample rate.
+# 16-bit PCM is returned as a view over the input buffer without copying.
+def decode_wav(wav_bytes):
+    parsed = _parse_wav(wav_bytes)
+    if parsed and parsed[0] in (WAVE_FORMAT_PCM, WAVE_FORMAT_EXTENSIBLE) and parsed[3] == 16:
+        _, channels, sample_rate, _, data = parsed
+        samples = np.frombuffer(data, dtype='<i2', count=len(data) // 2)
+    else:
+        # Anything else (8/24/32-bit, float, compressed) goes through pydub once
+        segment = AudioSegment.from_file(io.BytesIO(wav_bytes)).set_sample_width(2)
+        channels, sample_rate = segment.channels, segment.frame_rate
+        samples = np.frombuffer(segment.raw_data, dtype='<i2')
+
+    if channels > 1:
+        usable = samples.size - samples.size % channels
+        samples = samples[:usable].reshape(-1, channels).mean(axis=1).astype(np.int16)
+    return samples, sample_rate
+
+
+# Function to encode mono int16 samples as WAV bytes
+def encode_wav(samples, sample_rate):
+    output = io.BytesIO()
+    with wave.open(output, 'wb') as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        wf.writeframes(np.ascontiguousarray(samples, dtype='<i2').tobytes())
+    return output.getvalue()
+
+
+# Function to build the polyphase filter bank for an up/down ratio.
+# Row p holds the taps used by outputs whose upsampled position has phase p,
+# reversed so they line up with a sliding window over the input.
+@lru_cache(maxsize=8)
+def _polyphase_bank(up, down):
+    half = RESAMPLE_HALF_WIDTH * max(up, down)
+    cutoff = 0.5 / max(up, down)  # Anti-alias cutoff at the upsampled rate, cycles per sample
+    k = np.arange(-half, half + 1)
+    taps = up * 2 * cutoff * np.sinc(2 * cutoff * k) * np.kaiser(2 * half + 1, 5.0)
+
+    width = -(-taps.size // up)  # Taps per phase
+    taps = np.concatenate([taps, np.zeros(width * up - taps.size)])
+    bank = taps.reshape(width, up).T[:, ::-1]
+    return np.ascontiguousarray(bank, dtype=np.float32), half
+
+
+# Function to resample int16 samples with a windowed-sinc polyphase filter.
+# Only the taps that touch real input samples are evaluated, in fixed-size blocks.
+def resample(samples, src_rate, dst_rate):
+    if src_rate == dst_rate or not samples.size:
+        return samples
+
+    divisor = gcd(src_rate, dst_rate)
+    up, down = dst_rate // divisor, src_rate // divisor
+    bank, center = _polyphase_bank(up, down)
+    width = bank.shape[1]
+
+    output_count = -(-samples.size * up // down)
+    positions = np.arange(output_count, dtype=np.int64) * down + center
+    newest = positions // up  # Newest input sample under each output
+    phases = positions % up
+
+    padded = np.concatenate([
+        np.zeros(width - 1, dtype=np.float32),
+        samples.astype(np.float32),
+        np.zeros(center // up + 2, dtype=np.float32)
+    ])
+    windows = np.lib.stride_tricks.sliding_window_view(padded, width)
+
+    output = np.empty(output_count, dtype=np.int16)
+    for start in range(0, output_count, RESAMPLE_BLOCK):
+        block = slice(start, start + RESAMPLE_BLOCK)
+        values = np.einsum('ij,ij->i', windows[newest[block]], bank[phases[block]])
+        output[block] = np.clip(np.rint(values), -32768, 32767)
+    return output
+
+
+# Function to bring decoded audio to the processing rate
+def to_processing_rate(samples, sample_rate, target_rate):
+    if target_rate and sample_rate != target_rate:
+        return resample(samples, sample_rate, target_rate), target_rate
+    return samples, sample_rate
+
+
+# Function to split samples into views of at most chunk_length seconds
+def split_samples(samples, sample_rate, chunk_length):
+    step = int(chunk_length * sample_rate)
+    return [samples[start:start + step] for start in range(0, samples.size, step)]
+
+
+# Function to wrap a sample view as recognizer input without copying it
+def to_audio_data(samples, sample_rate):
+    return sr.AudioData(samples.data.cast('B'), sample_rate, 2)
+
+
+# Function to compute per-frame energy and zero-crossing rate in one vectorized pass
+def frame_features(samples, sample_rate, frame_ms=VAD_FRAME_MS):
+    frame_length = max(int(sample_rate * frame_ms / 1000), 1)
+    frame_count = samples.size // frame_length
+    frames = samples[:frame_count * frame_length].reshape(frame_count, frame_length).astype(np.float32)
+
+    energy = np.mean(frames * frames, axis=1)
+    signs = np.signbit(frames)
+    zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / frame_length
+    return energy, zcr, frame_length
+
+
+# Function to mark frames that contain speech.
+# Voiced speech is loud; unvoiced consonants are quieter but cross zero often.
+def speech_mask(energy, zcr, frame_ms=VAD_FRAME_MS):
+    if not energy.size:
+        return np.zeros(0, dtype=bool)
+
+    noise_floor = np.percentile(energy, 10)
+    threshold = max(noise_floor * VAD_ENERGY_RATIO, VAD_MIN_ENERGY)
+    mask = (energy > threshold) | ((energy > threshold / 2) & (zcr > VAD_ZCR_THRESHOLD))
+
+    # Extend speech regions by the hangover on both sides
+    pad = VAD_HANGOVER_MS // frame_ms
+    if pad and mask.any():
+        mask = np.convolve(mask, np.ones(2 * pad + 1), mode='same') > 0
+    return mask
+
+
+# Function to pick the frame to cut at within [low, high): the quietest pause frame,
+# or the quietest frame if the speaker never stops
+def _pick_cut(mask, energy, low, high):
+    pauses = np.flatnonzero(~mask[low:high])
+    region = energy[low:high]
+    return low + int(pauses[np.argmin(region[pauses])] if pauses.size else np.argmin(region))
+
+
+# Function to split speech into chunks of about target_length seconds, cutting in pauses.
+# Leading/trailing silence is trimmed and chunks without speech are dropped.
+def split_on_silence(samples, sample_rate, target_length, frame_ms=VAD_FRAME_MS):
+    energy, zcr, frame_length = frame_features(samples, sample_rate, frame_ms)
+    mask = speech_mask(energy, zcr, frame_ms)
+    speech_frames = np.flatnonzero(mask)
+    if not speech_frames.size:
+        return []
+
+    frame_count = mask.size
+    last = speech_frames[-1] + 1
+    target = max(int(target_length * 1000 / frame_ms), 1)
+    window = max(target // 4, 1)  # Look this far either side of the target for a pause
+
+    chunks = []
+    start = speech_frames[0]
+    while start < last:
+        if last - start <= target + window:
+            end = last
+        else:
+            end = max(_pick_cut(mask, energy, start + target - window, start + target + window), start + 1)
+
+        if mask[start:end].any():
+            # The final chunk keeps the samples after the last whole frame
+            stop = samples.size if end == frame_count else end * frame_length
+            chunks.append(samples[start * frame_length:stop])
+
+        # Skip the pause before the next chunk
+        following = np.flatnonzero(mask[end:last])
+        if not following.size:
+            break
+        start = end + following[0]
+    return chunks
+
+
+# Function to trim leading and trailing silence; returns None if there is no speech
+def trim_silence(samples, sample_rate):
+    chunks = split_on_silence(samples, sample_rate, samples.size / sample_rate + 1)
+    return chunks[0] if chunks else None
+
+
+# Function to find where to cut the first chunk off a growing buffer.
+# Returns a sample index near target_length seconds, or None until enough audio
+# has arrived to look past the target for a pause.
+def find_pause(samples, sample_rate, target_length, frame_ms=VAD_FRAME_MS):
+    target = max(int(target_length * 1000 / frame_ms), 1)
+    window = max(target // 4, 1)
+    energy, zcr, frame_length = frame_features(samples, sample_rate, frame_ms)
+    if energy.size < target + window:
+        return None
+
+    if not VAD_ENABLED:
+        return target * frame_length
+
+    mask = speech_mask(energy, zcr, frame_ms)
+    return _pick_cut(mask, energy, target - window, target + window) * frame_length
+
+
+# Function to generate speech-like mono int16 samples for benchmarks and load tests:
+# voiced bursts (a gliding pitch with harmonics, shaped into syllables at about
+# 4 per second) separated by pauses of low background noise. The same seed
+# always gives the same audio.
+def synthetic_speech(seconds, sample_rate=16000, seed=0):
+    rng = np.random.default_rng(seed)
+    total = int(seconds * sample_rate)
+    samples = rng.normal(0, 30, total)  # Background noise, well below the VAD floor
+
+    position = int(rng.uniform(0.1, 0.4) * sample_rate)
+    while position < total:
+        length = min(int(rng.uniform(0.6, 2.5) * sample_rate), total - position)
+        t = np.arange(length) / sample_rate
+        pitch = rng.uniform(100, 220) * (1 + 0.15 * np.sin(2 * np.pi * rng.uniform(0.3, 1.0) * t))
+        phase = 2 * np.pi * np.cumsum(pitch) / sample_rate
+        voice = sum(np.sin(k * phase) / k for k in range(1, 5))
+        syllables = np.clip(np.sin(2 * np.pi * rng.uniform(3, 5) * t), 0, None) ** 0.5
+        samples[position:position + length] += voice * syllables * rng.uniform(3000, 7000)
+        position += length + int(rng.uniform(0.2, 0.8) * sample_rate)
+
+    return np.clip(samples, -32768, 32767).astype(np.int16)
+
+
+# Function to generate synthetic speech as WAV bytes
+def synthetic_wav(seconds, sample_rate=16000, seed=0):
+    return encode_wav(synthetic_speech(seconds, sample_rate, seed), sample_rate)
@@ -0,0 +1,269 @@
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+import numpy as np
+import requests
+
+from audio import synthetic_speech
+
+# Usage, from the "Ice Breaker" directory:
+#
+#   python -m benchmarks.loadtest --concurrency 1 2 4 8 16 --duration 30 --stt-latency 0.5
+#   python -m benchmarks.loadtest --url http://127.0.0.1:5000 --concurrency 8
+#
+# Without --url the app is started in this process on a threaded server with
+# stand-ins for everything external: synthetic speech instead of a microphone
+# (AUDIO_SOURCE=fake), the stub recognizer with the given latency, and
+# mongomock unless --mongo pymongo is given. The load generator shares the
+# process (and the GIL) with the app there; point --url at a separately started
+# instance, configured the same way, for cleaner numbers.
+#
+# Each virtual user loops over flows picked by --mix weights:
+#   upload   a browser session: create, upload 1-second PCM blocks, finish, poll until scored
+#   record   the legacy /start_recording call (server-side capture from the fake source)
+#   history  one /get_history page
+#   play     /play_audio of a recording created during the run
+#   process  /process_audio of a recording created during the run
+#
+# For each concurrency level the report gives requests per second, latency
+# percentiles and the error rate per endpoint and per flow, plus the share of
+# requests shed with 429 by admission control (counted as errors too).
+
+DEFAULT_MIX = 'upload=1,history=4,play=2,process=1'
+DEFAULT_DURATION = 30  # Seconds per concurrency level
+UPLOAD_BLOCK_SECONDS = 1  # Matches the browser client
+POLL_INTERVAL = 0.1  # Seconds between session status polls
+SEED_RECORDINGS = 3  # Recordings created before measuring so play/process have targets
+
+
+# Collects latencies and errors for a concurrency level
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.shed = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds, ok, shed=False):
+        with self._lock:
+            self.latencies[name].append(seconds)
+            if not ok:
+                self.errors[name] += 1
+            if shed:
+                self.shed[name] += 1
+
+    def report(self, elapsed):
+        report = {}
+        with self._lock:
+            for name, values in sorted(self.latencies.items()):
+                values = np.sort(np.asarray(values)) * 1000
+                report[name] = {
+                    'requests': int(values.size),
+                    'throughput': round(values.size / elapsed, 2),  # Per second
+                    'error_rate': round(self.errors[name] / values.size, 4),
+                    'shed_rate': round(self.shed[name] / values.size, 4),
+                    'p50_ms': round(float(np.percentile(values, 50)), 2),
+                    'p90_ms': round(float(np.percentile(values, 90)), 2),
+                    'p99_ms': round(float(np.percentile(values, 99)), 2),
+                    'max_ms': round(float(values[-1]), 2)
+                }
+        return report
+
+
+# One simulated client with its own connection pool
+class VirtualUser:
+    def __init__(self, base_url, recorder, record_ids, upload_seconds, index):
+        self.base_url = base_url
+        self.recorder = recorder
+        self.record_ids = record_ids
+        self.upload_seconds = upload_seconds
+        self.user_id = f'load-{index}'
+        self.http = requests.Session()
+        self.rng = random.Random(index)
+
+    # Send one request and record it under name; returns the response or None on a connection error
+    def call(self, name, method, path, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = self.http.request(method, self.base_url + path, timeout=600, **kwargs)
+        except requests.RequestException:
+            self.recorder.add(name, time.perf_counter() - started, False)
+            return None
+        self.recorder.add(name, time.perf_counter() - started, response.status_code < 400, response.status_code == 429)
+        return response
+
+    def upload(self):
+        response = self.call('POST /sessions', 'POST', '/sessions', json={'user_id': self.user_id, 'source': 'browser'})
+        if response is None or response.status_code != 202:
+            return False
+        session = response.json()
+
+        samples = synthetic_speech(self.upload_seconds, session['sample_rate'], seed=self.rng.getrandbits(32))
+        step = session['sample_rate'] * UPLOAD_BLOCK_SECONDS
+        headers = {'Content-Type': 'application/octet-stream', 'X-Sample-Rate': str(session['sample_rate'])}
+        for seq, start in enumerate(range(0, samples.size, step)):
+            block = samples[start:start + step].astype('<i2').tobytes()
+            response = self.call('POST /sessions/:id/audio', 'POST', f"{session['audio_url']}?seq={seq}",
+                                 data=block, headers=headers)
+            if response is None or response.status_code != 200:
+                return False
+
+        response = self.call('POST /sessions/:id/finish', 'POST', session['finish_url'])
+        if response is None or response.status_code != 202:
+            return False
+        return self.wait_for(session['status_url'])
+
+    def record(self):
+        response = self.call('POST /start_recording', 'POST', '/start_recording', json={'user_id': self.user_id})
+        if response is None or response.status_code not in (200, 202):  # 202: saved, scoring deferred
+            return False
+        self.record_ids.append(response.json()['record_id'])
+        return True
+
+    # Poll a session until it finishes; True if it completed
+    def wait_for(self, status_url):
+        while True:
+            response = self.call('GET /sessions/:id', 'GET', status_url)
+            if response is None or response.status_code != 200:
+                return False
+            session = response.json()
+            if session['state'] == 'completed':
+                self.record_ids.append(session['result']['record_id'])
+                return True
+            if session['state'] == 'failed':
+                return False
+            time.sleep(POLL_INTERVAL)
+
+    def history(self):
+        response = self.call('GET /get_history', 'GET', '/get_history', params={'user_id': self.user_id})
+        return response is not None and response.status_code == 200
+
+    def play(self):
+        record_id = self.rng.choice(self.record_ids)
+        response = self.call('GET /play_audio/:id', 'GET', f'/play_audio/{record_id}')
+        return response is not None and response.status_code == 200
+
+    def process(self):
+        record_id = self.rng.choice(self.record_ids)
+        response = self.call('POST /process_audio', 'POST', '/process_audio', json={'record_id': record_id})
+        return response is not None and response.status_code < 400
+
+    # Run flows until the deadline, timing each whole flow as 'flow:<name>'
+    def run(self, flows, weights, deadline):
+        while time.monotonic() < deadline:
+            flow = self.rng.choices(flows, weights)[0]
+            started = time.perf_counter()
+            ok = getattr(self, flow)()
+            self.recorder.add(f'flow:{flow}', time.perf_counter() - started, ok)
+
+
+# Function to parse "upload=1,history=4" into flow names and weights
+def parse_mix(mix):
+    flows, weights = [], []
+    for part in mix.split(','):
+        name, _, weight = part.partition('=')
+        if name not in ('upload', 'record', 'history', 'play', 'process'):
+            raise ValueError(f"Unknown flow '{name}'")
+        flows.append(name)
+        weights.append(float(weight or 1))
+    return flows, weights
+
+
+# Function to run one concurrency level and return its report
+def run_level(base_url, concurrency, duration, flows, weights, record_ids, upload_seconds):
+    recorder = Recorder()
+    deadline = time.monotonic() + duration
+    users = [VirtualUser(base_url, recorder, record_ids, upload_seconds, index) for index in range(concurrency)]
+    threads = [threading.Thread(target=user.run, args=(flows, weights, deadline), daemon=True) for user in users]
+
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return {'concurrency': concurrency, 'seconds': round(elapsed, 2), 'endpoints': recorder.report(elapsed)}
+
+
+# Function to start the app in this process with local stand-ins; returns its base URL
+def start_local_app(args):
+    os.environ.setdefault('AUDIO_SOURCE', 'fake')
+    os.environ.setdefault('RECORDING_DURATION', str(args.upload_seconds))
+    os.environ['STT_BACKEND'] = 'stub'
+    os.environ['STT_STUB_LATENCY'] = str(args.stt_latency)
+    os.environ['MONGO_BACKEND'] = args.mongo
+    os.environ.setdefault('TRANSCRIPT_CACHE', 'off')
+
+    from werkzeug.serving import make_server
+
+    import app
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)  # One log line per request would swamp the report
+    server = make_server('127.0.0.1', 0, app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='loadtest-server', daemon=True).start()
+    return f'http://127.0.0.1:{server.server_port}'
+
+
+# Function to print a readable summary of a level to stderr
+def print_level(level):
+    print(f"\nConcurrency {level['concurrency']} ({level['seconds']}s)", file=sys.stderr)
+    print(f"{'endpoint':30} {'req':>6} {'req/s':>8} {'err%':>6} {'shed%':>6} {'p50':>9} {'p90':>9} {'p99':>9} "
+          f"{'max':>9}", file=sys.stderr)
+    for name, stats in level['endpoints'].items():
+        print(f"{name:30} {stats['requests']:>6} {stats['throughput']:>8} {stats['error_rate'] * 100:>6.1f} "
+              f"{stats['shed_rate'] * 100:>6.1f} {stats['p50_ms']:>9} {stats['p90_ms']:>9} {stats['p99_ms']:>9} "
+              f"{stats['max_ms']:>9}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load-test the HTTP API at increasing concurrency')
+    parser.add_argument('--url', help='Base URL of a running instance (default: start one in this process)')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 2, 4, 8], help='Virtual users per level')
+    parser.add_argument('--duration', type=float, default=DEFAULT_DURATION, help='Seconds per level')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='Flow weights, e.g. upload=1,history=4,play=2,process=1')
+    parser.add_argument('--upload-seconds', type=int, default=10, help='Seconds of speech per uploaded recording')
+    parser.add_argument('--stt-latency', type=float, default=0.0, help='Stub recognizer seconds per chunk')
+    parser.add_argument('--mongo', choices=['mongomock', 'pymongo'], default='mongomock',
+                        help='In-process app only: mongomock, or pymongo for the Mongo at MONGO_URI')
+    parser.add_argument('--output', help='Write the JSON report here instead of stdout')
+    args = parser.parse_args()
+
+    flows, weights = parse_mix(args.mix)
+    base_url = args.url.rstrip('/') if args.url else start_local_app(args)
+
+    # Recordings for the play and process flows to target
+    record_ids = []
+    seeder = VirtualUser(base_url, Recorder(), record_ids, args.upload_seconds, -1)
+    for _ in range(SEED_RECORDINGS):
+        if not seeder.upload():
+            sys.exit(f"Could not create seed recordings at {base_url}")
+
+    levels = []
+    for concurrency in args.concurrency:
+        level = run_level(base_url, concurrency, args.duration, flows, weights, record_ids, args.upload_seconds)
+        print_level(level)
+        levels.append(level)
+
+    report = {
+        'url': args.url or 'in-process',
+        'mix': dict(zip(flows, weights)),
+        'upload_seconds': args.upload_seconds,
+        'stt_latency': args.stt_latency if not args.url else None,
+        'levels': levels
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
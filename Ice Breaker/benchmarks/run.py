@@ -0,0 +1,225 @@
+import argparse
+import base64
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+# Benchmarks run against the app module as configured here: the deterministic
+# stub recognizer, an in-memory Mongo and no transcript cache (a cache would turn
+# every repeat into a hit). Set these before anything imports the app.
+os.environ.setdefault('STT_BACKEND', 'stub')
+os.environ.setdefault('MONGO_BACKEND', 'mongomock')
+os.environ.setdefault('TRANSCRIPT_CACHE', 'off')
+os.environ.setdefault('AUDIO_STORAGE', 'binary')
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+# Usage, from the "Ice Breaker" directory:
+#
+#   python -m benchmarks.run --output results.json
+#   python -m benchmarks.run --compare results.json   # exits 1 on a regression
+#
+# Every benchmark is timed over several rounds after a warm-up, and reported
+# as milliseconds per call. Inputs are generated from fixed seeds, so runs on
+# different commits measure the same work. Comparisons use the fastest round,
+# which scheduling and cache noise can only slow down, and ignore slowdowns
+# within the spread of the rounds.
+
+DEFAULT_ROUNDS = 20
+DEFAULT_TOLERANCE = 0.15  # A fastest round this much slower than the baseline's is a regression...
+NOISE_STDEVS = 2  # ...if it is also slower by more than this many standard deviations of the rounds
+AUDIO_LENGTHS = (10, 60, 120)  # Seconds
+SAMPLE_RATES = (16000, 44100)
+TRANSCRIPT_WORDS = (50, 300)
+
+
+# Function to time fn over rounds calls (after one warm-up call) in milliseconds
+def measure(fn, rounds=DEFAULT_ROUNDS):
+    fn()
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        'unit': 'ms',
+        'rounds': rounds,
+        'min': round(timings[0], 4),
+        'median': round(statistics.median(timings), 4),
+        'mean': round(statistics.fmean(timings), 4),
+        'p95': round(timings[min(int(len(timings) * 0.95), len(timings) - 1)], 4),
+        'stdev': round(statistics.stdev(timings), 4) if len(timings) > 1 else 0.0
+    }
+
+
+# Function to build a transcript of word_count words, as the stub recognizer would
+def synthetic_transcript(word_count, seed=0):
+    from stt import StubBackend
+
+    rng = np.random.default_rng(seed)
+    return " ".join(StubBackend.VOCABULARY[i] for i in rng.integers(0, len(StubBackend.VOCABULARY), word_count))
+
+
+# Microbenchmarks of the individual processing steps
+def micro_benchmarks(rounds, lengths, rates):
+    import app
+    from audio import decode_wav, encode_wav, synthetic_speech, synthetic_wav
+    from scoring import calculate_score, calculate_similarity
+
+    results = []
+
+    def add(name, params, fn):
+        results.append(dict(name=name, params=params, **measure(fn, rounds)))
+
+    with tempfile.TemporaryDirectory() as directory:
+        for seconds in lengths:
+            for rate in rates:
+                params = {'seconds': seconds, 'sample_rate': rate}
+                samples = synthetic_speech(seconds, rate)
+                wav = encode_wav(samples, rate)
+                path = os.path.join(directory, f'speech_{seconds}_{rate}.wav')
+                with open(path, 'wb') as f:
+                    f.write(wav)
+
+                add('encode_wav', params, lambda: encode_wav(samples, rate))
+                add('decode_wav', params, lambda: decode_wav(wav))
+                add('split_audio', params, lambda: app.split_audio(path))
+                add('split_audio_data', params, lambda: app.split_audio_data(wav))
+
+                # Legacy records keep the WAV base64-encoded inside the document
+                encoded = base64.b64encode(wav).decode('utf-8')
+                add('base64_encode', params, lambda: base64.b64encode(wav).decode('utf-8'))
+                add('base64_decode', params, lambda: base64.b64decode(encoded))
+
+        wav = synthetic_wav(max(lengths))
+
+        # Delete each blob again so the store does not grow from round to round
+        def audio_store_roundtrip():
+            meta = app.audio_store.put(wav, 'benchmark.wav')
+            app.audio_store.read_wav(meta)
+            app.audio_store.delete(meta)
+
+        add('audio_store_roundtrip', {'seconds': max(lengths), 'sample_rate': 16000}, audio_store_roundtrip)
+
+    app.load_prompt_registry()
+    prompt = app.prompt_registry.random()
+    for words in TRANSCRIPT_WORDS:
+        text = synthetic_transcript(words)
+        params = {'words': words}
+        add('calculate_similarity', params, lambda: calculate_similarity(prompt, text))
+        add('calculate_similarity_text_prompt', params, lambda: calculate_similarity(prompt.text, text))
+        add('calculate_score', params, lambda: calculate_score(words, prompt, text))
+
+    return results
+
+
+# End-to-end runs: process_audio_data on synthetic speech, and the full
+# save-with-results path a recording session takes
+def end_to_end_benchmarks(rounds, lengths):
+    import app
+    from audio import synthetic_wav
+
+    app.load_prompt_registry()
+    prompt = app.prompt_registry.random()
+    results = []
+    for seconds in lengths:
+        wav = synthetic_wav(seconds, app.PROCESSING_SAMPLE_RATE)
+        params = {'seconds': seconds, 'sample_rate': app.PROCESSING_SAMPLE_RATE}
+
+        timing = measure(lambda: app.process_audio_data(wav, prompt.text, prompt_id=prompt.id), rounds)
+        timing['realtime_factor'] = round(seconds * 1000 / timing['median'], 1)  # Audio seconds per wall second
+        results.append(dict(name='process_audio_data', params=params, **timing))
+
+        def session():
+            outcome = app.process_audio_data(wav, prompt.text, prompt_id=prompt.id)
+            app.save_audio_data_to_db(wav, 'benchmark.wav', 'benchmark', prompt.text, prompt_id=prompt.id,
+                                      results=outcome)
+
+        results.append(dict(name='process_and_save', params=params, **measure(session, rounds)))
+    return results
+
+
+# Function to describe where the numbers came from
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=APP_DIR, capture_output=True, text=True,
+                                timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'commit': commit,
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'stt_backend': os.environ['STT_BACKEND'],
+        'mongo_backend': os.environ['MONGO_BACKEND']
+    }
+
+
+# Function to compare fastest rounds against a baseline run; returns the regressions.
+# A slowdown counts only past the tolerance and past the noise both runs measured.
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE, noise_stdevs=NOISE_STDEVS):
+    previous = {(entry['name'], json.dumps(entry['params'], sort_keys=True)): entry for entry in baseline['results']}
+    regressions = []
+    for entry in results:
+        before = previous.get((entry['name'], json.dumps(entry['params'], sort_keys=True)))
+        if not before or not before['min']:
+            continue
+        change = entry['min'] / before['min'] - 1
+        noise = noise_stdevs * max(entry['stdev'], before['stdev'])
+        entry['baseline_min'] = before['min']
+        entry['change'] = round(change, 4)
+        if change > tolerance and entry['min'] - before['min'] > noise:
+            regressions.append(entry)
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the audio processing pipeline')
+    parser.add_argument('--suite', choices=['all', 'micro', 'e2e'], default='all')
+    parser.add_argument('--rounds', type=int, default=DEFAULT_ROUNDS, help='Timed calls per benchmark')
+    parser.add_argument('--lengths', type=int, nargs='+', default=list(AUDIO_LENGTHS), help='Audio lengths in seconds')
+    parser.add_argument('--rates', type=int, nargs='+', default=list(SAMPLE_RATES), help='Capture sample rates')
+    parser.add_argument('--output', help='Write the JSON results here instead of stdout')
+    parser.add_argument('--compare', help='Baseline JSON from an earlier run; exit 1 on a regression')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument('--noise-stdevs', type=float, default=NOISE_STDEVS)
+    args = parser.parse_args()
+
+    results = []
+    if args.suite in ('all', 'micro'):
+        results += micro_benchmarks(args.rounds, args.lengths, args.rates)
+    if args.suite in ('all', 'e2e'):
+        results += end_to_end_benchmarks(args.rounds, args.lengths)
+
+    report = {'environment': environment(), 'results': results}
+    regressions = []
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance, args.noise_stdevs)
+        report['baseline'] = baseline.get('environment')
+        report['regressions'] = [f"{entry['name']} {entry['params']}: {entry['change']:+.0%}" for entry in regressions]
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    for line in report.get('regressions', []):
+        print(f"Regression: {line}", file=sys.stderr)
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,130 @@
+import os
+import threading
+
+import pymongo
+from dotenv import load_dotenv
+
+# Connection settings come from the environment or api.env
+load_dotenv('api.env')
+
+MONGO_URI = os.getenv('MONGO_URI', 'mongodb://localhost:27017')
+MONGO_DATABASE = os.getenv('MONGO_DATABASE', 'ice_breaker_app')
+MONGO_BACKEND = os.getenv('MONGO_BACKEND', 'pymongo')  # pymongo, or mongomock for an in-memory stand-in
+MONGO_MAX_POOL_SIZE = int(os.getenv('MONGO_MAX_POOL_SIZE', '50'))  # Connections per server
+MONGO_MIN_POOL_SIZE = int(os.getenv('MONGO_MIN_POOL_SIZE', '0'))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv('MONGO_CONNECT_TIMEOUT_MS', '5000'))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000'))  # Fail fast when Mongo is down
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv('MONGO_SOCKET_TIMEOUT_MS', '30000'))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv('MONGO_WAIT_QUEUE_TIMEOUT_MS', '10000'))  # Max wait for a free pooled connection
+MONGO_WRITE_CONCERN = os.getenv('MONGO_WRITE_CONCERN', '1')  # w: a number or 'majority'
+MONGO_JOURNAL = os.getenv('MONGO_JOURNAL', '')  # 1 to wait for the journal on writes; unset for the server default
+
+_client = None
+_async_client = None
+_client_lock = threading.Lock()
+
+
+# Function to build the MongoClient keyword arguments from the settings
+def client_options():
+    options = {
+        'maxPoolSize': MONGO_MAX_POOL_SIZE,
+        'minPoolSize': MONGO_MIN_POOL_SIZE,
+        'connectTimeoutMS': MONGO_CONNECT_TIMEOUT_MS,
+        'serverSelectionTimeoutMS': MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        'socketTimeoutMS': MONGO_SOCKET_TIMEOUT_MS,
+        'waitQueueTimeoutMS': MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        'w': int(MONGO_WRITE_CONCERN) if MONGO_WRITE_CONCERN.isdigit() else MONGO_WRITE_CONCERN
+    }
+    if MONGO_JOURNAL:
+        options['journal'] = MONGO_JOURNAL == '1'
+    return options
+
+
+# Function to get the shared client, creating it on first use.
+# The client pools connections and is safe to share between threads.
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                if MONGO_BACKEND == 'mongomock':
+                    try:
+                        import mongomock
+                        import mongomock.gridfs
+                    except ImportError:
+                        raise RuntimeError("MONGO_BACKEND=mongomock needs the 'mongomock' package (pip install mongomock)")
+                    mongomock.gridfs.enable_gridfs_integration()
+                    _client = mongomock.MongoClient()
+                elif MONGO_BACKEND == 'pymongo':
+                    _client = pymongo.MongoClient(MONGO_URI, **client_options())
+                else:
+                    raise ValueError(f"Unknown MONGO_BACKEND '{MONGO_BACKEND}'; choose pymongo or mongomock")
+    return _client
+
+
+def get_db():
+    return get_client()[MONGO_DATABASE]
+
+
+# Function to get the shared Motor client for asyncio servers, creating it on first use
+def get_async_client():
+    global _async_client
+    if _async_client is None:
+        with _client_lock:
+            if _async_client is None:
+                try:
+                    from motor.motor_asyncio import AsyncIOMotorClient
+                except ImportError:
+                    raise RuntimeError("The async data layer needs the 'motor' package (pip install motor)")
+                _async_client = AsyncIOMotorClient(MONGO_URI, **client_options())
+    return _async_client
+
+
+def get_async_db():
+    return get_async_client()[MONGO_DATABASE]
+
+
+# Function to close the shared clients, e.g. before forking workers
+def close():
+    global _client, _async_client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        if _async_client is not None:
+            _async_client.close()
+        _client = _async_client = None
+
+
+# Stands in for a pymongo Database until it is first used, so modules can be
+# imported (and wire up their collections) without connecting to Mongo
+class LazyDatabase:
+    def __getitem__(self, name):
+        return LazyCollection(name)
+
+    def __getattr__(self, name):
+        return getattr(get_db(), name)
+
+    def resolve(self):
+        return get_db()
+
+
+# Stands in for a pymongo Collection until it is first used
+class LazyCollection:
+    def __init__(self, name):
+        self.name = name
+
+    def __getattr__(self, attribute):
+        return getattr(get_db()[self.name], attribute)
+
+    def resolve(self):
+        return get_db()[self.name]
+
+
+# Function to get the real pymongo object behind a lazy stand-in (or the object itself)
+def resolve(database_or_collection):
+    if isinstance(database_or_collection, (LazyDatabase, LazyCollection)):
+        return database_or_collection.resolve()
+    return database_or_collection
+
+
+database = LazyDatabase()
@@ -0,0 +1,161 @@
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+
+import pymongo
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from db import database
+
+JOBS_COLLECTION = 'jobs'
+
+# Job queue settings
+JOB_VISIBILITY_TIMEOUT = int(os.getenv('JOB_VISIBILITY_TIMEOUT', '300'))  # Seconds a lease lasts without a heartbeat
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '5'))  # Leases before a job is given up as failed
+JOB_RETRY_DELAY = float(os.getenv('JOB_RETRY_DELAY', '30'))  # Seconds before the first retry, doubled every attempt
+
+# Job states
+QUEUED = 'queued'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+ACTIVE_STATES = (QUEUED, LEASED)
+
+# A durable queue of processing jobs in a Mongo collection, shared by any number
+# of worker processes on any number of machines:
+#
+#   jobs: {_id: 'process:<record_id>', record_id, state, attempts, available_at,
+#          owner, created_at, updated_at, last_error}
+#
+# A worker leases the oldest available job with one find_one_and_update, which
+# moves its available_at past the visibility timeout. A worker that crashes or
+# stalls stops renewing its lease, so the job becomes available again and the
+# next lease retries it. Job ids are derived from the recording, so a recording
+# has at most one job and enqueueing it twice is harmless.
+
+
+# Function to get the job id for processing a recording
+def job_id(record_id):
+    return f'process:{record_id}'
+
+
+# Function to name this process in the jobs it holds
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}'
+
+
+class JobQueue:
+    def __init__(self, db=database, visibility_timeout=JOB_VISIBILITY_TIMEOUT, max_attempts=JOB_MAX_ATTEMPTS,
+                 retry_delay=JOB_RETRY_DELAY):
+        self.collection = db[JOBS_COLLECTION]
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+
+    # Create the index leasing relies on; a no-op when it exists
+    def ensure_indexes(self):
+        self.collection.create_index([('state', pymongo.ASCENDING), ('available_at', pymongo.ASCENDING)],
+                                     name='available_jobs')
+
+    # Queue a recording for processing in delay seconds and return the job id. A job that
+    # is already queued or running is left alone; a finished one is queued again if requeue is set.
+    def enqueue(self, record_id, requeue=True, delay=0):
+        now = datetime.now()
+        available_at = now + timedelta(seconds=delay)
+        job = {
+            '_id': job_id(record_id),
+            'record_id': str(record_id),
+            'state': QUEUED,
+            'attempts': 0,
+            'available_at': available_at,
+            'owner': None,
+            'created_at': now,
+            'updated_at': now,
+            'last_error': None
+        }
+        try:
+            self.collection.insert_one(job)
+        except DuplicateKeyError:
+            if requeue:
+                self.collection.update_one(
+                    {'_id': job['_id'], 'state': {'$in': [DONE, FAILED]}},
+                    {'$set': {'state': QUEUED, 'attempts': 0, 'available_at': available_at, 'owner': None,
+                              'updated_at': now, 'last_error': None}}
+                )
+        return job['_id']
+
+    # Lease the job that has been available longest; None when there is nothing to do.
+    # Queued jobs and jobs whose lease ran out are both available.
+    def lease(self, owner):
+        now = datetime.now()
+        return self.collection.find_one_and_update(
+            {'state': {'$in': list(ACTIVE_STATES)}, 'available_at': {'$lte': now}},
+            {
+                '$set': {'state': LEASED, 'owner': owner, 'updated_at': now,
+                         'available_at': now + timedelta(seconds=self.visibility_timeout)},
+                '$inc': {'attempts': 1}
+            },
+            sort=[('available_at', pymongo.ASCENDING)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    # Renew the leases of jobs an owner is still working on
+    def extend(self, ids, owner):
+        if not ids:
+            return 0
+        now = datetime.now()
+        result = self.collection.update_many(
+            {'_id': {'$in': list(ids)}, 'state': LEASED, 'owner': owner},
+            {'$set': {'available_at': now + timedelta(seconds=self.visibility_timeout), 'updated_at': now}}
+        )
+        return result.modified_count
+
+    # Mark a leased job done; False if the lease was lost to another worker meanwhile
+    def complete(self, job):
+        now = datetime.now()
+        result = self.collection.update_one(
+            {'_id': job['_id'], 'state': LEASED, 'owner': job['owner']},
+            {'$set': {'state': DONE, 'owner': None, 'updated_at': now, 'finished_at': now}}
+        )
+        return result.modified_count == 1
+
+    # Give a leased job back after an error: queued again after a growing delay (at
+    # least retry_after seconds, when the error said how long to wait), or failed for
+    # good once it has used its attempts. Returns the new state, or None if the lease was lost.
+    def fail(self, job, error, retry_after=None):
+        now = datetime.now()
+        if job['attempts'] >= self.max_attempts:
+            update = {'state': FAILED, 'finished_at': now}
+        else:
+            delay = max(self.retry_delay * (2 ** (job['attempts'] - 1)), retry_after or 0)
+            update = {'state': QUEUED, 'available_at': now + timedelta(seconds=delay)}
+        update.update(owner=None, updated_at=now, last_error=str(error)[:1000])
+        result = self.collection.update_one({'_id': job['_id'], 'state': LEASED, 'owner': job['owner']},
+                                            {'$set': update})
+        return update['state'] if result.modified_count == 1 else None
+
+    def get(self, job_id):
+        return self.collection.find_one({'_id': job_id})
+
+    # Number of jobs in each state
+    def counts(self):
+        counts = dict.fromkeys((QUEUED, LEASED, DONE, FAILED), 0)
+        for row in self.collection.aggregate([{'$group': {'_id': '$state', 'count': {'$sum': 1}}}]):
+            counts[row['_id']] = row['count']
+        return counts
+
+
+# Function to describe a job for the API
+def job_status(job):
+    return {
+        'job_id': job['_id'],
+        'record_id': job['record_id'],
+        'state': job['state'],
+        'attempts': job['attempts'],
+        'last_error': job.get('last_error'),
+        'created_at': job['created_at'].isoformat(),
+        'updated_at': job['updated_at'].isoformat()
+    }
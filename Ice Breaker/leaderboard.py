@@ -0,0 +1,210 @@
+import heapq
+import os
+import threading
+import time
+from datetime import datetime
+
+import pymongo
+from pymongo import ReplaceOne
+
+from prompts import make_prompt_id
+
+# Leaderboard settings
+LEADERBOARD_SIZE = int(os.getenv('LEADERBOARD_SIZE', '10'))  # Entries kept per board
+LEADERBOARD_PERSIST_INTERVAL = int(os.getenv('LEADERBOARD_PERSIST_INTERVAL', '60'))  # Seconds between saves
+LEADERBOARDS_COLLECTION = 'leaderboards'
+GLOBAL_BOARD = 'global'
+
+# Top scores kept in memory: one bounded board for all recordings and one per
+# prompt. Boards are loaded from the leaderboards collection at startup (or built
+# from recordings the first time), updated as scores are saved, and written back
+# periodically, taking in what other processes (queue workers, other web servers)
+# wrote meanwhile. Reads never touch Mongo.
+
+
+# The K best entries of one board, as a min-heap so the weakest entry is evicted first
+class TopK:
+    def __init__(self, size=LEADERBOARD_SIZE):
+        self.size = size
+        self.stale = False  # An entry dropped; the true K-th best may be missing until a refresh
+        self._heap = []  # (score, -time, record_id, entry)
+        self._ranked = None  # Entries best first, served to readers
+
+    # Offer an entry; returns True if the board changed
+    def offer(self, entry):
+        key = (entry['score'], -entry['at'].timestamp() if entry.get('at') else 0, str(entry['record_id']))
+        removed = False
+        for i, item in enumerate(self._heap):
+            if item[3]['record_id'] == entry['record_id']:
+                # A rescored entry: take it out and let it compete again
+                self._heap[i] = self._heap[-1]
+                self._heap.pop()
+                heapq.heapify(self._heap)
+                self.stale = self.stale or entry['score'] < item[0]
+                removed = True
+                break
+
+        if len(self._heap) < self.size:
+            heapq.heappush(self._heap, key + (entry,))
+        elif key > self._heap[0][:3]:
+            heapq.heapreplace(self._heap, key + (entry,))
+        elif not removed:
+            return False
+        self._ranked = None
+        return True
+
+    def holds(self, record_id):
+        return any(item[3]['record_id'] == record_id for item in self._heap)
+
+    # Entries best first; the list is reused until the board changes
+    def ranked(self):
+        if self._ranked is None:
+            self._ranked = [item[3] for item in sorted(self._heap, key=lambda item: item[:3], reverse=True)]
+        return self._ranked
+
+    def replace(self, entries):
+        self._heap = []
+        self._ranked = None
+        self.stale = False
+        for entry in entries:
+            self.offer(entry)
+
+
+class Leaderboard:
+    def __init__(self, db, recordings_collection, size=LEADERBOARD_SIZE):
+        self.size = size
+        self.collection = db[LEADERBOARDS_COLLECTION]
+        self.recordings = recordings_collection
+        self._boards = {}
+        self._dirty = set()
+        self._lock = threading.Lock()
+
+    # Create the indexes that serve the global board and prompt boards when refreshing
+    def ensure_indexes(self):
+        self.recordings.create_index([('score', pymongo.DESCENDING)], name='top_scores')
+        self.recordings.create_index([('prompt_id', pymongo.ASCENDING), ('score', pymongo.DESCENDING)],
+                                     name='top_scores_by_prompt')
+
+    # Load the saved boards, or build them from recordings if none were saved
+    def warm(self):
+        saved = list(self.collection.find())
+        if not saved:
+            self.rebuild()
+            return
+        with self._lock:
+            for document in saved:
+                self._board(document['_id']).replace(document['entries'])
+
+    # Rebuild every board from recordings and save them. Each prompt board is one
+    # sorted, limited query on the top_scores_by_prompt index, so no more than size
+    # recordings are read per prompt; the global board is the best of those.
+    def rebuild(self):
+        scored = {'score': {'$type': 'number'}}
+        queries = [{'prompt_id': prompt_id} for prompt_id in self.recordings.distinct('prompt_id', scored) if prompt_id]
+        # Recordings saved before prompts had ids are grouped by their text
+        queries += [{'prompt_id': None, 'prompt': prompt}
+                    for prompt in self.recordings.distinct('prompt', dict(scored, prompt_id=None))]
+
+        boards = {GLOBAL_BOARD: TopK(self.size)}
+        for query in queries:
+            prompt_id = query['prompt_id'] or make_prompt_id(query['prompt'] or '')
+            cursor = self.recordings.find(dict(scored, **query), {'user_id': 1, 'score': 1, 'timestamp': 1})
+            for document in cursor.sort('score', pymongo.DESCENDING).limit(self.size):
+                entry = {'record_id': document['_id'], 'user_id': document.get('user_id'),
+                         'score': document['score'], 'at': document.get('timestamp'), 'prompt_id': prompt_id}
+                boards.setdefault(prompt_id, TopK(self.size)).offer(entry)
+                boards[GLOBAL_BOARD].offer(entry)
+
+        with self._lock:
+            self._boards = boards
+            self._dirty = set(boards)
+        self.collection.delete_many({'_id': {'$nin': list(boards)}})
+        self.persist()
+
+    # Offer a saved score. record is the recording as it was before the save.
+    def record(self, record, score):
+        prompt_id = record.get('prompt_id') or make_prompt_id(record.get('prompt', ''))
+        entry = {
+            'record_id': record['_id'],
+            'user_id': record.get('user_id', 'anonymous'),
+            'prompt_id': prompt_id,
+            'score': score,
+            'at': record.get('timestamp')
+        }
+        with self._lock:
+            for board_id in (GLOBAL_BOARD, prompt_id):
+                if self._board(board_id).offer(entry):
+                    self._dirty.add(board_id)
+
+    # Take in entries other processes saved since the boards were loaded.
+    # Entries this process already holds keep its own score for them.
+    def sync(self):
+        saved = list(self.collection.find())
+        with self._lock:
+            for document in saved:
+                board = self._board(document['_id'])
+                for entry in document['entries']:
+                    if not board.holds(entry['record_id']):
+                        board.offer(entry)
+
+    # Ranked entries of a board (the global one unless a prompt id is given)
+    def top(self, prompt_id=None, limit=None):
+        board = self._boards.get(prompt_id or GLOBAL_BOARD)
+        if board is None:
+            return []
+        with self._lock:
+            entries = board.ranked()
+        return entries[:limit] if limit else list(entries)
+
+    # Write changed boards back, first re-reading any that lost an entry to a lower rescore
+    def persist(self):
+        with self._lock:
+            stale = [board_id for board_id, board in self._boards.items() if board.stale]
+        for board_id in stale:
+            query = {'score': {'$type': 'number'}}
+            if board_id != GLOBAL_BOARD:
+                # Records saved before prompt ids existed only reach prompt boards through rebuild()
+                query['prompt_id'] = board_id
+            best = self.recordings.find(
+                query, {'user_id': 1, 'prompt_id': 1, 'prompt': 1, 'score': 1, 'timestamp': 1}
+            ).sort('score', pymongo.DESCENDING).limit(self.size)
+            entries = [{
+                'record_id': document['_id'],
+                'user_id': document.get('user_id', 'anonymous'),
+                'prompt_id': document.get('prompt_id') or make_prompt_id(document.get('prompt', '')),
+                'score': document['score'],
+                'at': document.get('timestamp')
+            } for document in best]
+            with self._lock:
+                self._boards[board_id].replace(entries)
+                self._dirty.add(board_id)
+
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            documents = [{'_id': board_id, 'entries': self._boards[board_id].ranked(), 'updated_at': datetime.now()}
+                         for board_id in dirty]
+        if documents:
+            self.collection.bulk_write(
+                [ReplaceOne({'_id': document['_id']}, document, upsert=True) for document in documents],
+                ordered=False
+            )
+
+    # Sync and persist every interval seconds on a daemon thread
+    def start(self, interval=LEADERBOARD_PERSIST_INTERVAL):
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.sync()
+                    self.persist()
+                except Exception as e:
+                    print(f"Leaderboard persistence failed: {e}")
+
+        threading.Thread(target=loop, name='leaderboard', daemon=True).start()
+
+    # Caller must hold the lock
+    def _board(self, board_id):
+        board = self._boards.get(board_id)
+        if board is None:
+            board = self._boards[board_id] = TopK(self.size)
+        return board
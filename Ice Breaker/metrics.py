@@ -0,0 +1,233 @@
+import bisect
+import os
+import sys
+import threading
+import time
+from collections import Counter as StackCounter
+from datetime import datetime
+
+# Profiling settings
+PROFILE_SLOW_REQUESTS = float(os.getenv('PROFILE_SLOW_REQUESTS', '0'))  # Profile requests slower than this many seconds (0 = off)
+PROFILE_INTERVAL = float(os.getenv('PROFILE_INTERVAL', '0.01'))  # Seconds between stack samples
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')  # Where slow request profiles are written
+
+# Latency buckets in seconds, from a cached chunk up to a full-length recording
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# In-process metrics in the Prometheus text format. Recording a value takes a
+# lock and a few additions, so instrumentation stays on in production.
+
+
+# Function to render a label set as {name="value",...}
+def format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{escape_label(value)}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+# A monotonically increasing count, optionally split by labels
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        if not values and not self.labelnames:
+            values = [((), 0)]
+        for key, value in values:
+            yield f'{self.name}{format_labels(self.labelnames, key)} {value}'
+
+
+# Observed values counted into cumulative buckets, optionally split by labels
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    # Time the body of a with block
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def samples(self):
+        with self._lock:
+            series = sorted((key, list(values)) for key, values in self._series.items())
+        for key, values in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), values):
+                cumulative += count
+                labels = format_labels(self.labelnames + ('le',), key + (bound,))
+                yield f'{self.name}_bucket{labels} {cumulative}'
+            labels = format_labels(self.labelnames, key)
+            yield f'{self.name}_sum{labels} {values[-1]}'
+            yield f'{self.name}_count{labels} {cumulative}'
+
+
+# Context manager behind Histogram.time(); a plain class costs less than @contextmanager
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'started')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    # Every metric in the Prometheus text exposition format
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    'icebreaker_stage_seconds',
+    'Time spent in each processing stage (capture, wav_write, save_audio, split, stt_chunk, similarity, save_score)',
+    ['stage']
+)
+REQUEST_SECONDS = REGISTRY.histogram('icebreaker_request_seconds', 'Request handling time by endpoint', ['endpoint'])
+STT_FAILURES = REGISTRY.counter(
+    'icebreaker_stt_failures_total',
+    'Speech recognition failures by reason '
+    '(unknown_value, request_error, timeout, gave_up, rate_limited, circuit_open)',
+    ['reason']
+)
+AUDIO_BYTES_STORED = REGISTRY.counter('icebreaker_audio_bytes_stored_total', 'Bytes of audio written to storage')
+CHUNKS = REGISTRY.counter('icebreaker_chunks_total', 'Audio chunks sent to speech recognition')
+LOAD_SHED = REGISTRY.counter('icebreaker_load_shed_total', 'Requests refused with 429 by endpoint', ['endpoint'])
+RECORDINGS_PENDING_RETRY = REGISTRY.counter('icebreaker_pending_retry_total',
+                                            'Recordings saved unscored because speech recognition failed')
+
+
+# Function to time a processing stage: `with stage('split'): ...`
+def stage(name):
+    return STAGE_SECONDS.time(stage=name)
+
+
+# Samples the stacks of all threads while requests are in flight and writes the
+# samples of any request slower than the threshold as collapsed stacks (one
+# "frame;frame;frame count" line per stack, the input flamegraph tools expect).
+# Nothing is sampled while no request is running.
+class SlowRequestProfiler:
+    def __init__(self, threshold=PROFILE_SLOW_REQUESTS, directory=PROFILE_DIR, interval=PROFILE_INTERVAL):
+        self.threshold = threshold
+        self.directory = directory
+        self.interval = interval
+        self._active = {}  # token -> StackCounter of sampled stacks
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    # Start sampling for a request; returns the token to pass to end()
+    def begin(self):
+        token = object()
+        with self._lock:
+            self._active[token] = StackCounter()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+                self._thread.start()
+        self._wake.set()
+        return token
+
+    # Stop sampling for a request; returns the profile's path if it was slow enough to keep
+    def end(self, token, duration, label):
+        with self._lock:
+            samples = self._active.pop(token, None)
+        if not samples or duration < self.threshold:
+            return None
+
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{label.replace('/', '_') or 'request'}.txt"
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(f"# {label} took {duration:.3f}s; {sum(samples.values())} samples every {self.interval}s\n")
+            for stack, count in samples.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while True:
+            self._wake.wait()
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    self._wake.clear()
+                    continue
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            stacks = []
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                frames = []
+                while frame is not None:
+                    code = frame.f_code
+                    frames.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                frames.append(names.get(thread_id, str(thread_id)))
+                stacks.append(';'.join(reversed(frames)))
+            with self._lock:
+                for samples in self._active.values():
+                    samples.update(stacks)
+
+
+# Function to create the profiler when PROFILE_SLOW_REQUESTS is set
+def create_profiler():
+    return SlowRequestProfiler() if PROFILE_SLOW_REQUESTS > 0 else None
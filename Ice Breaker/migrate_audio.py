@@ -0,0 +1,65 @@
+import argparse
+import base64
+
+from pymongo import UpdateOne
+
+from db import get_db
+from storage import AudioStore
+
+# Moves legacy base64 'audio_data' strings out of the recordings collection
+# into the configured AudioStore (GridFS by default).
+#
+#   python migrate_audio.py [--batch-size 100] [--limit N] [--dry-run]
+#
+# Safe to re-run: only records that still carry a base64 string are touched.
+
+
+# Function to migrate legacy recordings in batches; returns the number migrated
+def migrate(recordings_collection, audio_store, batch_size=100, limit=0, dry_run=False):
+    cursor = recordings_collection.find(
+        {'audio_data': {'$type': 'string'}},
+        {'audio_data': 1},
+        no_cursor_timeout=True
+    ).batch_size(batch_size)
+    if limit:
+        cursor = cursor.limit(limit)
+
+    migrated = 0
+    operations = []
+    try:
+        for record in cursor:
+            wav_bytes = base64.b64decode(record['audio_data'])
+            migrated += 1
+            if dry_run:
+                continue
+
+            audio_meta = audio_store.put(wav_bytes, f"recording_{record['_id']}.wav")
+            operations.append(UpdateOne(
+                {'_id': record['_id'], 'audio_data': {'$type': 'string'}},
+                {'$set': {'audio': audio_meta}, '$unset': {'audio_data': ''}}
+            ))
+
+            if len(operations) >= batch_size:
+                recordings_collection.bulk_write(operations, ordered=False)
+                operations = []
+                print(f"Migrated {migrated} recordings")
+
+        if operations:
+            recordings_collection.bulk_write(operations, ordered=False)
+    finally:
+        cursor.close()
+
+    return migrated
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Move base64 audio out of the recordings collection')
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--limit', type=int, default=0, help='Stop after this many records (0 = all)')
+    parser.add_argument('--dry-run', action='store_true', help='Count legacy records without changing them')
+    args = parser.parse_args()
+
+    db = get_db()
+
+    count = migrate(db['recordings'], AudioStore(db), args.batch_size, args.limit, args.dry_run)
+    print(f"{'Found' if args.dry_run else 'Migrated'} {count} legacy recordings")
@@ -0,0 +1,261 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+
+import numpy as np
+
+from db import get_db
+from similarity import get_engine, tokenize, SparseVector
+
+logger = logging.getLogger(__name__)
+
+# Prompt registry settings
+PROMPTS_FILE = os.getenv('PROMPTS_FILE', '')  # Extra prompts: .txt (one per line) or .jsonl ({"text", "id", "topics"})
+PROMPTS_COLLECTION = os.getenv('PROMPTS_COLLECTION', '')  # Extra prompts from this Mongo collection
+PROMPT_INDEX_DIR = os.getenv('PROMPT_INDEX_DIR', '')  # Memory-mapped vector store built by `python prompts.py build-index`
+PROMPT_PREWARM_LIMIT = 1000  # Larger prompt sets vectorize each prompt on first use instead of at startup
+TOPIC_KEYWORDS = 5  # Expected-topic keywords derived per prompt when none are given
+
+# Ice Breaker questions list
+ICE_BREAKER_QUESTIONS = [
+    "Tell us about a hobby you're passionate about.",
+    "What's a skill you'd like to learn in the next year?",
+    "Share a memorable travel experience you've had.",
+    "If you could have dinner with any historical figure, who would it be and why?",
+    "What's your favorite book or movie and why does it resonate with you?",
+    "Tell us about a challenge you've overcome and what you learned from it.",
+    "What's something most people don't know about you?",
+    "If you could live anywhere in the world, where would it be?",
+    "Share a personal goal you're currently working towards.",
+    "What's the best advice someone has given you?",
+    "Tell us about someone who has influenced your life significantly.",
+    "What's a cause or issue you feel strongly about?",
+    "Share a proud accomplishment from your life.",
+    "If you had a time machine, which era would you visit?",
+    "What's something you're looking forward to in the near future?",
+    "Tell us about your ideal weekend.",
+    "What's a lesson you've learned from a mistake?",
+    "Share a tradition (family, cultural, personal) that's important to you.",
+    "What's a quality you appreciate most in other people?",
+    "If you could instantly master any skill, what would it be?"
+]
+
+
+# Function to derive a stable id from a prompt's text, so ids survive reordering and reloads
+def make_prompt_id(text):
+    normalized = " ".join(text.lower().split())
+    return 'q' + hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:10]
+
+
+# A prompt and its scoring artifacts. Artifacts are computed on first use and kept.
+class Prompt:
+    def __init__(self, registry, prompt_id, text, topics=()):
+        self.id = prompt_id
+        self.text = text
+        self.topics = list(topics)
+        self._registry = registry
+        self._tokens = None
+        self._vector = None
+
+    # Normalized, stemmed content-word tokens
+    @property
+    def tokens(self):
+        if self._tokens is None:
+            self._tokens = tokenize(self.text)
+        return self._tokens
+
+    # Stemmed keyword set
+    @property
+    def keywords(self):
+        return frozenset(self.tokens)
+
+    # Similarity-engine vector, from the memory-mapped index when there is one
+    @property
+    def vector(self):
+        if self._vector is None:
+            self._vector = self._registry.vector_for(self)
+        return self._vector
+
+    # Expected-topic keywords: the configured topics, or the prompt's highest-weighted terms
+    @property
+    def topic_keywords(self):
+        if self.topics:
+            return [token for topic in self.topics for token in tokenize(topic)]
+        vector = self.vector
+        if isinstance(vector, SparseVector) and vector.values.size:
+            terms = self._registry.engine_terms()
+            top = np.argsort(vector.values)[::-1]
+            # Hashed slots for words outside the vocabulary have no term to show
+            keywords = [terms[vector.indices[i]] for i in top if vector.indices[i] < len(terms)][:TOPIC_KEYWORDS]
+            if keywords:
+                return keywords
+        return list(dict.fromkeys(self.tokens))[:TOPIC_KEYWORDS]
+
+    def to_dict(self):
+        return {'id': self.id, 'text': self.text, 'topics': self.topic_keywords}
+
+
+# Holds every known prompt by stable id and prepares the similarity engine for them.
+# Loading only stores texts; vectors come from a saved index or are built lazily.
+class PromptRegistry:
+    def __init__(self, engine=None):
+        self.engine = engine or get_engine()
+        self._prompts = {}
+        self._by_text = {}
+        self._ids = []
+        self._index = None
+        self._terms = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __iter__(self):
+        return (self._prompts[prompt_id] for prompt_id in self._ids)
+
+    # Register a prompt; an existing prompt with the same id is kept
+    def add(self, text, prompt_id=None, topics=()):
+        text = text.strip()
+        prompt_id = prompt_id or make_prompt_id(text)
+        with self._lock:
+            if prompt_id not in self._prompts:
+                prompt = Prompt(self, prompt_id, text, topics)
+                self._prompts[prompt_id] = prompt
+                self._by_text[" ".join(text.lower().split())] = prompt
+                self._ids.append(prompt_id)
+            return self._prompts[prompt_id]
+
+    # Register prompts from strings or {'text', 'id', 'topics'} dicts
+    def load(self, entries):
+        for entry in entries:
+            if isinstance(entry, str):
+                self.add(entry)
+            else:
+                self.add(entry['text'], entry.get('id'), entry.get('topics', ()))
+
+    # Register prompts from a .txt file (one per line) or a .jsonl file
+    def load_file(self, path):
+        with open(path, encoding='utf-8') as f:
+            if path.endswith('.jsonl'):
+                self.load(json.loads(line) for line in f if line.strip())
+            else:
+                self.load(line for line in f if line.strip())
+
+    # Register prompts stored in a Mongo collection as {'text', 'topics'} documents
+    def load_collection(self, collection):
+        for document in collection.find({}, {'text': 1, 'topics': 1}):
+            prompt_id = document['_id'] if isinstance(document['_id'], str) else None
+            self.add(document['text'], prompt_id, document.get('topics', ()))
+
+    # Prepare the similarity engine: map a matching saved index, or fit on the prompt texts
+    def prepare(self, index_dir=PROMPT_INDEX_DIR):
+        if index_dir and self._open_index(index_dir):
+            return
+        self.engine.fit([prompt.text for prompt in self], prewarm=len(self) <= PROMPT_PREWARM_LIMIT)
+
+    def get(self, prompt_id):
+        return self._prompts.get(prompt_id)
+
+    def find(self, text):
+        return self._by_text.get(" ".join(text.lower().split()))
+
+    # Look a prompt up by id, then by text; unknown text gets an unregistered prompt
+    def resolve(self, prompt_id=None, text=''):
+        prompt = (prompt_id and self.get(prompt_id)) or (text and self.find(text))
+        return prompt or Prompt(self, make_prompt_id(text), text)
+
+    def random(self):
+        return self._prompts[random.choice(self._ids)]
+
+    def vector_for(self, prompt):
+        if self._index is not None and prompt.id in self._index['rows']:
+            row = self._index['rows'][prompt.id]
+            start, end = self._index['indptr'][row], self._index['indptr'][row + 1]
+            # Slices of the memory-mapped arrays; nothing is read until they are used
+            return SparseVector(self._index['indices'][start:end], self._index['values'][start:end])
+        # Only registered prompts are cached for good; resolve() makes a new Prompt for other text
+        return self.engine.prompt_vector(prompt.text, registered=self._prompts.get(prompt.id) is prompt)
+
+    def engine_terms(self):
+        if self._terms is None:
+            vocabulary = self.engine.vocabulary
+            self._terms = sorted(vocabulary, key=vocabulary.get)
+        return self._terms
+
+    # Write the fitted vocabulary and every prompt vector as CSR arrays (tfidf engine)
+    def build_index(self, index_dir):
+        if not hasattr(self.engine, 'vectorize_counts'):
+            raise RuntimeError("Only the tfidf engine has a saved index")
+
+        self.engine.fit([prompt.text for prompt in self], prewarm=False)
+        vectors = [self.engine.vectorize(prompt.text) for prompt in self]
+        indptr = np.zeros(len(vectors) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([vector.indices.size for vector in vectors])
+
+        os.makedirs(index_dir, exist_ok=True)
+        np.save(os.path.join(index_dir, 'indptr.npy'), indptr)
+        np.save(os.path.join(index_dir, 'indices.npy'), np.concatenate([v.indices for v in vectors] or [np.zeros(0, np.int32)]))
+        np.save(os.path.join(index_dir, 'values.npy'), np.concatenate([v.values for v in vectors] or [np.zeros(0, np.float32)]))
+        np.save(os.path.join(index_dir, 'idf.npy'), self.engine.idf)
+        with open(os.path.join(index_dir, 'index.json'), 'w', encoding='utf-8') as f:
+            json.dump({
+                'signature': self._signature(),
+                'ids': self._ids,
+                'terms': self.engine_terms(),
+                'unseen_idf': self.engine.unseen_idf
+            }, f)
+
+    # Returns False if there is no index in index_dir or it is for another prompt set.
+    # index.json is written last, so a partly built index has none.
+    def _open_index(self, index_dir):
+        if not hasattr(self.engine, 'load_vocabulary'):
+            return False
+        meta_path = os.path.join(index_dir, 'index.json')
+        if not os.path.isfile(meta_path):
+            logger.warning("No prompt index in %s; fitting in memory instead", index_dir)
+            return False
+        with open(meta_path, encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta['signature'] != self._signature():
+            logger.warning("Prompt index in %s is out of date; fitting in memory instead", index_dir)
+            return False
+
+        self.engine.load_vocabulary(meta['terms'], np.load(os.path.join(index_dir, 'idf.npy')), meta['unseen_idf'])
+        self._terms = meta['terms']
+        self._index = {
+            'rows': {prompt_id: row for row, prompt_id in enumerate(meta['ids'])},
+            'indptr': np.load(os.path.join(index_dir, 'indptr.npy'), mmap_mode='r'),
+            'indices': np.load(os.path.join(index_dir, 'indices.npy'), mmap_mode='r'),
+            'values': np.load(os.path.join(index_dir, 'values.npy'), mmap_mode='r')
+        }
+        return True
+
+    def _signature(self):
+        return hashlib.sha1("\n".join(self._ids).encode('utf-8')).hexdigest()
+
+
+# Function to register the built-in questions plus the configured prompt file and collection
+def load_prompts(registry, db=None):
+    registry.load(ICE_BREAKER_QUESTIONS)
+    if PROMPTS_FILE:
+        registry.load_file(PROMPTS_FILE)
+    if PROMPTS_COLLECTION and db is not None:
+        registry.load_collection(db[PROMPTS_COLLECTION])
+    return registry
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Manage the prompt registry')
+    parser.add_argument('command', choices=['build-index'])
+    parser.add_argument('index_dir')
+    args = parser.parse_args()
+
+    # Index exactly the prompt set the app loads, or its signature will not match
+    db = get_db()
+    registry = load_prompts(PromptRegistry(), db)
+    registry.build_index(args.index_dir)
+    print(f"Indexed {len(registry)} prompts into {args.index_dir}")
@@ -0,0 +1,277 @@
+import os
+import threading
+import time
+from datetime import datetime
+
+import bson
+import pymongo
+from bson.objectid import ObjectId
+from pymongo import UpdateOne
+
+from db import database, get_async_db
+
+RECORDINGS_COLLECTION = 'recordings'
+
+# Recording statuses. Records saved before statuses existed have none.
+SCORED = 'scored'
+PENDING_RETRY = 'pending_retry'  # Speech recognition failed; the recording is queued to be processed again
+
+# Result write batching settings
+WRITE_BATCH_SIZE = int(os.getenv('WRITE_BATCH_SIZE', '100'))  # Buffered result updates that trigger a flush
+WRITE_BATCH_DELAY = float(os.getenv('WRITE_BATCH_DELAY', '1.0'))  # Max seconds a buffered update waits
+
+# Fields each query reads; everything else (transcripts, audio metadata) stays on the server.
+# The audio lookup also reads what the rollups need, so its result can describe the
+# recording as it was before a deferred score update.
+AUDIO_FIELDS = {'audio': 1, 'audio_data': 1, 'user_id': 1, 'prompt': 1, 'prompt_id': 1, 'timestamp': 1, 'score': 1}
+SCORE_CONTEXT_FIELDS = {'user_id': 1, 'prompt': 1, 'prompt_id': 1, 'timestamp': 1, 'score': 1}
+HISTORY_FIELDS = {'timestamp': 1, 'prompt': 1, 'score': 1, 'status': 1}
+DETAILS_EXCLUDED_FIELDS = {'audio_data': 0, 'original_audio': 0}
+HISTORY_SORT = [('timestamp', pymongo.DESCENDING), ('_id', pymongo.DESCENDING)]
+
+
+# Function to build a new recording document
+def new_recording(user_id, prompt, prompt_id, audio_meta, original_meta=None, status=None):
+    record = {
+        'user_id': user_id,
+        'prompt': prompt,
+        'prompt_id': prompt_id,
+        'audio': audio_meta,
+        'timestamp': datetime.now()
+    }
+    if original_meta:
+        record['original_audio'] = original_meta
+    if status:
+        record['status'] = status
+    return record
+
+
+# Function to build the $set that stores a recording's results
+def score_fields(transcribed_text, word_count, similarity_percentage, score):
+    return {
+        'transcribed_text': transcribed_text,
+        'word_count': word_count,
+        'similarity_percentage': similarity_percentage,
+        'score': score,
+        'status': SCORED,
+        'processed_at': datetime.now()
+    }
+
+
+# Function to build the query for one history page; after is a (timestamp, _id) keyset position
+def history_query(user_id, after=None):
+    query = {'user_id': user_id}
+    if after:
+        timestamp, record_id = after
+        query['$or'] = [
+            {'timestamp': {'$lt': timestamp}},
+            {'timestamp': timestamp, '_id': {'$lt': record_id}}
+        ]
+    return query
+
+
+# Counts what the write path costs. A recording written once, results included,
+# costs one document write; the insert-then-update pattern costs two.
+class WriteStats:
+    def __init__(self):
+        self.round_trips = 0  # Requests sent to Mongo, reads included
+        self.document_writes = 0  # Times a recording document was written (inserted or rewritten)
+        self.bytes_sent = 0  # BSON bytes of inserted documents and update payloads, plus uploaded audio
+        self.results_saved = 0  # Recordings that got their results
+        self._lock = threading.Lock()
+
+    def add(self, round_trips=1, document_writes=0, bytes_sent=0, results_saved=0):
+        with self._lock:
+            self.round_trips += round_trips
+            self.document_writes += document_writes
+            self.bytes_sent += bytes_sent
+            self.results_saved += results_saved
+
+    def snapshot(self):
+        with self._lock:
+            saved = self.results_saved
+            return {
+                'round_trips': self.round_trips,
+                'document_writes': self.document_writes,
+                'bytes_sent': self.bytes_sent,
+                'results_saved': saved,
+                # Per recording with results
+                'round_trips_per_recording': round(self.round_trips / saved, 3) if saved else None,
+                'write_amplification': round(self.document_writes / saved, 3) if saved else None,
+                'bytes_per_recording': round(self.bytes_sent / saved) if saved else None
+            }
+
+
+# All reads and writes of the recordings collection. The default database is
+# the lazily connected shared one, so creating a repository never touches Mongo.
+class RecordingRepository:
+    def __init__(self, db=database):
+        self.collection = db[RECORDINGS_COLLECTION]
+        self.writes = WriteStats()
+
+    # Create the indexes the queries below rely on; a no-op when they exist
+    def ensure_indexes(self):
+        # History: one user's recordings newest first, with _id breaking timestamp ties
+        self.collection.create_index(
+            [('user_id', pymongo.ASCENDING), ('timestamp', pymongo.DESCENDING), ('_id', pymongo.DESCENDING)],
+            name='user_history'
+        )
+        # Sweep: only recordings still waiting for a score and a job are indexed, so the
+        # index stays small however many scored recordings pile up
+        self.collection.create_index(
+            [('timestamp', pymongo.ASCENDING)],
+            name='unscored',
+            partialFilterExpression={'score': None, 'queued_at': None}
+        )
+
+    # Insert a recording document, results included if it has them, and return its id as a string
+    def insert(self, record):
+        record_id = str(self.collection.insert_one(record).inserted_id)
+        self.writes.add(document_writes=1, bytes_sent=len(bson.encode(record)), results_saved=int('score' in record))
+        return record_id
+
+    # Load only the audio fields of a recording
+    def find_audio(self, record_id):
+        self.writes.add()
+        return self.collection.find_one({'_id': ObjectId(record_id)}, AUDIO_FIELDS)
+
+    # Load a recording for the details page, without any audio payload
+    def find_details(self, record_id):
+        self.writes.add()
+        return self.collection.find_one({'_id': ObjectId(record_id)}, DETAILS_EXCLUDED_FIELDS)
+
+    # Store results and return the fields the statistics need, as they were before
+    def save_score(self, record_id, transcribed_text, word_count, similarity_percentage, score):
+        update = {'$set': score_fields(transcribed_text, word_count, similarity_percentage, score)}
+        previous = self.collection.find_one_and_update({'_id': ObjectId(record_id)}, update, SCORE_CONTEXT_FIELDS)
+        self.writes.add(document_writes=1, bytes_sent=len(bson.encode(update)), results_saved=1)
+        return previous
+
+    # Mark a recording as waiting to be processed again after speech recognition failed
+    def mark_pending_retry(self, record_id):
+        self.collection.update_one({'_id': ObjectId(record_id)}, {'$set': {'status': PENDING_RETRY}})
+        self.writes.add(document_writes=1)
+
+    # Store the results of many recordings in one bulk write. updates are (record_id, fields) pairs.
+    def save_scores(self, updates):
+        requests = [UpdateOne({'_id': ObjectId(record_id)}, {'$set': fields}) for record_id, fields in updates]
+        if requests:
+            self.collection.bulk_write(requests, ordered=False)
+            self.writes.add(document_writes=len(requests), results_saved=len(requests),
+                            bytes_sent=sum(len(bson.encode({'$set': fields})) for _, fields in updates))
+
+    # Ids of recordings saved before a time that still have no score and were never swept, oldest first
+    def unscored(self, before, limit):
+        self.writes.add()
+        cursor = self.collection.find({'score': None, 'queued_at': None, 'timestamp': {'$lt': before}}, {'_id': 1})
+        return [str(record['_id']) for record in cursor.sort('timestamp', pymongo.ASCENDING).limit(limit)]
+
+    # Note that recordings have a processing job, so unscored() skips them from now on
+    def mark_queued(self, record_ids):
+        if record_ids:
+            self.collection.update_many({'_id': {'$in': [ObjectId(record_id) for record_id in record_ids]}},
+                                        {'$set': {'queued_at': datetime.now()}})
+            self.writes.add(document_writes=len(record_ids))
+
+    # Cursor over one page of a user's history, plus one extra row to tell if more follow
+    def history(self, user_id, limit, after=None):
+        self.writes.add()
+        return self.collection.find(history_query(user_id, after), HISTORY_FIELDS).sort(HISTORY_SORT).limit(limit + 1)
+
+
+# Buffers result updates from background processing and writes them with one
+# bulk_write once WRITE_BATCH_SIZE are pending or WRITE_BATCH_DELAY has passed.
+# on_saved(record, score) runs for each update after its batch is written.
+class ResultBatcher:
+    def __init__(self, repository, on_saved=None, max_size=WRITE_BATCH_SIZE, max_delay=WRITE_BATCH_DELAY):
+        self.repository = repository
+        self.on_saved = on_saved
+        self.max_size = max_size
+        self.max_delay = max_delay
+        self._pending = []  # (record, fields)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # Keeps batches in order
+
+    # Queue results for a recording. record is the recording as it was before
+    # (as returned by find_audio); it is passed to on_saved once written.
+    def add(self, record, transcribed_text, word_count, similarity_percentage, score):
+        with self._lock:
+            self._pending.append((record, score_fields(transcribed_text, word_count, similarity_percentage, score)))
+            full = len(self._pending) >= self.max_size
+        if full:
+            self.flush()
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    # Write everything pending now. A failed batch is put back to be retried.
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+            try:
+                self.repository.save_scores([(record['_id'], fields) for record, fields in batch])
+            except Exception:
+                with self._lock:
+                    self._pending[:0] = batch
+                raise
+        if self.on_saved:
+            for record, fields in batch:
+                self.on_saved(record, fields['score'])
+        return len(batch)
+
+    # Flush every max_delay seconds on a daemon thread
+    def start(self):
+        def loop():
+            while True:
+                time.sleep(self.max_delay)
+                try:
+                    self.flush()
+                except Exception as e:
+                    print(f"Result batch write failed: {e}")
+
+        threading.Thread(target=loop, name='result-batcher', daemon=True).start()
+
+
+# The same operations on Motor, for an asyncio server. Needs the 'motor' package.
+class AsyncRecordingRepository:
+    def __init__(self, db=None):
+        self.collection = (db if db is not None else get_async_db())[RECORDINGS_COLLECTION]
+
+    async def ensure_indexes(self):
+        await self.collection.create_index(
+            [('user_id', pymongo.ASCENDING), ('timestamp', pymongo.DESCENDING), ('_id', pymongo.DESCENDING)],
+            name='user_history'
+        )
+
+    async def insert(self, record):
+        return str((await self.collection.insert_one(record)).inserted_id)
+
+    async def find_audio(self, record_id):
+        return await self.collection.find_one({'_id': ObjectId(record_id)}, AUDIO_FIELDS)
+
+    async def find_details(self, record_id):
+        return await self.collection.find_one({'_id': ObjectId(record_id)}, DETAILS_EXCLUDED_FIELDS)
+
+    async def save_score(self, record_id, transcribed_text, word_count, similarity_percentage, score):
+        return await self.collection.find_one_and_update(
+            {'_id': ObjectId(record_id)},
+            {'$set': score_fields(transcribed_text, word_count, similarity_percentage, score)},
+            SCORE_CONTEXT_FIELDS
+        )
+
+    async def mark_pending_retry(self, record_id):
+        await self.collection.update_one({'_id': ObjectId(record_id)}, {'$set': {'status': PENDING_RETRY}})
+
+    async def save_scores(self, updates):
+        requests = [UpdateOne({'_id': ObjectId(record_id)}, {'$set': fields}) for record_id, fields in updates]
+        if requests:
+            await self.collection.bulk_write(requests, ordered=False)
+
+    # One page of a user's history as a list, plus one extra row to tell if more follow
+    async def history(self, user_id, limit, after=None):
+        cursor = self.collection.find(history_query(user_id, after), HISTORY_FIELDS).sort(HISTORY_SORT).limit(limit + 1)
+        return await cursor.to_list(length=limit + 1)
@@ -0,0 +1,173 @@
+import argparse
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import pymongo
+from pymongo import UpdateOne
+
+from db import get_db
+from prompts import PromptRegistry, load_prompts
+from scoring import score_batch, MAX_WORD_COUNT
+from leaderboard import Leaderboard
+from stats import StatsRollup
+
+# Recomputes score, word count and similarity for recordings that already have a
+# transcript, without running STT again. Use after changing the scoring weights,
+# MAX_WORD_COUNT or the similarity engine.
+#
+#   python rescore.py [--batch-size 1000] [--workers 4] [--max-word-count 170] [--restart]
+#
+# Progress is checkpointed after every written batch; re-running resumes an
+# unfinished job where it stopped, with the max word count it started with.
+
+# Rescoring settings
+RESCORE_BATCH_SIZE = int(os.getenv('RESCORE_BATCH_SIZE', '1000'))  # Records per scoring batch and bulk write
+RESCORE_WORKERS = int(os.getenv('RESCORE_WORKERS', str(os.cpu_count() or 1)))  # Scoring processes (0 = score in this process)
+CHECKPOINTS_COLLECTION = 'rescore_checkpoints'
+
+_worker_registry = None
+
+
+# Function to prepare the prompt registry inside a scoring process
+def _init_worker(entries):
+    global _worker_registry
+    _worker_registry = PromptRegistry()
+    _worker_registry.load(entries)
+    _worker_registry.prepare()
+
+
+# Function to score one batch of (prompt_id, prompt, transcribed_text) rows
+def _score_rows(rows, max_word_count, registry=None):
+    registry = registry or _worker_registry
+    prompts = [registry.resolve(prompt_id, prompt) for prompt_id, prompt, _ in rows]
+    word_counts, scores, similarity_percentages = score_batch(prompts, [text for _, _, text in rows], max_word_count)
+    return word_counts.tolist(), scores.tolist(), similarity_percentages.tolist()
+
+
+# Function to write one scored batch back and advance the checkpoint past it
+def _write_batch(recordings_collection, checkpoints, job, ids, scored):
+    word_counts, scores, similarity_percentages = scored
+    rescored_at = datetime.now()
+    operations = [
+        UpdateOne({'_id': record_id}, {'$set': {
+            'word_count': word_count,
+            'score': score,
+            'similarity_percentage': similarity_percentage,
+            'rescored_at': rescored_at
+        }})
+        for record_id, word_count, score, similarity_percentage in zip(ids, word_counts, scores, similarity_percentages)
+    ]
+    recordings_collection.bulk_write(operations, ordered=False)
+    checkpoints.update_one(
+        {'_id': job},
+        {'$set': {'last_id': ids[-1], 'updated_at': rescored_at}, '$inc': {'rescored': len(ids)}}
+    )
+
+
+# Function to rescore every transcribed recording; returns the number rescored in this run.
+# Batches are scored in a process pool while the cursor keeps reading, and are written
+# back in cursor order so the checkpoint never skips an unwritten batch.
+def rescore(recordings_collection, checkpoints, registry, batch_size=RESCORE_BATCH_SIZE, workers=RESCORE_WORKERS,
+            max_word_count=MAX_WORD_COUNT, limit=0, restart=False, job='rescore', on_progress=None):
+    checkpoint = checkpoints.find_one({'_id': job})
+    if restart or not checkpoint or checkpoint.get('completed_at'):
+        checkpoint = {'_id': job, 'last_id': None, 'rescored': 0, 'started_at': datetime.now(),
+                      'max_word_count': max_word_count}
+        checkpoints.replace_one({'_id': job}, checkpoint, upsert=True)
+    else:
+        if checkpoint.get('last_id') is not None:
+            print(f"Resuming after {checkpoint['last_id']} ({checkpoint['rescored']} already rescored)")
+        # Scores from one job must agree, so a resumed job keeps the settings it started with
+        if checkpoint.get('max_word_count', max_word_count) != max_word_count:
+            print(f"Resuming with the job's max word count of {checkpoint['max_word_count']}, not {max_word_count}; "
+                  f"restart the job to change it")
+            max_word_count = checkpoint['max_word_count']
+
+    query = {'transcribed_text': {'$type': 'string'}}
+    if checkpoint['last_id'] is not None:
+        query['_id'] = {'$gt': checkpoint['last_id']}
+    cursor = recordings_collection.find(
+        query,
+        {'transcribed_text': 1, 'prompt': 1, 'prompt_id': 1},
+        no_cursor_timeout=True
+    ).sort('_id', pymongo.ASCENDING).batch_size(batch_size)
+    if limit:
+        cursor = cursor.limit(limit)
+
+    pool = None
+    if workers > 0:
+        entries = [{'id': prompt.id, 'text': prompt.text, 'topics': prompt.topics} for prompt in registry]
+        # Spawned, not forked: the caller may be a threaded web server
+        pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=_init_worker, initargs=(entries,))
+
+    rescored = 0
+    started = time.time()
+    pending = deque()
+
+    def drain(keep):
+        nonlocal rescored
+        while len(pending) > keep:
+            ids, scored = pending.popleft()
+            _write_batch(recordings_collection, checkpoints, job, ids, scored.result() if pool else scored)
+            rescored += len(ids)
+            rate = rescored / max(time.time() - started, 1e-6)
+            print(f"Rescored {rescored} recordings ({rate:.0f}/s)")
+            if on_progress:
+                on_progress(rescored)
+
+    def flush(batch):
+        ids = [record['_id'] for record in batch]
+        rows = [(record.get('prompt_id'), record.get('prompt', ''), record['transcribed_text']) for record in batch]
+        if pool:
+            pending.append((ids, pool.submit(_score_rows, rows, max_word_count)))
+        else:
+            pending.append((ids, _score_rows(rows, max_word_count, registry)))
+        # Keep every worker busy without reading the whole collection ahead
+        drain(keep=max(workers, 1) * 2)
+
+    try:
+        batch = []
+        for record in cursor:
+            batch.append(record)
+            if len(batch) >= batch_size:
+                flush(batch)
+                batch = []
+        if batch:
+            flush(batch)
+        drain(keep=0)
+        if not limit or rescored < limit:
+            checkpoints.update_one({'_id': job}, {'$set': {'completed_at': datetime.now()}})
+    finally:
+        cursor.close()
+        if pool:
+            pool.shutdown(cancel_futures=True)
+
+    return rescored
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Rescore transcribed recordings without re-running STT')
+    parser.add_argument('--batch-size', type=int, default=RESCORE_BATCH_SIZE)
+    parser.add_argument('--workers', type=int, default=RESCORE_WORKERS, help='Scoring processes (0 = in process)')
+    parser.add_argument('--max-word-count', type=int, default=MAX_WORD_COUNT)
+    parser.add_argument('--limit', type=int, default=0, help='Stop after this many records (0 = all)')
+    parser.add_argument('--restart', action='store_true', help='Ignore an unfinished checkpoint and start over')
+    args = parser.parse_args()
+
+    db = get_db()
+    registry = load_prompts(PromptRegistry(), db)
+    registry.prepare()
+
+    count = rescore(db['recordings'], db[CHECKPOINTS_COLLECTION], registry, args.batch_size, args.workers,
+                    args.max_word_count, args.limit, args.restart)
+    print(f"Rescored {count} recordings")
+
+    # Bulk writes bypass the incremental rollups and leaderboards, so recompute them.
+    # A running app keeps its in-memory leaderboards until restarted; /admin/rescore avoids that.
+    StatsRollup(db, db['recordings']).rebuild()
+    Leaderboard(db, db['recordings']).rebuild()
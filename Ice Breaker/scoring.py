@@ -0,0 +1,122 @@
+import math
+import threading
+from collections import Counter
+
+import numpy as np
+
+from similarity import get_engine, tokenize
+
+MAX_WORD_COUNT = 170  # Words needed for the full word-count share of the score
+
+
+# Function to get the engine vector for a registry Prompt (precomputed) or plain prompt text (cached)
+def prompt_vector(prompt):
+    if hasattr(prompt, 'vector'):
+        return prompt.vector
+    return get_engine().prompt_vector(prompt)
+
+
+# Function to calculate similarity between a prompt and a transcript with the
+# configured engine; only the transcript is vectorized per call
+def calculate_similarity(prompt, speech_text):
+    engine = get_engine()
+    return engine.similarity(prompt_vector(prompt), engine.vectorize(speech_text))
+
+
+# Function to combine word count and similarity into (score, similarity percentage)
+def combine_score(word_count, similarity_ratio, max_word_count=MAX_WORD_COUNT):
+    # Base score based on word count (60% of total score)
+    word_count_score = min((word_count / max_word_count) * 60, 60)
+
+    # Similarity score (40% of total score)
+    similarity_score = similarity_ratio * 40
+
+    # Total score
+    total_score = word_count_score + similarity_score
+
+    return round(total_score, 2), round(similarity_ratio * 100, 2)
+
+
+# Function to calculate score based on word count and prompt similarity.
+# prompt is a registry Prompt or the prompt text.
+def calculate_score(word_count, prompt, speech_text, max_word_count=MAX_WORD_COUNT):
+    similarity_ratio = calculate_similarity(prompt, speech_text)
+    return combine_score(word_count, similarity_ratio, max_word_count)
+
+
+# Function to score many transcripts at once; same formula as calculate_score().
+# Returns numpy arrays of word counts, scores and similarity percentages.
+def score_batch(prompts, speech_texts, max_word_count=MAX_WORD_COUNT):
+    engine = get_engine()
+    vectors = [prompt_vector(prompt) for prompt in prompts]
+    if hasattr(engine, 'similarity_batch'):
+        similarity_ratios = np.asarray(engine.similarity_batch(vectors, speech_texts), dtype=np.float64)
+    else:
+        similarity_ratios = np.array([engine.similarity(vector, engine.vectorize(text))
+                                      for vector, text in zip(vectors, speech_texts)], dtype=np.float64)
+
+    word_counts = np.fromiter((len(text.split()) for text in speech_texts), dtype=np.int64, count=len(speech_texts))
+    total_scores = np.minimum(word_counts / max_word_count * 60, 60) + similarity_ratios * 40
+    return word_counts, np.round(total_scores, 2), np.round(similarity_ratios * 100, 2)
+
+
+# Provisional score for a transcript that arrives chunk by chunk, in any order.
+# The word count is a running total. With an engine that weighs single terms
+# (tfidf), each add() only tokenizes the new chunk and updates a running dot
+# product with the prompt vector and the squared norm of the transcript vector,
+# so the cost is per chunk, not per transcript; the similarity matches
+# calculate_score() on the joined transcript up to rounding. Other engines
+# compare the prompt with the chunks so far, joined in chunk order.
+class RunningScore:
+    def __init__(self, prompt, max_word_count=MAX_WORD_COUNT):
+        self.max_word_count = max_word_count
+        self.word_count = 0
+        self.chunks = 0
+        self._engine = get_engine()
+        self._prompt_vector = prompt_vector(prompt)
+        self._lock = threading.Lock()
+
+        if hasattr(self._engine, 'term_weight'):
+            self._prompt_weights = dict(zip(self._prompt_vector.indices.tolist(), self._prompt_vector.values.tolist()))
+            self._term_counts = Counter()
+            self._dot = 0.0
+            self._norm_squared = 0.0
+        else:
+            self._term_counts = None
+            self._texts = {}  # Chunk index -> text
+
+    # Add a recognized chunk and return the provisional (score, similarity percentage).
+    # index is the chunk's position in the transcript; chunks are assumed to arrive in order without it.
+    def add(self, text, index=None):
+        with self._lock:
+            if index is None:
+                index = self.chunks
+            self.chunks += 1
+            self.word_count += len(text.split())
+
+            if self._term_counts is None:
+                self._texts[index] = text
+                return self._score()
+
+            for term, count in Counter(tokenize(text)).items():
+                before = self._term_counts[term]
+                after = before + count
+                self._term_counts[term] = after
+                slot, weight = self._engine.term_weight(term, after)
+                weight_before = self._engine.term_weight(term, before)[1] if before else 0.0
+                self._norm_squared += weight * weight - weight_before * weight_before
+                self._dot += (weight - weight_before) * self._prompt_weights.get(slot, 0.0)
+            return self._score()
+
+    def score(self):
+        with self._lock:
+            return self._score()
+
+    # Caller must hold the lock
+    def _score(self):
+        if self._term_counts is not None:
+            similarity_ratio = self._dot / math.sqrt(self._norm_squared) if self._norm_squared > 0 else 0.0
+        else:
+            transcript = " ".join(self._texts[index] for index in sorted(self._texts))
+            similarity_ratio = self._engine.similarity(self._prompt_vector, self._engine.vectorize(transcript))
+        return combine_score(self.word_count, similarity_ratio, self.max_word_count)
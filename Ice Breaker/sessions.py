@@ -0,0 +1,172 @@
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# Session settings
+SESSION_WORKERS = int(os.getenv('SESSION_WORKERS', '4'))  # Background capture/processing threads
+SESSION_TTL = int(os.getenv('SESSION_TTL', '3600'))  # Seconds a finished session stays queryable
+
+# Session states
+QUEUED = 'queued'
+RECEIVING = 'receiving'  # Waiting for audio uploaded by the browser
+RECORDING = 'recording'
+PROCESSING = 'processing'
+COMPLETED = 'completed'
+FAILED = 'failed'
+
+FINISHED_STATES = (COMPLETED, FAILED)
+
+
+# A single recording session tracked by the SessionManager
+class RecordingSession:
+    def __init__(self, user_id, prompt, source='server', prompt_id=None):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.prompt = prompt
+        self.prompt_id = prompt_id  # Registry id, when the prompt came from the registry
+        self.source = source  # 'server' microphone or 'browser' upload
+        self.stream = None  # Incremental transcriber for browser uploads
+        self.state = RECEIVING if source == 'browser' else QUEUED
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.events = []  # (event_id, event_name, payload) in emission order
+
+    def to_dict(self):
+        return {
+            'session_id': self.id,
+            'user_id': self.user_id,
+            'prompt': self.prompt,
+            'prompt_id': self.prompt_id,
+            'source': self.source,
+            'state': self.state,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
+        }
+
+
+# Runs recording sessions on a bounded background executor so request
+# handlers only ever enqueue work and read state
+class SessionManager:
+    def __init__(self, job, max_workers=SESSION_WORKERS, ttl=SESSION_TTL):
+        self._job = job
+        self._ttl = ttl
+        self._sessions = {}
+        self._condition = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='session')
+
+    # Register a session without scheduling any work for it yet
+    def create(self, user_id, prompt, source='server', prompt_id=None):
+        session = RecordingSession(user_id, prompt, source, prompt_id)
+        with self._condition:
+            self._prune()
+            self._sessions[session.id] = session
+            self._emit(session, 'state', {'state': session.state})
+        return session
+
+    # Create a session and schedule its job; returns immediately
+    def submit(self, user_id, prompt, prompt_id=None):
+        session = self.create(user_id, prompt, prompt_id=prompt_id)
+        self.schedule(session)
+        return session
+
+    # Run a job (the manager's default job unless given) for a session in the background
+    def schedule(self, session, job=None):
+        self._executor.submit(self._run, session, job or self._job)
+
+    def get(self, session_id):
+        with self._condition:
+            return self._sessions.get(session_id)
+
+    # Move a session to a new state and notify listeners
+    def set_state(self, session, state):
+        with self._condition:
+            session.state = state
+            self._emit(session, 'state', {'state': state})
+
+    # Atomically move a session from one state to another; False if it was not in from_state
+    def transition(self, session, from_state, to_state):
+        with self._condition:
+            if session.state != from_state:
+                return False
+            session.state = to_state
+            self._emit(session, 'state', {'state': to_state})
+            return True
+
+    # Publish an arbitrary event to the session's listeners
+    def publish(self, session, event, payload):
+        with self._condition:
+            self._emit(session, event, payload)
+
+    # Block until the session reaches a final state or the timeout expires
+    def wait(self, session, timeout=None):
+        deadline = None if timeout is None else time.time() + timeout
+        with self._condition:
+            while session.state not in FINISHED_STATES:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            return session.state in FINISHED_STATES
+
+    # Yield server-sent-event frames for a session until it finishes,
+    # replaying anything after last_event_id first
+    def stream(self, session, last_event_id=0, keepalive=15):
+        position = last_event_id
+        while True:
+            with self._condition:
+                pending = [e for e in session.events if e[0] > position]
+                if not pending and session.state not in FINISHED_STATES:
+                    self._condition.wait(keepalive)
+                    pending = [e for e in session.events if e[0] > position]
+                finished = session.state in FINISHED_STATES
+
+            if not pending and not finished:
+                yield ': keepalive\n\n'
+                continue
+
+            for event_id, event, payload in pending:
+                position = event_id
+                yield f"id: {event_id}\nevent: {event}\ndata: {json.dumps(payload)}\n\n"
+
+            if finished:
+                return
+
+    def _run(self, session, job):
+        try:
+            result = job(self, session)
+        except Exception as e:
+            print(f"Session {session.id} failed: {e}")
+            with self._condition:
+                session.error = str(e)
+                session.state = FAILED
+                self._emit(session, 'failed', {'state': FAILED, 'error': session.error})
+            return
+
+        with self._condition:
+            session.result = result
+            session.state = COMPLETED
+            self._emit(session, 'completed', {'state': COMPLETED, 'result': result})
+
+    # Caller must hold the condition
+    def _emit(self, session, event, payload):
+        session.updated_at = time.time()
+        session.events.append((len(session.events) + 1, event, payload))
+        self._condition.notify_all()
+
+    # Caller must hold the condition
+    def _prune(self):
+        cutoff = time.time() - self._ttl
+        # Finished sessions, and browser uploads that were abandoned mid-stream
+        expired = [
+            session_id for session_id, session in self._sessions.items()
+            if session.state in FINISHED_STATES + (RECEIVING,) and session.updated_at < cutoff
+        ]
+        for session_id in expired:
+            del self._sessions[session_id]
@@ -0,0 +1,302 @@
+import math
+import os
+import re
+import threading
+import zlib
+from collections import Counter, OrderedDict
+from functools import lru_cache
+from difflib import SequenceMatcher
+
+import numpy as np
+
+# Similarity settings
+SIMILARITY_BACKEND = os.getenv('SIMILARITY_BACKEND', 'tfidf')  # tfidf, embedding or sequence
+EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'all-MiniLM-L6-v2')  # Local sentence-transformers model
+AD_HOC_PROMPT_CACHE = int(os.getenv('AD_HOC_PROMPT_CACHE', '256'))  # Vectors of unregistered prompt texts kept (LRU)
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+UNSEEN_TERM_SLOTS = 1 << 20  # Hashed vector slots, after the vocabulary, for terms no registered prompt contains
+
+STOP_WORDS = frozenset("""
+a about above after again against all am an and any are as at be because been before being below
+between both but by can could did do does doing down during each few for from further had has have
+having he her here hers herself him himself his how i if in into is it its itself just me more most my
+myself no nor not now of off on once only or other our ours ourselves out over own same she should so
+some such than that the their theirs them themselves then there these they this those through to too
+under until up very was we were what whats when where which while who whom why will with would you
+your youre youve youd yours yourself yourselves im ive id dont doesnt didnt cant wont isnt thats really
+like just also us tell share
+""".split())
+
+
+# Function to reduce a word to a crude stem so inflections of a word match.
+# Spoken vocabulary is small, so stems are cached.
+@lru_cache(maxsize=65536)
+def stem(word):
+    if len(word) > 3 and word.endswith('s') and not word.endswith(('ss', 'us', 'is')):
+        word = word[:-1]
+    for suffix in ('ing', 'ed', 'ly'):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[:-len(suffix)]
+            break
+    if word.endswith('ie'):
+        word = word[:-1]
+    if word.endswith('y'):
+        word = word[:-1] + 'i'
+    if word.endswith('e') and len(word) > 3:
+        word = word[:-1]
+    return word
+
+
+# Function to turn text into stemmed content-word tokens
+def tokenize(text):
+    words = TOKEN_PATTERN.findall(text.lower().replace("'", ""))
+    return [stem(word) for word in words if word not in STOP_WORDS]
+
+
+# A sparse, L2-normalized vector: sorted term indices and their weights
+class SparseVector:
+    __slots__ = ('indices', 'values')
+
+    def __init__(self, indices, values):
+        self.indices = indices
+        self.values = values
+
+
+# Prompt vectors by text. Registered prompts are kept for good; any other text
+# (a free-text prompt from a client) goes into a small LRU, so arbitrary prompts
+# cannot grow the cache without bound.
+class PromptVectorCache:
+    def __init__(self, max_ad_hoc=AD_HOC_PROMPT_CACHE):
+        self.max_ad_hoc = max_ad_hoc
+        self._registered = {}
+        self._ad_hoc = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._registered) + len(self._ad_hoc)
+
+    # Cached vector for text, computed with vectorize(text) on a miss
+    def get(self, text, vectorize, registered=False):
+        with self._lock:
+            vector = self._registered.get(text)
+            if vector is None and not registered:
+                vector = self._ad_hoc.get(text)
+                if vector is not None:
+                    self._ad_hoc.move_to_end(text)
+        if vector is not None:
+            return vector
+
+        vector = vectorize(text)
+        with self._lock:
+            if registered:
+                self._ad_hoc.pop(text, None)
+                self._registered[text] = vector
+            elif self.max_ad_hoc > 0:
+                self._ad_hoc[text] = vector
+                while len(self._ad_hoc) > self.max_ad_hoc:
+                    self._ad_hoc.popitem(last=False)
+        return vector
+
+    # Add vectors of registered prompts from (text, vector) pairs
+    def update(self, pairs):
+        with self._lock:
+            self._registered.update(pairs)
+
+    def clear(self):
+        with self._lock:
+            self._registered.clear()
+            self._ad_hoc.clear()
+
+
+# TF-IDF cosine similarity. The vocabulary and IDF weights come from the prompt
+# list, whose vectors are computed once; a transcript costs one tokenize pass.
+# Words outside the vocabulary (in a transcript, or in an unregistered prompt)
+# are hashed into slots after it, so they still match each other and count
+# towards the norm: off-topic speech lowers the score.
+class TfidfEngine:
+    name = 'tfidf'
+
+    def __init__(self, documents=()):
+        self._prompt_vectors = PromptVectorCache()
+        self.fit(documents)
+
+    # Build the vocabulary and IDF weights from the prompts and, unless prewarm
+    # is off (large prompt sets), pre-vectorize them
+    def fit(self, documents, prewarm=True):
+        documents = list(documents)
+        token_lists = [tokenize(document) for document in documents]
+
+        document_frequency = Counter()
+        for tokens in token_lists:
+            document_frequency.update(set(tokens))
+
+        terms = sorted(document_frequency)
+        count = len(documents)
+        idf = [math.log((1 + count) / (1 + document_frequency[term])) + 1 for term in terms]
+        self.load_vocabulary(terms, np.array(idf, dtype=np.float32), math.log(1 + count) + 1)
+
+        if prewarm:
+            self._prompt_vectors.update(
+                (document, self.vectorize_counts(Counter(tokens))) for document, tokens in zip(documents, token_lists)
+            )
+
+    # Use a vocabulary fitted earlier (e.g. from a saved prompt index) instead of refitting
+    def load_vocabulary(self, terms, idf, unseen_idf):
+        self.vocabulary = {term: i for i, term in enumerate(terms)}
+        self.idf = idf
+        self.unseen_idf = unseen_idf  # Weight of a term no prompt contains
+        self._prompt_vectors.clear()
+
+    # Vector for a prompt, cached so each registered prompt is only vectorized once
+    def prompt_vector(self, text, registered=False):
+        return self._prompt_vectors.get(text, self.vectorize, registered)
+
+    def vectorize(self, text):
+        return self.vectorize_counts(Counter(tokenize(text)))
+
+    # Vector from term counts, so callers that accumulate counts need not re-tokenize
+    def vectorize_counts(self, counts):
+        if not counts:
+            return SparseVector(np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32))
+
+        terms = list(counts)
+        frequencies = np.fromiter((counts[term] for term in terms), dtype=np.float32, count=len(terms))
+        indices = np.fromiter((self.vocabulary.get(term, -1) for term in terms), dtype=np.int64, count=len(terms))
+        known = indices >= 0
+
+        idf = np.full(len(terms), self.unseen_idf, dtype=np.float32)
+        idf[known] = self.idf[indices[known]]
+        weights = (1 + np.log(frequencies)) * idf
+        norm = np.sqrt(np.dot(weights, weights))
+
+        if known.all():
+            order = np.argsort(indices)
+            return SparseVector(indices[order].astype(np.int32), (weights / norm)[order].astype(np.float32))
+
+        # Unseen terms share hashed slots; np.unique sorts the indices and merges collisions
+        vocabulary_size = len(self.vocabulary)
+        indices[~known] = [vocabulary_size + self._unseen_slot(term) for term, seen in zip(terms, known) if not seen]
+        indices, positions = np.unique(indices, return_inverse=True)
+        values = np.bincount(positions, weights=weights / norm, minlength=indices.size)
+        return SparseVector(indices.astype(np.int32), values.astype(np.float32))
+
+    # Vector index and weight, before normalization, of a term occurring count times; the
+    # vector of some counts is these weights summed per index and divided by their norm
+    def term_weight(self, term, count):
+        index = self.vocabulary.get(term)
+        if index is None:
+            return len(self.vocabulary) + self._unseen_slot(term), (1 + math.log(count)) * self.unseen_idf
+        return index, (1 + math.log(count)) * float(self.idf[index])
+
+    @staticmethod
+    def _unseen_slot(term):
+        return zlib.crc32(term.encode('utf-8')) % UNSEEN_TERM_SLOTS
+
+    def similarity(self, a, b):
+        _, a_positions, b_positions = np.intersect1d(a.indices, b.indices, assume_unique=True, return_indices=True)
+        return float(np.dot(a.values[a_positions], b.values[b_positions]))
+
+    # Similarities of many (prompt vector, transcript) pairs. The pairs are laid out
+    # as one flat array keyed by (row, term), so a single intersect replaces a loop.
+    def similarity_batch(self, prompt_vectors, texts):
+        transcript_vectors = [self.vectorize(text) for text in texts]
+        width = len(self.vocabulary) + UNSEEN_TERM_SLOTS
+        a_rows, a_keys, a_values = self._flatten(prompt_vectors, width)
+        _, b_keys, b_values = self._flatten(transcript_vectors, width)
+
+        _, a_positions, b_positions = np.intersect1d(a_keys, b_keys, assume_unique=True, return_indices=True)
+        products = a_values[a_positions].astype(np.float64) * b_values[b_positions]
+        return np.bincount(a_rows[a_positions], weights=products, minlength=len(prompt_vectors))
+
+    # Concatenate vectors into (row, row * width + term, value) arrays, sorted by key;
+    # width covers every term index, hashed slots included
+    def _flatten(self, vectors, width):
+        sizes = [vector.indices.size for vector in vectors]
+        rows = np.repeat(np.arange(len(vectors), dtype=np.int64), sizes)
+        if not rows.size:
+            return rows, rows, np.zeros(0, dtype=np.float32)
+        indices = np.concatenate([vector.indices for vector in vectors]).astype(np.int64)
+        values = np.concatenate([vector.values for vector in vectors])
+        return rows, rows * width + indices, values
+
+
+# Cosine similarity of sentence embeddings from a small local model, loaded once
+class EmbeddingEngine:
+    name = 'embedding'
+
+    def __init__(self, documents=(), model_name=EMBEDDING_MODEL):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError:
+            raise RuntimeError("The embedding backend needs 'sentence-transformers' (pip install sentence-transformers)")
+
+        self.model = SentenceTransformer(model_name, device='cpu')
+        self._prompt_vectors = PromptVectorCache()
+        self.fit(documents)
+
+    def fit(self, documents, prewarm=True):
+        documents = list(documents)
+        if not documents or not prewarm:
+            return
+        vectors = self.model.encode(documents, normalize_embeddings=True, convert_to_numpy=True)
+        self._prompt_vectors.update(zip(documents, vectors))
+
+    def prompt_vector(self, text, registered=False):
+        return self._prompt_vectors.get(text, self.vectorize, registered)
+
+    def vectorize(self, text):
+        return self.model.encode([text], normalize_embeddings=True, convert_to_numpy=True)[0]
+
+    def similarity(self, a, b):
+        return max(float(np.dot(a, b)), 0.0)
+
+    # Similarities of many (prompt vector, transcript) pairs, encoding the transcripts in one call
+    def similarity_batch(self, prompt_vectors, texts):
+        if not texts:
+            return np.zeros(0)
+        vectors = self.model.encode(list(texts), normalize_embeddings=True, convert_to_numpy=True)
+        return np.maximum(np.einsum('ij,ij->i', np.stack(prompt_vectors), vectors), 0.0)
+
+
+# The original character-level SequenceMatcher ratio
+class SequenceEngine:
+    name = 'sequence'
+
+    def __init__(self, documents=()):
+        pass
+
+    def fit(self, documents, prewarm=True):
+        pass
+
+    def prompt_vector(self, text, registered=False):
+        return text.lower()
+
+    def vectorize(self, text):
+        return text.lower()
+
+    def similarity(self, a, b):
+        return SequenceMatcher(None, a, b).ratio()
+
+
+SIMILARITY_ENGINES = {
+    'tfidf': TfidfEngine,
+    'embedding': EmbeddingEngine,
+    'sequence': SequenceEngine
+}
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+# Function to get the configured engine, creating it on first use
+def get_engine():
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                if SIMILARITY_BACKEND not in SIMILARITY_ENGINES:
+                    raise ValueError(f"Unknown SIMILARITY_BACKEND '{SIMILARITY_BACKEND}'; "
+                                     f"choose from {', '.join(SIMILARITY_ENGINES)}")
+                _engine = SIMILARITY_ENGINES[SIMILARITY_BACKEND]()
+    return _engine
@@ -0,0 +1,351 @@
+// Recording duration in seconds, set on the page by the server
+const DURATION = Number(document.body.dataset.duration);
+
+// Store the current question
+let currentQuestion = null;
+let currentPromptId = null;
+let currentRecordId = null;
+let countdownInterval = null;
+let remainingTime = DURATION;
+
+// Fetch a random question; the page itself is the same for everyone so it can be cached
+function loadQuestion() {
+    return fetch('/get_ice_breaker')
+        .then(response => response.json())
+        .then(data => {
+            document.getElementById('ice-breaker-text').textContent = data.question;
+            currentQuestion = data.question;
+            currentPromptId = data.prompt_id;
+        });
+}
+
+document.getElementById('new-question').addEventListener('click', loadQuestion);
+loadQuestion();
+
+function startCountdown() {
+    const countdownContainer = document.getElementById('countdown-container');
+    const countdownTimer = document.getElementById('countdown-timer');
+    const countdownBar = document.getElementById('countdown-bar');
+
+    countdownContainer.style.display = 'block';
+    remainingTime = DURATION;
+    countdownTimer.textContent = remainingTime;
+    countdownBar.style.width = '100%';
+
+    // Update countdown every second
+    countdownInterval = setInterval(function() {
+        remainingTime--;
+        countdownTimer.textContent = remainingTime;
+
+        // Update progress bar
+        const percentageLeft = (remainingTime / DURATION) * 100;
+        countdownBar.style.width = percentageLeft + '%';
+
+        // Change color as time gets low
+        if (remainingTime <= 10) {
+            countdownTimer.style.color = '#f44336'; // Red
+            countdownBar.style.backgroundColor = '#f44336';
+        }
+
+        if (remainingTime <= 0) {
+            clearInterval(countdownInterval);
+        }
+    }, 1000);
+}
+
+function stopCountdown() {
+    clearInterval(countdownInterval);
+    document.getElementById('countdown-container').style.display = 'none';
+    document.getElementById('countdown-timer').style.color = '#333'; // Reset color
+    document.getElementById('countdown-bar').style.backgroundColor = '#4CAF50'; // Reset color
+}
+
+document.getElementById('start-recording').addEventListener('click', function() {
+    this.disabled = true;
+    document.getElementById('loading').style.display = 'none';
+
+    // Start countdown
+    startCountdown();
+
+    const userName = document.getElementById('user-name').value || 'anonymous';
+    const button = this;
+
+    function showResults(data) {
+        document.getElementById('loading').style.display = 'none';
+        document.getElementById('results').style.display = 'block';
+        if (data.status === 'pending_retry') {
+            // Speech recognition was busy; the recording is saved and scored later
+            document.getElementById('transcription').textContent = data.message;
+            document.getElementById('word-count').textContent = '';
+            document.getElementById('similarity').textContent = '';
+            document.getElementById('score').textContent = 'Score: pending';
+            document.getElementById('record-id').textContent = 'Record ID: ' + data.record_id;
+            currentRecordId = data.record_id;
+            button.disabled = false;
+            return;
+        }
+        document.getElementById('transcription').textContent = data.transcribed_text;
+        document.getElementById('word-count').textContent = 'Word Count: ' + data.word_count;
+        document.getElementById('similarity').textContent = 'Relevance to Topic: ' + data.similarity_percentage.toFixed(2) + '%';
+        document.getElementById('score').textContent = 'Overall Score: ' + data.score.toFixed(2) + '%';
+        document.getElementById('record-id').textContent = 'Record ID: ' + data.record_id;
+        currentRecordId = data.record_id;
+        button.disabled = false;
+    }
+
+    function showError(error) {
+        console.error('Error:', error);
+        // Stop countdown
+        stopCountdown();
+
+        document.getElementById('loading').style.display = 'none';
+        if (error && error.retryAfter) {
+            alert('The server is busy. Please try again in ' + error.retryAfter + ' seconds.');
+        } else {
+            alert('An error occurred during recording. Please try again.');
+        }
+        button.disabled = false;
+    }
+
+    // Capture in the browser and stream it to the session as it is recorded
+    navigator.mediaDevices.getUserMedia({ audio: true })
+    .then(stream => fetch('/sessions', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({
+            prompt_id: currentPromptId,
+            prompt: currentQuestion,
+            user_id: userName,
+            source: 'browser'
+        })
+    })
+    .then(response => {
+        if (response.status === 429) {
+            const error = new Error('Server busy');
+            error.retryAfter = response.headers.get('Retry-After');
+            throw error;
+        }
+        return response.json();
+    })
+    .then(session => {
+        // Follow the session's progress until it completes
+        const events = new EventSource(session.events_url);
+
+        events.addEventListener('state', function(event) {
+            const data = JSON.parse(event.data);
+            if (data.state === 'processing') {
+                stopCountdown();
+                document.getElementById('loading').style.display = 'block';
+            }
+        });
+
+        // Live transcript and provisional score while chunks are recognized
+        const partialTexts = [];
+        events.addEventListener('partial', function(event) {
+            const data = JSON.parse(event.data);
+            partialTexts[data.index] = data.text;
+            document.getElementById('results').style.display = 'block';
+            document.getElementById('transcription').textContent = partialTexts.filter(text => text).join(' ');
+            document.getElementById('word-count').textContent = 'Word Count: ' + data.word_count;
+            document.getElementById('similarity').textContent = 'Relevance to Topic (provisional): ' + data.similarity_percentage.toFixed(2) + '%';
+            document.getElementById('score').textContent = 'Score so far: ' + data.score.toFixed(2) + '%';
+        });
+
+        events.addEventListener('completed', function(event) {
+            events.close();
+            stopCountdown();
+            showResults(JSON.parse(event.data).result);
+        });
+
+        events.addEventListener('failed', function(event) {
+            events.close();
+            showError(JSON.parse(event.data).error);
+        });
+
+        streamAudio(stream, session).catch(error => {
+            events.close();
+            showError(error);
+        });
+    }))
+    .catch(showError);
+});
+
+// Convert float samples to 16-bit PCM at the target rate, averaging
+// the input samples that fall into each output sample
+function toPcm16(input, inputRate, outputRate) {
+    const ratio = inputRate / outputRate;
+    const output = new Int16Array(Math.floor(input.length / ratio));
+    for (let i = 0; i < output.length; i++) {
+        const start = Math.floor(i * ratio);
+        const end = Math.max(Math.floor((i + 1) * ratio), start + 1);
+        let sum = 0;
+        for (let j = start; j < end; j++) {
+            sum += input[j];
+        }
+        const sample = Math.max(-1, Math.min(1, sum / (end - start)));
+        output[i] = sample < 0 ? sample * 0x8000 : sample * 0x7FFF;
+    }
+    return output;
+}
+
+// Record for the countdown duration, uploading a block every second,
+// then tell the server the stream is complete
+function streamAudio(stream, session) {
+    const context = new AudioContext();
+    const source = context.createMediaStreamSource(stream);
+    const processor = context.createScriptProcessor(4096, 1, 1);
+    let pending = [];
+    let seq = 0;
+    let uploads = Promise.resolve();
+
+    processor.onaudioprocess = function(event) {
+        pending.push(toPcm16(event.inputBuffer.getChannelData(0), context.sampleRate, session.sample_rate));
+    };
+    source.connect(processor);
+    processor.connect(context.destination);
+
+    function upload() {
+        if (pending.length === 0) {
+            return uploads;
+        }
+        const length = pending.reduce((total, block) => total + block.length, 0);
+        const body = new Int16Array(length);
+        let offset = 0;
+        pending.forEach(block => {
+            body.set(block, offset);
+            offset += block.length;
+        });
+        pending = [];
+
+        const url = session.audio_url + '?seq=' + (seq++);
+        uploads = uploads.then(() => fetch(url, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/octet-stream',
+                'X-Sample-Rate': String(session.sample_rate)
+            },
+            body: body.buffer
+        })).then(response => {
+            if (!response.ok) {
+                throw new Error('Upload failed with status ' + response.status);
+            }
+        });
+        return uploads;
+    }
+
+    const uploadInterval = setInterval(upload, 1000);
+
+    return new Promise(resolve => setTimeout(resolve, DURATION * 1000))
+        .then(() => {
+            clearInterval(uploadInterval);
+            processor.disconnect();
+            source.disconnect();
+            stream.getTracks().forEach(track => track.stop());
+            context.close();
+            return upload();
+        })
+        .then(() => fetch(session.finish_url, { method: 'POST' }));
+}
+
+// Keyset cursor for the next history page; null when there are no more
+let historyAfter = null;
+
+// Fetch one page of history and append its rows to the table
+function loadHistory(reset) {
+    const userName = document.getElementById('user-name').value || 'anonymous';
+    const historyBody = document.getElementById('history-body');
+    const loadMoreButton = document.getElementById('load-more-history');
+    const params = new URLSearchParams({ user_id: userName });
+    if (!reset && historyAfter) {
+        params.set('after', historyAfter);
+    }
+
+    return fetch('/get_history?' + params.toString())
+        .then(response => response.json())
+        .then(data => {
+            if (reset) {
+                historyBody.innerHTML = '';
+            }
+
+            if (reset && data.recordings.length === 0) {
+                historyBody.innerHTML = '<tr><td colspan="4">No recordings found</td></tr>';
+            }
+            data.recordings.forEach(recording => {
+                const row = document.createElement('tr');
+
+                // Date column
+                const dateCell = document.createElement('td');
+                const recordDate = new Date(recording.timestamp);
+                dateCell.textContent = recordDate.toLocaleString();
+                row.appendChild(dateCell);
+
+                // Prompt column
+                const promptCell = document.createElement('td');
+                promptCell.textContent = recording.prompt;
+                row.appendChild(promptCell);
+
+                // Score column
+                const scoreCell = document.createElement('td');
+                if (recording.status === 'pending_retry') {
+                    scoreCell.textContent = 'Pending';
+                } else {
+                    scoreCell.textContent = recording.score ? recording.score.toFixed(2) + '%' : 'N/A';
+                }
+                row.appendChild(scoreCell);
+
+                // Actions column
+                const actionsCell = document.createElement('td');
+
+                const playButton = document.createElement('button');
+                playButton.textContent = 'Play';
+                playButton.style.padding = '5px 10px';
+                playButton.style.marginRight = '5px';
+                playButton.addEventListener('click', function() {
+                    window.location.href = '/play_audio/' + recording._id;
+                });
+                actionsCell.appendChild(playButton);
+
+                const viewButton = document.createElement('button');
+                viewButton.textContent = 'Details';
+                viewButton.style.padding = '5px 10px';
+                viewButton.addEventListener('click', function() {
+                    window.location.href = '/recording_details/' + recording._id;
+                });
+                actionsCell.appendChild(viewButton);
+
+                row.appendChild(actionsCell);
+                historyBody.appendChild(row);
+            });
+
+            historyAfter = data.next;
+            loadMoreButton.style.display = historyAfter ? 'block' : 'none';
+        });
+}
+
+document.getElementById('view-history').addEventListener('click', function() {
+    const historySection = document.getElementById('history-section');
+
+    if (historySection.style.display === 'block') {
+        historySection.style.display = 'none';
+        this.textContent = 'View History';
+    } else {
+        loadHistory(true)
+        .then(() => {
+            historySection.style.display = 'block';
+            this.textContent = 'Hide History';
+        })
+        .catch(error => {
+            console.error('Error:', error);
+            alert('Failed to load history.');
+        });
+    }
+});
+
+document.getElementById('load-more-history').addEventListener('click', function() {
+    loadHistory(false).catch(error => {
+        console.error('Error:', error);
+        alert('Failed to load history.');
+    });
+});
@@ -0,0 +1,194 @@
+import argparse
+import os
+from datetime import datetime
+
+import numpy as np
+import pymongo
+from pymongo import ReplaceOne
+
+from db import get_db
+from prompts import make_prompt_id
+
+# Statistics settings
+STATS_RECENT = 20  # Latest scores kept per user for the trend
+STATS_REBUILD_INTERVAL = int(os.getenv('STATS_REBUILD_INTERVAL', '0'))  # Seconds between full rebuilds (0 = never)
+USER_STATS_COLLECTION = 'user_stats'
+PROMPT_STATS_COLLECTION = 'prompt_stats'
+
+# Rollup documents, one per user and one per prompt, kept up to date as scores are
+# saved so /stats reads a single document instead of scanning recordings:
+#
+#   user_stats:   {_id: user_id, count, score_sum, best_score, updated_at,
+#                  prompts: {prompt_id: {count, score_sum, best_score}},
+#                  recent: [{record_id, score, at}, ...]}
+#   prompt_stats: {_id: prompt_id, prompt, count, score_sum, best_score, updated_at}
+#
+# Rescoring a record applies the score difference. A lowered best score is
+# recomputed from recordings. rebuild() recomputes everything from recordings.
+
+
+class StatsRollup:
+    def __init__(self, db, recordings_collection):
+        self.users = db[USER_STATS_COLLECTION]
+        self.prompts = db[PROMPT_STATS_COLLECTION]
+        self.recordings = recordings_collection
+
+    # Fold a saved score into the rollups. record is the recording as it was
+    # before the save (user_id, prompt, prompt_id, timestamp and any earlier score);
+    # is_new says it was inserted with this score, so there is no earlier one.
+    def record(self, record, score, is_new=False):
+        user_id = record.get('user_id', 'anonymous')
+        prompt_id = record.get('prompt_id') or make_prompt_id(record.get('prompt', ''))
+        previous = None if is_new else record.get('score')
+        added = 1 if previous is None else 0
+        delta = score if previous is None else score - previous
+        now = datetime.now()
+
+        user_update = {
+            '$inc': {
+                'count': added,
+                'score_sum': delta,
+                f'prompts.{prompt_id}.count': added,
+                f'prompts.{prompt_id}.score_sum': delta
+            },
+            '$max': {'best_score': score, f'prompts.{prompt_id}.best_score': score},
+            '$set': {'updated_at': now}
+        }
+        if previous is None:
+            user_update['$push'] = {'recent': {
+                '$each': [{'record_id': record['_id'], 'score': score, 'at': record.get('timestamp', now)}],
+                '$slice': -STATS_RECENT
+            }}
+        self.users.update_one({'_id': user_id}, user_update, upsert=True)
+        if previous is not None:
+            # Only matches while the record is still among the recent scores
+            self.users.update_one({'_id': user_id, 'recent.record_id': record['_id']},
+                                  {'$set': {'recent.$.score': score}})
+
+        self.prompts.update_one(
+            {'_id': prompt_id},
+            {
+                '$inc': {'count': added, 'score_sum': delta},
+                '$max': {'best_score': score},
+                '$set': {'updated_at': now},
+                '$setOnInsert': {'prompt': record.get('prompt', '')}
+            },
+            upsert=True
+        )
+
+        # $max cannot lower a best score, so look it up again if this one was lowered
+        if previous is not None and score < previous:
+            self._refresh_best(user_id, prompt_id, record.get('prompt', ''))
+
+    def _refresh_best(self, user_id, prompt_id, prompt):
+        for_prompt = {'$or': [{'prompt_id': prompt_id}, {'prompt_id': None, 'prompt': prompt}]}
+        self.users.update_one({'_id': user_id}, {'$set': {
+            'best_score': self._best({'user_id': user_id}),
+            f'prompts.{prompt_id}.best_score': self._best(dict(for_prompt, user_id=user_id))
+        }})
+        self.prompts.update_one({'_id': prompt_id}, {'$set': {'best_score': self._best(for_prompt)}})
+
+    def _best(self, query):
+        best = list(self.recordings.find(dict(query, score={'$type': 'number'}), {'score': 1})
+                    .sort('score', pymongo.DESCENDING).limit(1))
+        return best[0]['score'] if best else None
+
+    # Per-user summary from the user's rollup document
+    def user_summary(self, user_id):
+        document = self.users.find_one({'_id': user_id}) or {}
+        summary = summarize(document)
+        summary['user_id'] = user_id
+        recent = document.get('recent', [])
+        summary['recent_scores'] = [entry['score'] for entry in recent]
+        summary['trend'] = trend([entry['score'] for entry in recent])
+        summary['prompts'] = [
+            dict(summarize(totals), prompt_id=prompt_id)
+            for prompt_id, totals in document.get('prompts', {}).items()
+            if totals.get('count')
+        ]
+        return summary
+
+    # Per-prompt summary from the prompt's rollup document
+    def prompt_summary(self, prompt_id):
+        document = self.prompts.find_one({'_id': prompt_id}) or {}
+        return dict(summarize(document), prompt_id=prompt_id, prompt=document.get('prompt'))
+
+    # Recompute every rollup from recordings. Scores saved while this runs may be
+    # counted once too few or too many until the next rebuild.
+    def rebuild(self):
+        pipeline = [
+            {'$match': {'score': {'$type': 'number'}}},
+            {'$group': {
+                '_id': {'user_id': '$user_id', 'prompt_id': '$prompt_id', 'prompt': '$prompt'},
+                'count': {'$sum': 1},
+                'score_sum': {'$sum': '$score'},
+                'best_score': {'$max': '$score'}
+            }}
+        ]
+        now = datetime.now()
+        users = {}
+        prompts = {}
+        for row in self.recordings.aggregate(pipeline, allowDiskUse=True):
+            key = row['_id']
+            user_id = key.get('user_id', 'anonymous')
+            prompt_id = key.get('prompt_id') or make_prompt_id(key.get('prompt') or '')
+
+            user = users.setdefault(user_id, {'_id': user_id, 'prompts': {}, 'updated_at': now})
+            fold(user, row)
+            fold(user['prompts'].setdefault(prompt_id, {}), row)
+            fold(prompts.setdefault(prompt_id, {'_id': prompt_id, 'prompt': key.get('prompt'), 'updated_at': now}), row)
+
+        for user_id, user in users.items():
+            # Served by the user_history index
+            latest = self.recordings.find(
+                {'user_id': user_id, 'score': {'$type': 'number'}}, {'score': 1, 'timestamp': 1}
+            ).sort([('timestamp', pymongo.DESCENDING), ('_id', pymongo.DESCENDING)]).limit(STATS_RECENT)
+            user['recent'] = [
+                {'record_id': entry['_id'], 'score': entry['score'], 'at': entry.get('timestamp')}
+                for entry in latest
+            ][::-1]
+
+        for collection, documents in ((self.users, users), (self.prompts, prompts)):
+            if documents:
+                collection.bulk_write(
+                    [ReplaceOne({'_id': key}, document, upsert=True) for key, document in documents.items()],
+                    ordered=False
+                )
+            collection.delete_many({'_id': {'$nin': list(documents)}})
+        return len(users), len(prompts)
+
+
+# Function to add an aggregated row's totals into a rollup entry
+def fold(totals, row):
+    totals['count'] = totals.get('count', 0) + row['count']
+    totals['score_sum'] = totals.get('score_sum', 0) + row['score_sum']
+    best = totals.get('best_score')
+    totals['best_score'] = row['best_score'] if best is None else max(best, row['best_score'])
+
+
+# Function to turn rollup totals into the numbers the API reports
+def summarize(totals):
+    count = totals.get('count', 0)
+    return {
+        'count': count,
+        'average_score': round(totals['score_sum'] / count, 2) if count else None,
+        'best_score': totals.get('best_score') if count else None
+    }
+
+
+# Function to measure the score trend: the least-squares slope in points per recording
+def trend(scores):
+    if len(scores) < 2:
+        return None
+    slope = np.polyfit(np.arange(len(scores)), np.asarray(scores, dtype=np.float64), 1)[0]
+    return round(float(slope), 3)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Maintain the score rollups behind /stats')
+    parser.add_argument('command', choices=['rebuild'])
+    args = parser.parse_args()
+
+    db = get_db()
+    user_count, prompt_count = StatsRollup(db, db['recordings']).rebuild()
+    print(f"Rebuilt stats for {user_count} users and {prompt_count} prompts")
@@ -0,0 +1,159 @@
+import hashlib
+import io
+import math
+import os
+from datetime import datetime, timezone
+
+import gridfs
+from bson.binary import Binary
+from pydub import AudioSegment
+
+from db import resolve
+
+# Audio storage settings
+AUDIO_STORAGE = os.getenv('AUDIO_STORAGE', 'gridfs')  # gridfs, or binary for a separate blob collection
+AUDIO_CODEC = os.getenv('AUDIO_CODEC', 'wav')  # wav, flac or opus (flac/opus need ffmpeg)
+AUDIO_STREAM_CHUNK = 255 * 1024  # Matches the GridFS chunk size so each read maps to one chunk
+
+# codec -> (pydub export format, mimetype, extra export arguments)
+CODECS = {
+    'wav': ('wav', 'audio/wav', {}),
+    'flac': ('flac', 'audio/flac', {}),
+    'opus': ('ogg', 'audio/ogg', {'codec': 'libopus'})
+}
+
+
+# Stores audio blobs apart from the recordings collection; recordings only
+# keep the small metadata document returned by put(). writes, when given, is the
+# WriteStats the upload round trips and bytes are added to.
+class AudioStore:
+    def __init__(self, db, storage=AUDIO_STORAGE, codec=AUDIO_CODEC, writes=None):
+        if storage not in ('gridfs', 'binary'):
+            raise ValueError(f"Unknown AUDIO_STORAGE '{storage}'; choose gridfs or binary")
+        if codec not in CODECS:
+            raise ValueError(f"Unknown AUDIO_CODEC '{codec}'; choose from {', '.join(CODECS)}")
+
+        self.storage = storage
+        self.codec = codec
+        self.db = db
+        self.blobs = db['audio_blobs']
+        self.writes = writes
+        self._fs = None
+
+    # GridFS bucket, created on first use so the store can be set up before Mongo is reachable
+    @property
+    def fs(self):
+        if self._fs is None:
+            self._fs = gridfs.GridFSBucket(resolve(self.db), bucket_name='audio')
+        return self._fs
+
+    # Store WAV bytes and return the metadata to embed in a recording
+    def put(self, wav_bytes, filename):
+        data = encode_audio(wav_bytes, self.codec)
+        mimetype = CODECS[self.codec][1]
+
+        if self.storage == 'gridfs':
+            file_id = self.fs.upload_from_stream(
+                filename, data, metadata={'codec': self.codec, 'mimetype': mimetype}
+            )
+            round_trips = math.ceil(len(data) / AUDIO_STREAM_CHUNK) + 1  # One insert per chunk, then the files document
+        else:
+            # A single BSON document still caps out at 16 MB; use gridfs for longer recordings
+            file_id = self.blobs.insert_one({'data': Binary(data), 'filename': filename}).inserted_id
+            round_trips = 1
+        if self.writes is not None:
+            self.writes.add(round_trips=round_trips, bytes_sent=len(data))
+
+        return {
+            'storage': self.storage,
+            'file_id': file_id,
+            'codec': self.codec,
+            'mimetype': mimetype,
+            'length': len(data),
+            'sha256': hashlib.sha256(data).hexdigest(),  # Content address, e.g. for the transcript cache
+            'uploaded_at': datetime.utcnow()  # UTC, used for Last-Modified
+        }
+
+    # Read the blob exactly as stored (possibly compressed)
+    def read(self, meta):
+        if meta['storage'] == 'gridfs':
+            return self.fs.open_download_stream(meta['file_id']).read()
+        blob = self.blobs.find_one({'_id': meta['file_id']}, {'data': 1})
+        return bytes(blob['data']) if blob else None
+
+    # Open the blob for streaming without loading it all; GridFS reads only the chunks asked for
+    def open(self, meta):
+        if meta['storage'] == 'gridfs':
+            try:
+                stream = self.fs.open_download_stream(meta['file_id'])
+            except gridfs.errors.NoFile:
+                return None
+            return StoredAudio(stream, stream.length, meta['mimetype'], str(meta['file_id']), stream.upload_date)
+
+        data = self.read(meta)
+        if data is None:
+            return None
+        return StoredAudio(io.BytesIO(data), len(data), meta['mimetype'], str(meta['file_id']), meta['uploaded_at'])
+
+    # Read the blob and decode it back to WAV for processing
+    def read_wav(self, meta):
+        data = self.read(meta)
+        if data is None:
+            return None
+        return decode_audio(data, meta['codec'])
+
+    def delete(self, meta):
+        if meta['storage'] == 'gridfs':
+            self.fs.delete(meta['file_id'])
+        else:
+            self.blobs.delete_one({'_id': meta['file_id']})
+
+
+# A stored audio blob opened for (partial) reads
+class StoredAudio:
+    def __init__(self, fileobj, length, mimetype, etag, last_modified):
+        self.fileobj = fileobj
+        self.length = length
+        self.mimetype = mimetype
+        self.etag = etag
+        # Stored datetimes are naive UTC; HTTP date handling wants them aware
+        if last_modified is not None and last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=timezone.utc)
+        self.last_modified = last_modified
+
+    # Yield bytes [start, end) in storage-sized chunks, then close the stream
+    def iter_range(self, start, end, chunk_size=AUDIO_STREAM_CHUNK):
+        try:
+            self.fileobj.seek(start)
+            remaining = end - start
+            while remaining > 0:
+                data = self.fileobj.read(min(chunk_size, remaining))
+                if not data:
+                    break
+                remaining -= len(data)
+                yield data
+        finally:
+            self.close()
+
+    def close(self):
+        self.fileobj.close()
+
+
+# Function to encode WAV bytes with a storage codec
+def encode_audio(wav_bytes, codec):
+    if codec == 'wav':
+        return wav_bytes
+    export_format, _, export_args = CODECS[codec]
+    output = io.BytesIO()
+    AudioSegment.from_wav(io.BytesIO(wav_bytes)).export(output, format=export_format, **export_args)
+    return output.getvalue()
+
+
+# Function to decode stored audio back to WAV bytes
+def decode_audio(data, codec):
+    if codec == 'wav':
+        return data
+    export_format = CODECS[codec][0]
+    output = io.BytesIO()
+    AudioSegment.from_file(io.BytesIO(data), format=export_format).export(output, format='wav')
+    return output.getvalue()
@@ -0,0 +1,122 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import speech_recognition as sr
+
+from metrics import STT_FAILURES
+from transcription import STT_CHUNK_TIMEOUT
+
+# Speech-to-text settings
+STT_BACKEND = os.getenv('STT_BACKEND', 'google')  # google, vosk or stub
+VOSK_MODEL_PATH = os.getenv('VOSK_MODEL_PATH', 'models/vosk-model-small-en-us-0.15')
+STT_STUB_LATENCY = float(os.getenv('STT_STUB_LATENCY', '0'))  # Simulated seconds per call
+STT_STUB_WORDS_PER_SECOND = float(os.getenv('STT_STUB_WORDS_PER_SECOND', '2.5'))
+
+# Every backend takes an sr.AudioData and returns the recognized text.
+# Unintelligible audio gives "", and transient failures raise sr.RequestError
+# so the transcription stage can retry them.
+
+
+# Google Web Speech API, the original recognizer
+class GoogleBackend:
+    name = 'google'
+    model_version = 'web-speech-v2'
+
+    def __init__(self, timeout=STT_CHUNK_TIMEOUT):
+        self.timeout = timeout
+
+    def recognize(self, audio_data):
+        recognizer = sr.Recognizer()
+        # The HTTP timeout is what frees a pool worker from a stalled request;
+        # collect_transcripts giving up on the chunk doesn't stop the call
+        recognizer.operation_timeout = self.timeout
+        try:
+            return recognizer.recognize_google(audio_data)
+        except sr.UnknownValueError:
+            STT_FAILURES.inc(reason='unknown_value')
+            return ""
+
+
+# Offline Vosk recognizer; the model is loaded once and shared by all requests
+class VoskBackend:
+    name = 'vosk'
+    sample_rate = 16000
+
+    def __init__(self, model_path=VOSK_MODEL_PATH):
+        try:
+            import vosk
+        except ImportError:
+            raise RuntimeError("The vosk backend needs the 'vosk' package (pip install vosk)")
+
+        if not os.path.isdir(model_path):
+            raise RuntimeError(f"Vosk model not found at {model_path}; set VOSK_MODEL_PATH")
+
+        vosk.SetLogLevel(-1)
+        self._vosk = vosk
+        self.model = vosk.Model(model_path)
+        self.model_version = os.path.basename(os.path.normpath(model_path))
+
+    def recognize(self, audio_data):
+        recognizer = self._vosk.KaldiRecognizer(self.model, self.sample_rate)
+        recognizer.AcceptWaveform(bytes(audio_data.get_raw_data(convert_rate=self.sample_rate, convert_width=2)))
+        return json.loads(recognizer.FinalResult()).get('text', '')
+
+
+# Deterministic recognizer for benchmarks and tests: the same audio always
+# produces the same words, silence produces nothing, and nothing leaves the machine
+class StubBackend:
+    name = 'stub'
+    model_version = 'stub-1'
+
+    VOCABULARY = (
+        "i", "really", "enjoy", "my", "hobby", "because", "it", "helps", "me", "learn",
+        "new", "skills", "and", "travel", "with", "friends", "family", "every", "weekend",
+        "the", "best", "advice", "someone", "gave", "was", "to", "keep", "working", "towards",
+        "a", "goal", "that", "matters", "book", "movie", "challenge", "overcome", "lesson"
+    )
+
+    def __init__(self, latency=STT_STUB_LATENCY, words_per_second=STT_STUB_WORDS_PER_SECOND):
+        self.latency = latency
+        self.words_per_second = words_per_second
+
+    def recognize(self, audio_data):
+        if self.latency:
+            time.sleep(self.latency)
+
+        raw = audio_data.get_raw_data(convert_width=2)
+        samples = np.frombuffer(raw, dtype=np.int16)
+        if not samples.size or np.abs(samples).max() < 500:
+            return ""
+
+        duration = samples.size / audio_data.sample_rate
+        word_count = max(int(duration * self.words_per_second), 1)
+        seed = hashlib.sha256(raw).digest()
+        rng = np.random.default_rng(int.from_bytes(seed[:8], 'little'))
+        picks = rng.integers(0, len(self.VOCABULARY), word_count)
+        return " ".join(self.VOCABULARY[i] for i in picks)
+
+
+STT_BACKENDS = {
+    'google': GoogleBackend,
+    'vosk': VoskBackend,
+    'stub': StubBackend
+}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+# Function to get the configured backend, creating it on first use
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if STT_BACKEND not in STT_BACKENDS:
+                    raise ValueError(f"Unknown STT_BACKEND '{STT_BACKEND}'; choose from {', '.join(STT_BACKENDS)}")
+                _backend = STT_BACKENDS[STT_BACKEND]()
+    return _backend
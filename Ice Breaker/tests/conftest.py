@@ -0,0 +1,46 @@
+import os
+import sys
+
+import mongomock
+import pytest
+
+# Run from the "Ice Breaker" directory: python -m pytest tests
+#
+# Settings are read at import time, so set them before any app module is imported:
+# an in-memory Mongo stand-in, the stub recognizer and synthetic audio instead of a microphone
+os.environ.update(
+    MONGO_BACKEND='mongomock',
+    STT_BACKEND='stub',
+    STT_STUB_LATENCY='0',
+    TRANSCRIPT_CACHE='memory',
+    AUDIO_STORAGE='binary',
+    AUDIO_SOURCE='fake',
+    FAKE_AUDIO_REALTIME='0',
+    RECORDING_DURATION='3'
+)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+# A fresh in-memory database for each test
+@pytest.fixture
+def db():
+    return mongomock.MongoClient()['ice_breaker_test']
+
+
+# The Flask app module, with the shared database emptied before each test
+@pytest.fixture
+def app_module():
+    import app
+    from db import get_db
+
+    database = get_db()
+    for name in database.list_collection_names():
+        database.drop_collection(name)
+    app.load_prompt_registry()
+    app.leaderboard.rebuild()
+    return app
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
@@ -0,0 +1,25 @@
+import numpy as np
+
+RATE = 16000
+
+
+# Function to make a sine tone as int16 samples
+def tone(frequency, seconds, sample_rate, amplitude=8000):
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    return (amplitude * np.sin(2 * np.pi * frequency * t)).astype(np.int16)
+
+
+# Function to lay out speech (a loud tone) and pauses (faint noise) from (kind, seconds) pairs
+def layout(*parts, sample_rate=RATE):
+    rng = np.random.default_rng(0)
+    pieces = []
+    for kind, seconds in parts:
+        if kind == 'speech':
+            pieces.append(tone(180, seconds, sample_rate, 5000))
+        else:
+            pieces.append(rng.normal(0, 30, int(seconds * sample_rate)).astype(np.int16))
+    return np.concatenate(pieces)
+
+
+def rms(samples):
+    return float(np.sqrt(np.mean(samples.astype(np.float64) ** 2)))
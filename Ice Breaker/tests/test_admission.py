@@ -0,0 +1,125 @@
+import time
+
+import pytest
+
+from admission import CLOSED, HALF_OPEN, OPEN, Admission, CircuitBreaker, Overloaded, TokenBucket
+
+
+class RecognizerDown(Exception):
+    pass
+
+
+def fail(audio):
+    raise RecognizerDown('quota exceeded')
+
+
+def echo(audio):
+    return audio
+
+
+def test_token_bucket_allows_a_burst_then_the_rate():
+    bucket = TokenBucket(rate=20, burst=2)
+    assert bucket.acquire(0) and bucket.acquire(0)
+    assert not bucket.acquire(0)
+
+    started = time.monotonic()
+    assert bucket.acquire(1)  # Waits for the next token, about 1/20 s
+    assert 0.02 <= time.monotonic() - started < 0.5
+
+
+def test_token_bucket_gives_up_after_its_timeout():
+    bucket = TokenBucket(rate=1, burst=1)
+    assert bucket.acquire(0)
+    started = time.monotonic()
+    assert not bucket.acquire(0.1)
+    assert time.monotonic() - started < 0.1  # Knows the token comes too late without sleeping
+
+
+def test_token_bucket_without_a_rate_is_unlimited():
+    bucket = TokenBucket(rate=0, burst=1)
+    assert all(bucket.acquire(0) for _ in range(100))
+
+
+def test_circuit_opens_at_the_error_rate():
+    admission = Admission(breaker=CircuitBreaker(window=4, error_rate=0.5, cooldown=60))
+    for audio in range(2):
+        admission.call(echo, audio)
+    for _ in range(2):
+        with pytest.raises(RecognizerDown):
+            admission.call(fail, None)
+    assert admission.breaker.state == OPEN
+
+    with pytest.raises(Overloaded) as refused:
+        admission.call(echo, 1)
+    assert refused.value.reason == 'circuit_open'
+    assert 0 < refused.value.retry_after <= 60
+    assert admission.retry_after(0) == refused.value.retry_after
+
+
+def test_half_open_trial_success_closes_the_circuit():
+    breaker = CircuitBreaker(window=1, error_rate=1, cooldown=0)
+    admission = Admission(breaker=breaker)
+    with pytest.raises(RecognizerDown):
+        admission.call(fail, None)
+    assert breaker.state == OPEN
+
+    # Cooldown over: one trial call goes through while others are refused
+    assert breaker.allow() is True
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(Overloaded):
+        breaker.allow()
+    breaker.release(True)
+
+    assert admission.call(echo, 'ok') == 'ok'
+    assert breaker.state == CLOSED
+
+
+def test_half_open_trial_failure_reopens_the_circuit():
+    breaker = CircuitBreaker(window=1, error_rate=1, cooldown=0)
+    admission = Admission(breaker=breaker)
+    with pytest.raises(RecognizerDown):
+        admission.call(fail, None)
+    with pytest.raises(RecognizerDown):
+        admission.call(fail, None)
+    assert breaker.state == OPEN
+
+
+def test_any_error_in_the_half_open_trial_counts_as_a_failure():
+    breaker = CircuitBreaker(window=1, error_rate=1, cooldown=0)
+    admission = Admission(breaker=breaker)
+    with pytest.raises(RecognizerDown):
+        admission.call(fail, None, failures=(RecognizerDown,))
+
+    def bad_audio(audio):
+        raise ValueError('unreadable chunk')
+
+    with pytest.raises(ValueError):
+        admission.call(bad_audio, None, failures=(RecognizerDown,))
+    assert breaker.state == OPEN
+
+
+def test_errors_outside_failures_do_not_count_while_closed():
+    breaker = CircuitBreaker(window=1, error_rate=1, cooldown=60)
+    admission = Admission(breaker=breaker)
+
+    def bad_audio(audio):
+        raise ValueError('unreadable chunk')
+
+    with pytest.raises(ValueError):
+        admission.call(bad_audio, None, failures=(RecognizerDown,))
+    assert breaker.state == CLOSED
+
+
+def test_rate_limited_call_is_refused_without_touching_the_circuit():
+    admission = Admission(bucket=TokenBucket(rate=1, burst=1), breaker=CircuitBreaker(window=1), timeout=0)
+    admission.call(echo, 1)
+    with pytest.raises(Overloaded) as refused:
+        admission.call(echo, 2)
+    assert refused.value.reason == 'rate_limited'
+    assert admission.breaker.state == CLOSED
+
+
+def test_backlog_sheds_new_work():
+    admission = Admission(bucket=TokenBucket(rate=10, burst=1), max_backlog=50)
+    assert admission.retry_after(49) == 0
+    assert admission.retry_after(50) == 5  # 50 chunks at 10 per second
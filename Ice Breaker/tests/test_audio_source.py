@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+
+
+def test_fake_source_gives_fresh_speech_every_capture(app_module):
+    first = app_module.capture_audio(1)
+    second = app_module.capture_audio(1)
+    assert first.shape == (app_module.SAMPLE_RATE, app_module.CHANNELS) and first.dtype == np.int16
+    assert np.abs(first).max() > 500
+    assert not np.array_equal(first, second)
+
+
+def test_unknown_source_is_refused(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, 'AUDIO_SOURCE', 'cassette')
+    with pytest.raises(ValueError, match='cassette'):
+        app_module.capture_audio(1)
+
+
+def test_legacy_recording_flow_runs_without_a_microphone(client, app_module, monkeypatch, tmp_path):
+    monkeypatch.setitem(app_module.app.config, 'UPLOAD_FOLDER', str(tmp_path))
+    response = client.post('/start_recording', json={'user_id': 'alice'})
+    assert response.status_code == 200
+    result = response.get_json()
+    assert result['record_id'] and result['word_count'] > 0
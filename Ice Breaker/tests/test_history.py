@@ -0,0 +1,74 @@
+from datetime import datetime, timedelta
+
+from repository import new_recording
+
+
+# Function to insert recordings for a user, some sharing a timestamp; returns their ids newest first
+def add_recordings(app_module, user_id, count):
+    base = datetime(2024, 1, 1, 12, 0, 0)
+    inserted = []
+    for i in range(count):
+        record = new_recording(user_id, f'Prompt {i}', None, {})
+        record['timestamp'] = base + timedelta(minutes=i // 3)  # Groups of three tie on timestamp
+        record['score'] = i
+        inserted.append((record['timestamp'], app_module.recordings.insert(record)))
+    return [record_id for _, record_id in sorted(inserted, reverse=True)]
+
+
+# Function to read every page of a user's history; returns the ids in order and the page count
+def read_all_pages(client, user_id, limit):
+    ids, pages, after = [], 0, None
+    while True:
+        params = {'user_id': user_id, 'limit': limit}
+        if after:
+            params['after'] = after
+        response = client.get('/get_history', query_string=params)
+        assert response.status_code == 200
+        page = response.get_json()
+        pages += 1
+        ids.extend(recording['_id'] for recording in page['recordings'])
+        assert len(page['recordings']) <= limit
+        after = page['next']
+        if after is None:
+            return ids, pages
+
+
+def test_pages_cover_every_recording_once_newest_first(app_module, client):
+    expected = add_recordings(app_module, 'alice', 10)
+    add_recordings(app_module, 'bob', 4)
+
+    ids, pages = read_all_pages(client, 'alice', 3)
+    assert ids == expected
+    assert pages == 4
+
+
+def test_last_full_page_has_no_next(app_module, client):
+    add_recordings(app_module, 'alice', 4)
+    ids, pages = read_all_pages(client, 'alice', 2)
+    assert len(ids) == 4
+    assert pages == 2
+
+
+def test_cursor_survives_new_recordings(app_module, client):
+    expected = add_recordings(app_module, 'alice', 6)
+    first = client.get('/get_history', query_string={'user_id': 'alice', 'limit': 3}).get_json()
+
+    # A recording made while the user pages does not shift the following pages
+    newer = new_recording('alice', 'New prompt', None, {})
+    app_module.recordings.insert(newer)
+    second = client.get('/get_history', query_string={'user_id': 'alice', 'limit': 3, 'after': first['next']}).get_json()
+
+    assert [r['_id'] for r in first['recordings'] + second['recordings']] == expected
+
+
+def test_post_body_is_accepted(app_module, client):
+    expected = add_recordings(app_module, 'alice', 3)
+    page = client.post('/get_history', json={'user_id': 'alice', 'limit': 2}).get_json()
+    following = client.post('/get_history', json={'user_id': 'alice', 'after': page['next']}).get_json()
+    assert [r['_id'] for r in page['recordings'] + following['recordings']] == expected
+
+
+def test_invalid_cursor_or_limit_is_rejected(client):
+    assert client.get('/get_history', query_string={'after': 'garbage'}).status_code == 400
+    assert client.get('/get_history', query_string={'after': '2024-01-01T00:00:00_nothex'}).status_code == 400
+    assert client.get('/get_history', query_string={'limit': 'many'}).status_code == 400
@@ -0,0 +1,147 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from jobs import DONE, FAILED, LEASED, QUEUED, JobQueue, job_id
+from repository import RecordingRepository
+from worker import Worker, sweep
+
+
+@pytest.fixture
+def queue(db):
+    return JobQueue(db, visibility_timeout=60, max_attempts=3, retry_delay=10)
+
+
+# Function to make a job available now, as if its delay or lease had run out
+def make_available(queue, record_id):
+    queue.collection.update_one({'_id': job_id(record_id)}, {'$set': {'available_at': datetime.now()}})
+
+
+def test_lease_takes_the_oldest_available_job(queue):
+    queue.enqueue('a')
+    queue.enqueue('b', delay=-5)
+    queue.enqueue('c', delay=60)
+
+    assert queue.lease('w1')['record_id'] == 'b'
+    assert queue.lease('w1')['record_id'] == 'a'
+    assert queue.lease('w1') is None  # c is not due yet
+
+
+def test_leased_job_is_hidden_until_its_visibility_timeout(queue):
+    queue.enqueue('a')
+    job = queue.lease('w1')
+    assert job['state'] == LEASED and job['owner'] == 'w1' and job['attempts'] == 1
+    assert queue.lease('w2') is None
+
+    # The owner stops renewing: the lease runs out and another worker retries the job
+    make_available(queue, 'a')
+    retried = queue.lease('w2')
+    assert retried['owner'] == 'w2' and retried['attempts'] == 2
+
+    # The first owner lost the job and cannot complete or renew it
+    assert not queue.complete(job)
+    assert queue.extend([job['_id']], 'w1') == 0
+    assert queue.complete(retried)
+    assert queue.get(job['_id'])['state'] == DONE
+
+
+def test_extend_renews_the_lease(queue):
+    queue.enqueue('a')
+    job = queue.lease('w1')
+    queue.collection.update_one({'_id': job['_id']}, {'$set': {'available_at': datetime.now() + timedelta(seconds=1)}})
+
+    assert queue.extend([job['_id']], 'w1') == 1
+    assert queue.get(job['_id'])['available_at'] > datetime.now() + timedelta(seconds=50)
+
+
+def test_failed_job_is_retried_after_a_growing_delay(queue):
+    queue.enqueue('a')
+
+    job = queue.lease('w1')
+    assert queue.fail(job, RuntimeError('boom')) == QUEUED
+    stored = queue.get(job['_id'])
+    assert stored['last_error'] == 'boom'
+    assert stored['available_at'] >= datetime.now() + timedelta(seconds=9)
+    assert queue.lease('w1') is None
+
+    make_available(queue, 'a')
+    job = queue.lease('w1')
+    queue.fail(job, RuntimeError('boom'))
+    assert queue.get(job['_id'])['available_at'] >= datetime.now() + timedelta(seconds=19)
+
+
+def test_retry_after_longer_than_the_backoff_wins(queue):
+    queue.enqueue('a')
+    job = queue.lease('w1')
+    queue.fail(job, RuntimeError('busy'), retry_after=120)
+    assert queue.get(job['_id'])['available_at'] >= datetime.now() + timedelta(seconds=119)
+
+
+def test_job_fails_for_good_after_max_attempts(queue):
+    queue.enqueue('a')
+    for attempt in range(1, queue.max_attempts + 1):
+        make_available(queue, 'a')
+        job = queue.lease('w1')
+        assert job['attempts'] == attempt
+        state = queue.fail(job, RuntimeError('boom'))
+    assert state == FAILED
+    make_available(queue, 'a')
+    assert queue.lease('w1') is None
+    assert queue.counts() == {QUEUED: 0, LEASED: 0, DONE: 0, FAILED: 1}
+
+
+def test_enqueue_is_idempotent_and_requeues_finished_jobs(queue):
+    assert queue.enqueue('a') == queue.enqueue('a') == job_id('a')
+    assert queue.counts()[QUEUED] == 1
+
+    job = queue.lease('w1')
+    queue.complete(job)
+    queue.enqueue('a', requeue=False)
+    assert queue.get(job['_id'])['state'] == DONE
+    queue.enqueue('a')
+    assert queue.get(job['_id'])['state'] == QUEUED
+    assert queue.get(job['_id'])['attempts'] == 0
+
+
+def test_worker_completes_jobs_only_after_their_results_are_flushed(queue):
+    processed, flushed = [], []
+
+    def flush():
+        # Nothing is marked done before the batch is written
+        assert queue.counts()[DONE] == 0
+        flushed.extend(processed)
+
+    worker = Worker(queue, processed.append, threads=1, flush=flush, batch_size=10)
+    for record_id in ('a', 'b', 'c'):
+        queue.enqueue(record_id)
+
+    assert worker.drain() == 3
+    assert flushed == ['a', 'b', 'c']
+    assert queue.counts()[DONE] == 3 and worker.completed == 3
+
+
+def test_worker_gives_failed_jobs_back_for_retry(queue):
+    def process(record_id):
+        raise RuntimeError('recognizer down')
+
+    worker = Worker(queue, process, threads=1)
+    queue.enqueue('a')
+    assert worker.drain() == 1
+    job = queue.get(job_id('a'))
+    assert job['state'] == QUEUED and job['last_error'] == 'recognizer down' and worker.failed == 1
+
+
+def test_sweep_queues_old_unscored_recordings_once(queue, db):
+    recordings = RecordingRepository(db)
+    recordings.ensure_indexes()
+    old = datetime.now() - timedelta(hours=1)
+    unscored = recordings.insert({'user_id': 'alice', 'timestamp': old})
+    recordings.insert({'user_id': 'alice', 'timestamp': old, 'score': 50})
+    recordings.insert({'user_id': 'alice', 'timestamp': datetime.now()})
+
+    assert sweep(recordings, queue, grace=60) == 1
+    assert queue.get(job_id(unscored))['state'] == QUEUED
+    assert sweep(recordings, queue, grace=60) == 0  # Marked as queued, so not found again
+
+    index = recordings.collection.index_information()['unscored']
+    assert index['partialFilterExpression'] == {'score': None, 'queued_at': None}
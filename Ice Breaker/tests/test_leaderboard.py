@@ -0,0 +1,122 @@
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from leaderboard import GLOBAL_BOARD, Leaderboard, TopK
+from prompts import make_prompt_id
+
+
+# Function to build a leaderboard entry
+def entry(score, minutes=0, record_id=None, prompt_id='p1'):
+    return {'record_id': record_id or ObjectId(), 'user_id': 'alice', 'prompt_id': prompt_id, 'score': score,
+            'at': datetime(2024, 1, 1) + timedelta(minutes=minutes)}
+
+
+def scores(entries):
+    return [item['score'] for item in entries]
+
+
+def test_topk_keeps_the_best_entries_ranked():
+    board = TopK(size=3)
+    for score in (50, 20, 90, 70, 10):
+        board.offer(entry(score))
+    assert scores(board.ranked()) == [90, 70, 50]
+    assert not board.offer(entry(5))  # Too low to enter
+
+
+def test_topk_ties_rank_the_earlier_recording_first():
+    board = TopK(size=2)
+    late, early = entry(60, minutes=5), entry(60, minutes=1)
+    board.offer(late)
+    board.offer(early)
+    assert [item['record_id'] for item in board.ranked()] == [early['record_id'], late['record_id']]
+
+    # A later tie does not push out an earlier one
+    assert not board.offer(entry(60, minutes=9))
+
+
+def test_topk_rescored_entry_moves_instead_of_appearing_twice():
+    board = TopK(size=3)
+    rescored = entry(30)
+    for item in (rescored, entry(50), entry(40)):
+        board.offer(item)
+
+    board.offer(dict(rescored, score=80))
+    assert scores(board.ranked()) == [80, 50, 40]
+    assert not board.stale
+
+    # A lowered entry may leave a better recording off the board until a refresh
+    board.offer(dict(rescored, score=10))
+    assert scores(board.ranked()) == [50, 40, 10]
+    assert board.stale
+
+
+# Function to insert a scored recording and return it as it was before the save
+def add_recording(db, score, prompt_id='p1', minutes=0):
+    record = {'user_id': 'alice', 'prompt': f'Prompt {prompt_id}', 'prompt_id': prompt_id,
+              'timestamp': datetime(2024, 1, 1) + timedelta(minutes=minutes), 'score': score}
+    record['_id'] = db['recordings'].insert_one(dict(record)).inserted_id
+    return dict(record, score=None)
+
+
+def test_boards_are_built_from_recordings(db):
+    for i, (score, prompt_id) in enumerate([(50, 'p1'), (80, 'p2'), (65, 'p1'), (30, 'p2')]):
+        add_recording(db, score, prompt_id, minutes=i)
+    board = Leaderboard(db, db['recordings'], size=3)
+    board.warm()
+
+    assert scores(board.top()) == [80, 65, 50]
+    assert scores(board.top('p1')) == [65, 50]
+    assert scores(board.top(limit=1)) == [80]
+    assert board.top('unknown') == []
+
+    # Warming again reads the saved boards instead of the recordings
+    db['recordings'].delete_many({})
+    restored = Leaderboard(db, db['recordings'], size=3)
+    restored.warm()
+    assert scores(restored.top()) == [80, 65, 50]
+
+
+def test_rebuild_keeps_the_best_per_prompt_including_recordings_without_prompt_ids(db):
+    for i, score in enumerate((10, 40, 20, 30)):
+        add_recording(db, score, 'p1', minutes=i)
+    db['recordings'].insert_many([
+        {'user_id': 'bob', 'prompt': 'Old prompt', 'timestamp': datetime(2023, 1, 1), 'score': 35},
+        {'user_id': 'bob', 'prompt': 'Old prompt', 'timestamp': datetime(2023, 1, 2), 'score': 5},
+        {'user_id': 'bob', 'prompt': 'Old prompt', 'timestamp': datetime(2023, 1, 3), 'score': None}
+    ])
+    board = Leaderboard(db, db['recordings'], size=2)
+    board.rebuild()
+
+    assert scores(board.top('p1')) == [40, 30]
+    assert scores(board.top(make_prompt_id('Old prompt'))) == [35, 5]
+    assert scores(board.top()) == [40, 35]
+    assert db['leaderboards'].count_documents({}) == 3
+
+
+def test_lowered_score_refreshes_the_board_from_recordings_on_persist(db):
+    board = Leaderboard(db, db['recordings'], size=2)
+    records = [add_recording(db, score, minutes=i) for i, score in enumerate((90, 70, 60))]
+    board.warm()
+    assert scores(board.top()) == [90, 70]
+
+    db['recordings'].update_one({'_id': records[0]['_id']}, {'$set': {'score': 10}})
+    board.record(dict(records[0], score=90), 10)
+    board.persist()
+    assert scores(board.top()) == [70, 60]
+    assert scores(db['leaderboards'].find_one({'_id': GLOBAL_BOARD})['entries']) == [70, 60]
+
+
+def test_sync_takes_in_entries_other_processes_saved(db):
+    mine = Leaderboard(db, db['recordings'], size=3)
+    theirs = Leaderboard(db, db['recordings'], size=3)
+    mine.warm()
+    theirs.warm()
+
+    theirs.record(add_recording(db, 75), 75)
+    theirs.persist()
+    mine.record(add_recording(db, 55, minutes=1), 55)
+
+    mine.sync()
+    assert scores(mine.top()) == [75, 55]
+    assert scores(mine.top('p1')) == [75, 55]
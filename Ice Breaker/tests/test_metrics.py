@@ -0,0 +1,63 @@
+import time
+
+from metrics import Histogram, Registry, SlowRequestProfiler
+
+
+def test_counters_and_histograms_render_in_the_exposition_format():
+    registry = Registry()
+    requests = registry.counter('requests_total', 'Requests', ['endpoint'])
+    latency = registry.histogram('latency_seconds', 'Latency', buckets=(0.1, 1))
+    requests.inc(endpoint='/')
+    requests.inc(2, endpoint='/say "hi"')
+    latency.observe(0.05)
+    latency.observe(0.5)
+    latency.observe(5)
+
+    lines = registry.render().splitlines()
+    assert '# TYPE requests_total counter' in lines
+    assert 'requests_total{endpoint="/"} 1' in lines
+    assert 'requests_total{endpoint="/say \\"hi\\""} 2' in lines
+    assert 'latency_seconds_bucket{le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{le="1"} 2' in lines
+    assert 'latency_seconds_bucket{le="+Inf"} 3' in lines
+    assert 'latency_seconds_count 3' in lines
+    assert 'latency_seconds_sum 5.55' in lines
+
+
+def test_unlabelled_counter_reports_zero_before_its_first_increment():
+    registry = Registry()
+    registry.counter('chunks_total', 'Chunks')
+    assert 'chunks_total 0' in registry.render().splitlines()
+
+
+def test_timer_observes_the_block_duration():
+    histogram = Histogram('stage_seconds', 'Stages', ['stage'], buckets=(0.001, 10))
+    with histogram.time(stage='split'):
+        time.sleep(0.01)
+    lines = list(histogram.samples())
+    assert 'stage_seconds_bucket{stage="split",le="0.001"} 0' in lines
+    assert 'stage_seconds_bucket{stage="split",le="10"} 1' in lines
+
+
+def test_metrics_endpoint(client):
+    client.get('/get_ice_breaker')
+    body = client.get('/metrics').get_data(as_text=True)
+    assert '# TYPE icebreaker_request_seconds histogram' in body
+    assert 'endpoint="get_ice_breaker"' in body
+
+
+def test_slow_requests_are_profiled_and_fast_ones_dropped(tmp_path):
+    profiler = SlowRequestProfiler(threshold=0.05, directory=str(tmp_path), interval=0.005)
+
+    token = profiler.begin()
+    time.sleep(0.1)
+    path = profiler.end(token, 0.1, '/process_audio')
+    with open(path, encoding='utf-8') as f:
+        header, *stacks = f.read().splitlines()
+    assert header.startswith('# /process_audio took 0.100s')
+    assert any('test_metrics.py:test_slow_requests_are_profiled_and_fast_ones_dropped' in line for line in stacks)
+
+    token = profiler.begin()
+    time.sleep(0.02)
+    assert profiler.end(token, 0.01, '/fast') is None
+    assert len(list(tmp_path.iterdir())) == 1
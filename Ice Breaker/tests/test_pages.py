@@ -0,0 +1,41 @@
+import re
+from datetime import datetime
+
+from bson import ObjectId
+
+
+def test_home_page_is_revalidated_by_etag(client):
+    page = client.get('/')
+    assert page.status_code == 200
+    assert page.headers['Cache-Control'] == 'no-cache'
+    etag = page.headers['ETag']
+    assert client.get('/').headers['ETag'] == etag  # Rendered once, the same for everyone
+
+    revalidated = client.get('/', headers={'If-None-Match': etag})
+    assert revalidated.status_code == 304 and not revalidated.data
+
+
+def test_fingerprinted_assets_are_cached_for_good(client):
+    html = client.get('/').get_data(as_text=True)
+    script = re.search(r'src="(/static/js/home\.js\?v=[0-9a-f]+)"', html).group(1)
+
+    fingerprinted = client.get(script)
+    assert fingerprinted.status_code == 200
+    assert 'immutable' in fingerprinted.headers['Cache-Control']
+
+    for url in ('/static/js/home.js', '/static/js/home.js?v=stale'):
+        assert 'immutable' not in client.get(url).headers.get('Cache-Control', '')
+
+
+def test_details_page_escapes_what_users_said(client, app_module):
+    record_id = app_module.recordings.insert({
+        'user_id': 'alice', 'prompt': 'Favourite <b>tag</b>?', 'timestamp': datetime(2024, 1, 1),
+        'transcribed_text': '<script>alert(1)</script>', 'word_count': 1, 'similarity_percentage': 12.5,
+        'score': 40.0
+    })
+    html = client.get(f'/recording_details/{record_id}').get_data(as_text=True)
+    assert '&lt;script&gt;alert(1)&lt;/script&gt;' in html and '<script>alert' not in html
+    assert 'Favourite &lt;b&gt;tag&lt;/b&gt;?' in html
+    assert f'/play_audio/{record_id}' in html
+
+    assert client.get(f'/recording_details/{ObjectId()}').status_code == 404
@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from werkzeug.http import http_date
+
+from audio import synthetic_wav
+
+
+@pytest.fixture
+def recording(app_module):
+    wav = synthetic_wav(2)
+    record_id = app_module.save_audio_data_to_db(wav, 'test.wav', 'alice', 'Prompt')
+    return record_id, wav
+
+
+def play(client, record_id, **headers):
+    return client.get(f'/play_audio/{record_id}', headers=headers)
+
+
+def test_full_download(client, recording):
+    record_id, wav = recording
+    response = play(client, record_id)
+    assert response.status_code == 200
+    assert response.data == wav
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    assert response.headers['Content-Length'] == str(len(wav))
+    assert response.headers['ETag'] and response.headers['Last-Modified']
+
+
+@pytest.mark.parametrize('header, start, end', [
+    ('bytes=0-99', 0, 100),
+    ('bytes=100-', 100, None),
+    ('bytes=-50', -50, None)
+])
+def test_range_returns_partial_content(client, recording, header, start, end):
+    record_id, wav = recording
+    response = play(client, record_id, Range=header)
+    expected = wav[start:end]
+    assert response.status_code == 206
+    assert response.data == expected
+    assert response.headers['Content-Length'] == str(len(expected))
+    first = start % len(wav)
+    assert response.headers['Content-Range'] == f'bytes {first}-{first + len(expected) - 1}/{len(wav)}'
+
+
+def test_unsatisfiable_range(client, recording):
+    record_id, wav = recording
+    response = play(client, record_id, Range=f'bytes={len(wav) + 10}-')
+    assert response.status_code == 416
+    assert response.headers['Content-Range'] == f'bytes */{len(wav)}'
+
+
+def test_if_range_with_the_current_etag_honours_the_range(client, recording):
+    record_id, wav = recording
+    etag = play(client, record_id).headers['ETag']
+    response = play(client, record_id, Range='bytes=0-9', **{'If-Range': etag})
+    assert response.status_code == 206
+    assert response.data == wav[:10]
+
+
+def test_if_range_with_another_etag_sends_the_whole_file(client, recording):
+    record_id, wav = recording
+    response = play(client, record_id, Range='bytes=0-9', **{'If-Range': '"something-else"'})
+    assert response.status_code == 200
+    assert response.data == wav
+
+
+def test_if_range_with_a_date(client, recording):
+    record_id, wav = recording
+    last_modified = play(client, record_id).headers['Last-Modified']
+    response = play(client, record_id, Range='bytes=0-9', **{'If-Range': last_modified})
+    assert response.status_code == 206
+
+    earlier = http_date(datetime.now(timezone.utc) - timedelta(days=1))
+    response = play(client, record_id, Range='bytes=0-9', **{'If-Range': earlier})
+    assert response.status_code == 200
+    assert response.data == wav
+
+
+def test_conditional_get_returns_not_modified(client, recording):
+    record_id, _ = recording
+    first = play(client, record_id)
+    assert play(client, record_id, **{'If-None-Match': first.headers['ETag']}).status_code == 304
+    assert play(client, record_id, **{'If-Modified-Since': first.headers['Last-Modified']}).status_code == 304
+    assert play(client, record_id, **{'If-None-Match': '"other"'}).status_code == 200
+
+
+def test_unknown_recording(client):
+    assert play(client, '0' * 24).status_code == 404
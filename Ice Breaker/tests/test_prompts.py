@@ -0,0 +1,81 @@
+import json
+
+import numpy as np
+import pytest
+
+from prompts import ICE_BREAKER_QUESTIONS, PromptRegistry, load_prompts, make_prompt_id
+from similarity import TfidfEngine
+
+
+@pytest.fixture
+def registry():
+    return load_prompts(PromptRegistry(TfidfEngine()))
+
+
+def test_ids_are_stable_across_spacing_and_case():
+    assert make_prompt_id("Tell us  about your day") == make_prompt_id("tell us about your day ")
+    assert make_prompt_id("Tell us about your day") != make_prompt_id("Tell us about your week")
+
+
+def test_prompts_are_found_by_id_or_text(registry):
+    assert len(registry) == len(ICE_BREAKER_QUESTIONS)
+    prompt = registry.add(ICE_BREAKER_QUESTIONS[0])
+    assert registry.get(prompt.id) is prompt
+    assert registry.resolve(text=ICE_BREAKER_QUESTIONS[0].upper()) is prompt
+    assert registry.resolve(prompt.id, 'ignored') is prompt
+
+    unknown = registry.resolve(text='Something nobody registered')
+    assert unknown.id == make_prompt_id('Something nobody registered')
+    assert registry.get(unknown.id) is None
+
+
+def test_prompts_load_from_files_and_collections(tmp_path, db):
+    registry = PromptRegistry(TfidfEngine())
+    text_file = tmp_path / 'prompts.txt'
+    text_file.write_text("First prompt\n\nSecond prompt\n", encoding='utf-8')
+    jsonl_file = tmp_path / 'prompts.jsonl'
+    jsonl_file.write_text(json.dumps({'text': 'Third prompt', 'id': 'third', 'topics': ['cooking']}) + "\n",
+                          encoding='utf-8')
+    db.prompts.insert_one({'_id': 'fourth', 'text': 'Fourth prompt'})
+
+    registry.load_file(str(text_file))
+    registry.load_file(str(jsonl_file))
+    registry.load_collection(db.prompts)
+    assert [prompt.text for prompt in registry] == ['First prompt', 'Second prompt', 'Third prompt', 'Fourth prompt']
+    assert registry.get('third').topic_keywords == ['cook']
+    assert registry.get('fourth').text == 'Fourth prompt'
+
+
+def test_topic_keywords_come_from_the_prompt_vector(registry):
+    registry.prepare(index_dir='')
+    prompt = registry.add("Tell us about a hobby you're passionate about.")
+    assert set(prompt.topic_keywords) <= set(prompt.tokens)
+    assert prompt.topic_keywords
+
+
+def test_saved_index_is_memory_mapped_and_matches_the_fitted_vectors(registry, tmp_path):
+    registry.prepare(index_dir='')
+    fitted = {prompt.id: prompt.vector for prompt in registry}
+    registry.build_index(str(tmp_path))
+
+    loaded = load_prompts(PromptRegistry(TfidfEngine()))
+    loaded.prepare(index_dir=str(tmp_path))
+    for prompt in loaded:
+        vector = prompt.vector
+        assert isinstance(vector.values, np.memmap)
+        np.testing.assert_array_equal(vector.indices, fitted[prompt.id].indices)
+        np.testing.assert_allclose(vector.values, fitted[prompt.id].values)
+    assert loaded.engine_terms() == registry.engine_terms()
+
+
+def test_missing_or_stale_index_falls_back_to_fitting(registry, tmp_path):
+    registry.prepare(index_dir=str(tmp_path / 'nowhere'))
+    registry.prepare(index_dir=str(tmp_path))  # A directory without index.json
+    assert registry.engine.vocabulary
+
+    registry.build_index(str(tmp_path))
+    registry.add("A prompt added after the index was built")
+    registry.prepare(index_dir=str(tmp_path))
+    prompt = registry.resolve(text="A prompt added after the index was built")
+    assert not isinstance(prompt.vector.values, np.memmap)
+    assert prompt.vector.values.size
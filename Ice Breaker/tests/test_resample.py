@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from audio import decode_wav, encode_wav, resample, synthetic_speech
+from tests.signals import RATE, rms, tone
+
+
+# Function to find the strongest frequency in samples
+def peak_frequency(samples, sample_rate):
+    spectrum = np.abs(np.fft.rfft(samples * np.hanning(samples.size)))
+    return np.fft.rfftfreq(samples.size, 1 / sample_rate)[np.argmax(spectrum)]
+
+
+def test_resample_keeps_audio_at_the_same_rate():
+    samples = tone(440, 0.1, RATE)
+    assert resample(samples, RATE, RATE) is samples
+    assert resample(np.zeros(0, dtype=np.int16), 44100, RATE).size == 0
+
+
+@pytest.mark.parametrize('src_rate, dst_rate', [(44100, 16000), (48000, 16000), (8000, 16000), (22050, 16000)])
+def test_resample_preserves_in_band_tones(src_rate, dst_rate):
+    samples = tone(1000, 1, src_rate)
+    output = resample(samples, src_rate, dst_rate)
+
+    assert output.dtype == np.int16
+    assert output.size == -(-samples.size * dst_rate // src_rate)
+    assert abs(peak_frequency(output, dst_rate) - 1000) <= 2
+    # Away from the edges the level is unchanged
+    assert rms(output[1000:-1000]) == pytest.approx(rms(samples[1000:-1000]), rel=0.02)
+
+
+def test_resample_removes_tones_above_the_new_nyquist_frequency():
+    samples = tone(10000, 1, 44100)  # Above 8 kHz, so it would alias when downsampling to 16 kHz
+    output = resample(samples, 44100, RATE)
+    assert rms(output[1000:-1000]) < 0.02 * rms(samples)
+
+
+def test_resample_clips_instead_of_wrapping():
+    # A full-scale square wave overshoots next to every edge after filtering
+    t = np.arange(44100) / 44100
+    samples = np.where(np.sin(2 * np.pi * 50 * t) >= 0, 32767, -32768).astype(np.int16)
+    output = resample(samples, 44100, 48000)
+    assert output.max() == 32767 and output.min() == -32768
+
+    # Away from the edges every sample keeps the sign of the wave
+    t = np.arange(output.size) / 48000
+    phase = (t * 100) % 1
+    steady = (phase > 0.05) & (phase < 0.95)
+    expected = np.where(np.sin(2 * np.pi * 50 * t) >= 0, 1, -1)
+    assert np.array_equal(np.sign(output[steady]), expected[steady])
+
+
+def test_wav_round_trip():
+    samples = synthetic_speech(1, RATE)
+    decoded, sample_rate = decode_wav(encode_wav(samples, RATE))
+    assert sample_rate == RATE
+    assert np.array_equal(decoded, samples)
@@ -0,0 +1,54 @@
+import pytest
+
+from prompts import PromptRegistry, load_prompts
+from rescore import rescore
+from scoring import calculate_score
+
+
+@pytest.fixture
+def registry():
+    registry = load_prompts(PromptRegistry())
+    registry.prepare(None)
+    return registry
+
+
+# Function to insert transcribed recordings, each answering the same prompt with more words
+def add_recordings(db, registry, count):
+    prompt = next(iter(registry))
+    for i in range(count):
+        text = ' '.join([prompt.text] * (i + 1))
+        db['recordings'].insert_one({'prompt': prompt.text, 'prompt_id': prompt.id, 'transcribed_text': text})
+    return prompt
+
+
+def test_rescore_writes_scores_for_the_given_max_word_count(db, registry):
+    prompt = add_recordings(db, registry, 3)
+    assert rescore(db['recordings'], db['checkpoints'], registry, batch_size=2, workers=0, max_word_count=50) == 3
+
+    for record in db['recordings'].find():
+        text = record['transcribed_text']
+        assert record['score'] == calculate_score(len(text.split()), prompt, text, 50)[0]
+    assert db['checkpoints'].find_one({'_id': 'rescore'})['completed_at']
+
+
+def test_resumed_job_keeps_its_max_word_count(db, registry):
+    prompt = add_recordings(db, registry, 4)
+    # Interrupted after the first batch
+    rescore(db['recordings'], db['checkpoints'], registry, batch_size=2, workers=0, max_word_count=50, limit=2)
+    db['checkpoints'].update_one({'_id': 'rescore'}, {'$unset': {'completed_at': 1}})
+
+    assert rescore(db['recordings'], db['checkpoints'], registry, batch_size=2, workers=0, max_word_count=500) == 2
+    for record in db['recordings'].find():
+        text = record['transcribed_text']
+        assert record['score'] == calculate_score(len(text.split()), prompt, text, 50)[0]
+
+
+def test_restart_uses_the_new_max_word_count(db, registry):
+    prompt = add_recordings(db, registry, 2)
+    rescore(db['recordings'], db['checkpoints'], registry, workers=0, max_word_count=50, limit=1)
+    db['checkpoints'].update_one({'_id': 'rescore'}, {'$unset': {'completed_at': 1}})
+
+    assert rescore(db['recordings'], db['checkpoints'], registry, workers=0, max_word_count=500, restart=True) == 2
+    for record in db['recordings'].find():
+        text = record['transcribed_text']
+        assert record['score'] == calculate_score(len(text.split()), prompt, text, 500)[0]
@@ -0,0 +1,83 @@
+import pytest
+from bson import ObjectId
+
+from repository import RecordingRepository, ResultBatcher, new_recording
+from sessions import FAILED
+
+
+@pytest.fixture
+def repository(db):
+    return RecordingRepository(db)
+
+
+def insert(repository, user_id='alice'):
+    record = new_recording(user_id, 'Prompt', 'p1', {'length': 0})
+    record['_id'] = ObjectId(repository.insert(record))
+    return record
+
+
+def test_batch_is_written_once_full_and_reported(repository):
+    saved = []
+    batcher = ResultBatcher(repository, on_saved=lambda record, score: saved.append((record['_id'], score)),
+                            max_size=2, max_delay=60)
+    first, second = insert(repository), insert(repository)
+
+    batcher.add(first, 'one', 1, 10.0, 20.0)
+    assert batcher.pending() == 1 and not saved
+    batcher.add(second, 'two', 2, 30.0, 40.0)
+    assert batcher.pending() == 0
+    assert saved == [(first['_id'], 20.0), (second['_id'], 40.0)]
+    assert repository.collection.find_one({'_id': second['_id']})['transcribed_text'] == 'two'
+
+
+def test_failed_batch_is_kept_for_the_next_flush(repository, monkeypatch):
+    batcher = ResultBatcher(repository, max_size=10)
+    batcher.add(insert(repository), 'one', 1, 10.0, 20.0)
+
+    def fail(updates):
+        raise ConnectionError('primary stepped down')
+
+    monkeypatch.setattr(repository, 'save_scores', fail)
+    with pytest.raises(ConnectionError):
+        batcher.flush()
+    assert batcher.pending() == 1
+
+    monkeypatch.undo()
+    assert batcher.flush() == 1
+    assert repository.collection.count_documents({'score': 20.0}) == 1
+
+
+def test_batched_writes_cost_one_round_trip(repository):
+    records = [insert(repository) for _ in range(3)]
+    before = repository.writes.snapshot()
+    batcher = ResultBatcher(repository, max_size=3)
+    for record in records:
+        batcher.add(record, 'text', 1, 10.0, 20.0)
+
+    after = repository.writes.snapshot()
+    assert after['round_trips'] - before['round_trips'] == 1
+    assert after['results_saved'] - before['results_saved'] == 3
+
+
+def test_recording_inserted_with_its_score_counts_once(app_module):
+    results = {'transcribed_text': 'hello there', 'full_word_count': 2, 'similarity_percentage': 50.0, 'score': 30.0}
+    app_module.save_audio_data_to_db(b'RIFF', 'a.wav', 'alice', 'Prompt', prompt_id='p1', results=results)
+    stats = app_module.stats_rollup.users.find_one({'_id': 'alice'})
+    assert stats['count'] == 1 and stats['score_sum'] == 30.0
+
+
+def test_session_capture_is_stored_before_transcription(client, app_module, monkeypatch, tmp_path):
+    monkeypatch.setitem(app_module.app.config, 'UPLOAD_FOLDER', str(tmp_path))
+
+    def crash(*args, **kwargs):
+        assert app_module.recordings_collection.count_documents({}) == 1  # Already saved
+        raise RuntimeError('recognizer crashed')
+
+    monkeypatch.setattr(app_module, 'process_audio_file', crash)
+    session = client.post('/sessions', json={'user_id': 'alice'}).get_json()
+    client.get(session['events_url']).get_data()  # Ends when the session does
+
+    assert client.get(session['status_url']).get_json()['state'] == FAILED
+    record = app_module.recordings_collection.find_one()
+    assert record.get('score') is None
+    assert app_module.job_queue.collection.count_documents({'record_id': str(record['_id'])}) == 1
@@ -0,0 +1,63 @@
+import pytest
+
+import scoring
+from scoring import RunningScore, calculate_score
+from similarity import SequenceEngine, TfidfEngine
+
+PROMPT = "Tell us about a hobby you enjoy and why it matters to you"
+CHUNKS = [
+    "i really enjoy painting",
+    "because painting helps me relax and learn new skills",
+    "my friends enjoy painting too and we paint every weekend",
+    "the weather was nice on saturday"
+]
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    engine = TfidfEngine([PROMPT, "Describe a book that changed how you think", "What is the best advice you were given"])
+    monkeypatch.setattr(scoring, 'get_engine', lambda: engine)
+    return engine
+
+
+def final_score(chunks):
+    transcript = " ".join(chunks)
+    return calculate_score(len(transcript.split()), PROMPT, transcript)
+
+
+def test_tracks_the_final_score_after_every_chunk(engine):
+    running = RunningScore(PROMPT)
+    for count, chunk in enumerate(CHUNKS, 1):
+        score, similarity = running.add(chunk)
+        expected_score, expected_similarity = final_score(CHUNKS[:count])
+        assert score == pytest.approx(expected_score, abs=0.01)
+        assert similarity == pytest.approx(expected_similarity, abs=0.01)
+    assert running.word_count == len(" ".join(CHUNKS).split())
+
+
+def test_chunk_order_does_not_change_the_result(engine):
+    running = RunningScore(PROMPT)
+    for index in (2, 0, 3, 1):
+        running.add(CHUNKS[index], index)
+    expected_score, expected_similarity = final_score(CHUNKS)
+    assert running.score() == pytest.approx((expected_score, expected_similarity), abs=0.01)
+
+
+def test_unseen_words_lower_the_similarity(engine):
+    running = RunningScore(PROMPT)
+    _, on_topic = running.add("i enjoy my hobby")
+    _, drifting = running.add("stock markets and interest rates")
+    assert 0 < drifting < on_topic
+
+
+def test_empty_transcript_scores_zero(engine):
+    assert RunningScore(PROMPT).score() == (0, 0)
+
+
+def test_other_engines_compare_the_joined_transcript(monkeypatch):
+    engine = SequenceEngine()
+    monkeypatch.setattr(scoring, 'get_engine', lambda: engine)
+    running = RunningScore(PROMPT)
+    running.add(CHUNKS[1], 1)
+    running.add(CHUNKS[0], 0)
+    assert running.score() == final_score(CHUNKS[:2])
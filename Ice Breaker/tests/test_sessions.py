@@ -0,0 +1,133 @@
+import sys
+import threading
+import time
+import types
+
+import numpy as np
+import pytest
+
+from sessions import COMPLETED, FAILED, QUEUED, RECEIVING, SessionManager
+
+
+@pytest.fixture
+def manager():
+    return SessionManager(lambda manager, session: {'prompt': session.prompt}, max_workers=2)
+
+
+# Function to split server-sent-event frames into (id, event, data) tuples, skipping keepalives
+def parse_events(frames):
+    events = []
+    for frame in frames:
+        if frame.startswith(':'):
+            continue
+        fields = dict(line.split(': ', 1) for line in frame.strip().split('\n'))
+        events.append((int(fields['id']), fields['event'], fields['data']))
+    return events
+
+
+def test_submitted_session_runs_in_the_background(manager):
+    session = manager.submit('alice', 'Prompt')
+    assert session.state in (QUEUED, COMPLETED)
+    assert manager.wait(session, timeout=5)
+    assert session.state == COMPLETED and session.result == {'prompt': 'Prompt'}
+    assert manager.get(session.id) is session
+
+
+def test_failed_job_marks_the_session_failed(manager):
+    def job(manager, session):
+        raise RuntimeError('microphone unplugged')
+
+    session = manager.create('alice', 'Prompt')
+    manager.schedule(session, job)
+    assert manager.wait(session, timeout=5)
+    assert session.state == FAILED and session.error == 'microphone unplugged'
+
+
+def test_wait_gives_up_after_its_timeout(manager):
+    release = threading.Event()
+    session = manager.create('alice', 'Prompt')
+    manager.schedule(session, lambda manager, session: release.wait(5))
+    assert not manager.wait(session, timeout=0.05)
+    release.set()
+    assert manager.wait(session, timeout=5)
+
+
+def test_transition_only_moves_from_the_expected_state(manager):
+    session = manager.create('alice', 'Prompt', source='browser')
+    assert session.state == RECEIVING
+    assert manager.transition(session, RECEIVING, 'processing')
+    assert not manager.transition(session, RECEIVING, 'processing')
+
+
+def test_event_stream_replays_after_last_event_id_and_ends_when_finished(manager):
+    session = manager.create('alice', 'Prompt', source='browser')
+    manager.publish(session, 'partial', {'index': 0, 'text': 'hello'})
+    manager.schedule(session, lambda manager, session: 'done')
+    manager.wait(session, timeout=5)
+
+    events = parse_events(manager.stream(session))
+    assert [event for _, event, _ in events] == ['state', 'partial', 'completed']
+    assert [event_id for event_id, _, _ in events] == [1, 2, 3]
+
+    replayed = parse_events(manager.stream(session, last_event_id=2))
+    assert [event for _, event, _ in replayed] == ['completed']
+
+
+def test_event_stream_sends_keepalives_while_idle(manager):
+    session = manager.create('alice', 'Prompt', source='browser')
+    frames = manager.stream(session, keepalive=0.01)
+    assert next(frames).startswith('id: 1')
+    assert next(frames) == ': keepalive\n\n'
+
+
+def test_finished_and_abandoned_sessions_expire(manager):
+    manager = SessionManager(lambda manager, session: None, ttl=0)
+    finished = manager.submit('alice', 'Prompt')
+    manager.wait(finished, timeout=5)
+    abandoned = manager.create('alice', 'Prompt', source='browser')
+    time.sleep(0.01)
+
+    manager.create('bob', 'Prompt')  # Creating a session prunes expired ones
+    assert manager.get(finished.id) is None
+    assert manager.get(abandoned.id) is None
+
+
+def test_server_session_through_the_api(client, app_module, monkeypatch, tmp_path):
+    monkeypatch.setitem(app_module.app.config, 'UPLOAD_FOLDER', str(tmp_path))
+    created = client.post('/sessions', json={'user_id': 'alice'})
+    assert created.status_code == 202
+    session = created.get_json()
+
+    # The events stream ends once the session finishes
+    body = client.get(session['events_url']).get_data(as_text=True)
+    assert 'event: completed' in body
+
+    status = client.get(session['status_url']).get_json()
+    assert status['state'] == COMPLETED
+    assert status['result']['record_id']
+    assert client.get('/sessions/unknown').status_code == 404
+    assert client.post('/sessions', json={'source': 'carrier-pigeon'}).status_code == 400
+
+
+def test_microphone_captures_take_turns(app_module, monkeypatch):
+    recording = []
+    overlapped = []
+
+    def rec(frames, samplerate, channels, dtype):
+        if recording:
+            overlapped.append(True)  # sounddevice would stop the capture already running
+        recording.append(True)
+        return np.zeros((frames, channels), dtype=dtype)
+
+    def wait():
+        time.sleep(0.05)
+        recording.pop()
+
+    monkeypatch.setitem(sys.modules, 'sounddevice', types.SimpleNamespace(rec=rec, wait=wait))
+    monkeypatch.setattr(app_module, 'AUDIO_SOURCE', 'microphone')
+    threads = [threading.Thread(target=app_module.capture_audio, args=(0.01,)) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert not overlapped
@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+from similarity import PromptVectorCache, SequenceEngine, TfidfEngine, stem, tokenize
+
+PROMPTS = [
+    "Tell us about a hobby you enjoy",
+    "Describe a book that changed how you think",
+    "What is the best advice you were given"
+]
+
+
+@pytest.fixture
+def engine():
+    return TfidfEngine(PROMPTS)
+
+
+def test_tokens_are_stemmed_content_words():
+    assert tokenize("I'm enjoying my hobbies") == tokenize("enjoy hobby")
+    assert stem('books') == stem('book') == 'book'
+
+
+def test_vectors_are_sparse_and_normalized(engine):
+    vector = engine.vectorize("books books and more books about hobbies")
+    assert np.all(np.diff(vector.indices) > 0)
+    assert float(np.dot(vector.values, vector.values)) == pytest.approx(1, abs=1e-5)
+
+
+def test_similar_transcripts_score_higher(engine):
+    prompt = engine.prompt_vector(PROMPTS[1])
+    on_topic = engine.similarity(prompt, engine.vectorize("a book changed how i think about people"))
+    off_topic = engine.similarity(prompt, engine.vectorize("my favourite hobby is hiking"))
+    assert on_topic > off_topic >= 0
+    assert engine.similarity(prompt, engine.vectorize(PROMPTS[1])) == pytest.approx(1, abs=1e-5)
+
+
+def test_unseen_words_match_each_other_and_count_towards_the_norm(engine):
+    prompt = engine.prompt_vector("Tell us about skateboarding", registered=False)
+    assert engine.similarity(prompt, engine.vectorize("skateboarding")) == pytest.approx(1, abs=1e-5)
+    assert engine.similarity(engine.vectorize("hobby"), engine.vectorize("hobby volcanoes")) < 1
+
+
+def test_batch_matches_one_at_a_time(engine):
+    texts = ["i enjoy my hobby", "a book about advice", "", "volcanoes erupt"]
+    vectors = [engine.prompt_vector(prompt) for prompt in PROMPTS] + [engine.prompt_vector("Tell us about volcanoes")]
+    batch = engine.similarity_batch(vectors, texts)
+    single = [engine.similarity(vector, engine.vectorize(text)) for vector, text in zip(vectors, texts)]
+    assert batch == pytest.approx(single, abs=1e-6)
+
+
+def test_registered_prompts_are_vectorized_once():
+    calls = []
+    cache = PromptVectorCache(max_ad_hoc=2)
+
+    def vectorize(text):
+        calls.append(text)
+        return text.upper()
+
+    cache.get('registered', vectorize, registered=True)
+    for text in ('one', 'two', 'three'):
+        cache.get(text, vectorize)
+    cache.get('registered', vectorize)
+    assert calls == ['registered', 'one', 'two', 'three']
+    assert len(cache) == 3  # The oldest ad hoc prompt was evicted
+
+
+def test_ad_hoc_prompts_are_evicted_least_recently_used_first():
+    cache = PromptVectorCache(max_ad_hoc=2)
+    cache.get('one', str.upper)
+    cache.get('two', str.upper)
+    cache.get('one', str.upper)
+    cache.get('three', str.upper)
+
+    calls = []
+    cache.get('one', lambda text: calls.append(text))
+    cache.get('two', lambda text: calls.append(text) or text)
+    assert calls == ['two']
+
+
+def test_sequence_engine_keeps_the_original_ratio():
+    engine = SequenceEngine()
+    assert engine.similarity(engine.prompt_vector("Hello"), engine.vectorize("hello")) == 1
@@ -0,0 +1,107 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from audio import synthetic_wav
+from stats import StatsRollup
+
+
+@pytest.fixture
+def rollup(db):
+    return StatsRollup(db, db['recordings'])
+
+
+# Function to insert an unscored recording and return it as the rollups see it before a save
+def add_recording(db, user_id, prompt_id, minutes=0):
+    record = {'user_id': user_id, 'prompt': f'Prompt {prompt_id}', 'prompt_id': prompt_id,
+              'timestamp': datetime(2024, 1, 1) + timedelta(minutes=minutes)}
+    record['_id'] = db['recordings'].insert_one(dict(record)).inserted_id
+    return record
+
+
+# Function to store a score the way the app does: update the recording, then fold it into the rollups
+def save_score(db, rollup, record_id, score):
+    previous = db['recordings'].find_one_and_update({'_id': record_id}, {'$set': {'score': score}})
+    rollup.record(previous, score)
+
+
+# Function to read every user and prompt summary, per-prompt lists in a fixed order
+def summaries(rollup):
+    users = {}
+    for user_id in ('alice', 'bob'):
+        summary = rollup.user_summary(user_id)
+        summary['prompts'].sort(key=lambda prompt: prompt['prompt_id'])
+        users[user_id] = summary
+    return users, {prompt_id: rollup.prompt_summary(prompt_id) for prompt_id in ('p1', 'p2')}
+
+
+def test_new_scores_are_counted(db, rollup):
+    first = add_recording(db, 'alice', 'p1')
+    second = add_recording(db, 'alice', 'p2', minutes=1)
+    save_score(db, rollup, first['_id'], 40)
+    save_score(db, rollup, second['_id'], 70)
+
+    summary = rollup.user_summary('alice')
+    assert summary['count'] == 2
+    assert summary['average_score'] == 55
+    assert summary['best_score'] == 70
+    assert summary['recent_scores'] == [40, 70]
+    assert summary['trend'] == 30
+    assert {p['prompt_id']: p['best_score'] for p in summary['prompts']} == {'p1': 40, 'p2': 70}
+    assert rollup.prompt_summary('p2') == {'count': 1, 'average_score': 70, 'best_score': 70,
+                                           'prompt_id': 'p2', 'prompt': 'Prompt p2'}
+
+
+def test_rescoring_applies_the_difference(db, rollup):
+    record = add_recording(db, 'alice', 'p1')
+    save_score(db, rollup, record['_id'], 40)
+    save_score(db, rollup, record['_id'], 60)
+
+    summary = rollup.user_summary('alice')
+    assert (summary['count'], summary['average_score'], summary['best_score']) == (1, 60, 60)
+    assert summary['recent_scores'] == [60]
+    assert rollup.prompt_summary('p1')['count'] == 1
+
+
+def test_lowered_best_score_is_recomputed(db, rollup):
+    best = add_recording(db, 'alice', 'p1')
+    other = add_recording(db, 'alice', 'p1', minutes=1)
+    save_score(db, rollup, best['_id'], 90)
+    save_score(db, rollup, other['_id'], 50)
+
+    # $max cannot lower the best score, so it is looked up again from recordings
+    save_score(db, rollup, best['_id'], 30)
+    summary = rollup.user_summary('alice')
+    assert summary['best_score'] == 50
+    assert summary['average_score'] == 40
+    assert summary['prompts'][0]['best_score'] == 50
+    assert rollup.prompt_summary('p1')['best_score'] == 50
+
+
+def test_rebuild_matches_incremental_rollups(db, rollup):
+    for i, (user_id, prompt_id, score) in enumerate([('alice', 'p1', 40), ('alice', 'p2', 80), ('bob', 'p1', 65)]):
+        save_score(db, rollup, add_recording(db, user_id, prompt_id, minutes=i)['_id'], score)
+    save_score(db, rollup, db['recordings'].find_one({'user_id': 'alice', 'prompt_id': 'p2'})['_id'], 20)
+    incremental = summaries(rollup)
+
+    assert rollup.rebuild() == (2, 2)
+    assert summaries(rollup) == incremental
+
+
+def test_unknown_user_has_empty_summary(rollup):
+    summary = rollup.user_summary('nobody')
+    assert (summary['count'], summary['average_score'], summary['best_score']) == (0, None, None)
+    assert summary['recent_scores'] == [] and summary['trend'] is None
+
+
+def test_reprocessing_a_recording_through_the_app_counts_it_once(app_module, client):
+    prompt = app_module.prompt_registry.random()
+    record_id = app_module.save_audio_data_to_db(synthetic_wav(4), 'test.wav', 'alice', prompt.text,
+                                                 prompt_id=prompt.id)
+    for _ in range(2):
+        response = client.post('/process_audio', json={'record_id': record_id})
+        assert response.status_code == 200
+
+    stats = client.get('/stats', query_string={'user_id': 'alice'}).get_json()
+    assert stats['count'] == 1
+    assert stats['best_score'] == response.get_json()['score']
@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+from audio import decode_wav, synthetic_speech
+from tests.signals import RATE, layout
+from transcription import StreamingTranscriber
+
+
+# Function to cut int16 samples into one-second PCM blocks, like home.js uploads them
+def blocks(samples, seconds=1):
+    size = int(RATE * seconds)
+    return [samples[i:i + size].astype('<i2').tobytes() for i in range(0, samples.size, size)]
+
+
+def recognize(audio_data):
+    return f"{len(audio_data.frame_data) // 2 / audio_data.sample_rate:.1f}s"
+
+
+def test_chunks_are_sent_while_audio_is_still_arriving():
+    samples = layout(('speech', 4), ('pause', 1), ('speech', 4), ('pause', 1), ('speech', 2))
+    recognized = []
+    stream = StreamingTranscriber(recognize, RATE, chunk_length=4,
+                                  on_chunk=lambda index, text: recognized.append(index))
+    for block in blocks(samples)[:-1]:
+        stream.feed(block)
+    assert stream._submitted  # Chunks cut at the first pauses before the stream ends
+
+    stream.feed(blocks(samples)[-1])
+    texts = stream.finish()
+    assert len(texts) >= 3
+    assert sorted(recognized) == list(range(len(texts)))
+    assert stream.pcm() == samples.astype('<i2').tobytes()
+
+
+def test_blocks_are_reordered_and_repeats_ignored():
+    samples = synthetic_speech(3, RATE)
+    first, second, third = blocks(samples)
+    stream = StreamingTranscriber(recognize, RATE)
+    assert stream.feed(second, seq=1)
+    assert stream.feed(first, seq=0)
+    assert not stream.feed(first, seq=0)
+    assert stream.feed(third, seq=2)
+    stream.finish()
+    assert stream.pcm() == samples.astype('<i2').tobytes()
+    assert stream.seconds == pytest.approx(3)
+
+
+def test_stream_refuses_audio_past_its_limit_or_after_finishing():
+    stream = StreamingTranscriber(recognize, RATE, max_seconds=1)
+    stream.feed(np.zeros(RATE, dtype='<i2').tobytes())
+    with pytest.raises(ValueError):
+        stream.feed(np.zeros(10, dtype='<i2').tobytes())
+    stream.finish()
+    with pytest.raises(RuntimeError):
+        stream.feed(b'')
+
+
+def test_browser_session_is_scored_from_the_uploaded_blocks(client):
+    session = client.post('/sessions', json={'user_id': 'alice', 'source': 'browser'}).get_json()
+    assert session['sample_rate'] == RATE
+    headers = {'X-Sample-Rate': str(session['sample_rate'])}
+    samples = synthetic_speech(3, RATE)
+
+    for seq, block in enumerate(blocks(samples)):
+        accepted = client.post(f"{session['audio_url']}?seq={seq}", data=block, headers=headers)
+        assert accepted.get_json()['accepted']
+    assert client.post(session['finish_url']).status_code == 202
+    assert client.post(session['finish_url']).status_code == 409
+
+    assert 'event: completed' in client.get(session['events_url']).get_data(as_text=True)
+    result = client.get(session['status_url']).get_json()['result']
+    assert result['transcribed_text'] and result['word_count'] > 0
+    saved = client.get(f"/play_audio/{result['record_id']}")
+    assert decode_wav(saved.data)[0].tobytes() == samples.astype('<i2').tobytes()
+
+
+def test_upload_at_another_sample_rate_is_refused(client):
+    session = client.post('/sessions', json={'user_id': 'alice', 'source': 'browser'}).get_json()
+    block = np.zeros(44100, dtype='<i2').tobytes()
+    response = client.post(session['audio_url'], data=block, headers={'X-Sample-Rate': '44100'})
+    assert response.status_code == 400
+    assert client.get(session['status_url']).get_json()['state'] == 'receiving'
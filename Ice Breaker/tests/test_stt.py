@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+import stt
+from audio import to_audio_data
+from stt import StubBackend, VoskBackend
+
+RATE = 16000
+
+
+def speech(seconds, seed=0):
+    rng = np.random.default_rng(seed)
+    return (rng.standard_normal(int(RATE * seconds)) * 4000).astype(np.int16)
+
+
+def test_stub_is_deterministic_and_scales_with_duration():
+    backend = StubBackend(words_per_second=2)
+    audio = to_audio_data(speech(3), RATE)
+    text = backend.recognize(audio)
+    assert text == backend.recognize(audio)
+    assert len(text.split()) == 6
+    assert set(text.split()) <= set(StubBackend.VOCABULARY)
+    assert backend.recognize(to_audio_data(speech(3, seed=1), RATE)) != text
+
+
+def test_stub_hears_nothing_in_silence():
+    assert StubBackend().recognize(to_audio_data(np.zeros(RATE, dtype=np.int16), RATE)) == ""
+
+
+def test_vosk_explains_a_missing_model(tmp_path):
+    pytest.importorskip('vosk')
+    with pytest.raises(RuntimeError, match='VOSK_MODEL_PATH'):
+        VoskBackend(str(tmp_path / 'missing'))
+
+
+def test_backend_is_created_once(monkeypatch):
+    monkeypatch.setattr(stt, '_backend', None)
+    monkeypatch.setattr(stt, 'STT_BACKEND', 'stub')
+    assert isinstance(stt.get_backend(), StubBackend)
+    assert stt.get_backend() is stt.get_backend()
+
+
+def test_unknown_backend_is_refused(monkeypatch):
+    monkeypatch.setattr(stt, '_backend', None)
+    monkeypatch.setattr(stt, 'STT_BACKEND', 'parrot')
+    with pytest.raises(ValueError, match='parrot'):
+        stt.get_backend()
@@ -0,0 +1,167 @@
+import threading
+import time
+
+from transcript_cache import DiskTier, MemoryTier, MongoTier, TranscriptCache, entry_size, recording_key
+
+
+class FakeBackend:
+    name = 'stub'
+    model_version = '1'
+
+
+def test_memory_tier_evicts_least_recently_used_by_size():
+    tier = MemoryTier(max_bytes=entry_size('a', 'x' * 10) * 2)
+    tier.put('a', 'x' * 10)
+    tier.put('b', 'y' * 10)
+    assert tier.get('a') == 'x' * 10  # a is now the most recently used
+    tier.put('c', 'z' * 10)
+
+    assert tier.get('b') is None
+    assert tier.get('a') and tier.get('c')
+    assert tier.size <= tier.max_bytes
+
+
+def test_mongo_tier_evicts_oldest_entries(db):
+    tier = MongoTier(db['transcript_cache'], max_bytes=entry_size('k0', 'text') * 3)
+    for i in range(5):
+        tier.put(f'k{i}', 'text')
+        time.sleep(0.002)  # Distinct last_used times
+
+    assert tier.get('k0') is None and tier.get('k1') is None
+    assert [tier.get(f'k{i}') for i in range(2, 5)] == ['text'] * 3
+    assert tier.size == db['transcript_cache'].count_documents({}) * entry_size('k0', 'text')
+
+
+def test_disk_tier_round_trip_and_eviction(tmp_path):
+    tier = DiskTier(str(tmp_path), max_bytes=10)
+    tier.put('a', 'hello')
+    assert tier.get('a') == 'hello'
+    assert tier.get('missing') is None
+
+    time.sleep(0.01)
+    tier.put('b', 'world!')  # Over budget: the older entry goes
+    assert tier.get('a') is None and tier.get('b') == 'world!'
+
+    # A new tier over the same directory picks up what is stored
+    assert DiskTier(str(tmp_path), max_bytes=10).get('b') == 'world!'
+
+
+def test_persistent_hits_are_promoted_to_memory(db):
+    persistent = MongoTier(db['transcript_cache'])
+    persistent.put('key', 'remembered')
+    cache = TranscriptCache(persistent)
+
+    assert cache.memory.get('key') is None
+    assert cache.get('key') == 'remembered'
+    assert cache.memory.get('key') == 'remembered'
+    assert cache.get('other') is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_empty_transcript_is_cached():
+    cache = TranscriptCache()
+    calls = []
+    for _ in range(2):
+        assert cache.get_or_compute('silence', lambda: calls.append(1) or '') == ''
+    assert len(calls) == 1
+
+
+def test_concurrent_requests_share_one_computation():
+    cache = TranscriptCache()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 'transcript'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute('key', compute)))
+               for _ in range(4)]
+    threads[0].start()
+    started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    time.sleep(0.05)  # Let the others find the computation in flight
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert results == ['transcript'] * 4
+    assert len(calls) == 1
+
+
+def test_failures_reach_every_waiter_and_are_not_cached():
+    cache = TranscriptCache()
+    started = threading.Event()
+    release = threading.Event()
+
+    def compute():
+        started.set()
+        release.wait(5)
+        raise RuntimeError('recognizer down')
+
+    errors = []
+
+    def request():
+        try:
+            cache.get_or_compute('key', compute)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    owner = threading.Thread(target=request)
+    owner.start()
+    started.wait(5)
+    waiter = threading.Thread(target=request)
+    waiter.start()
+    time.sleep(0.05)
+    release.set()
+    owner.join(5)
+    waiter.join(5)
+
+    assert errors == ['recognizer down'] * 2
+    assert cache.get('key') is None
+    assert cache.get_or_compute('key', lambda: 'retried') == 'retried'
+
+
+class BrokenTier:
+    def get(self, key):
+        return None
+
+    def put(self, key, text):
+        raise OSError('disk full')
+
+
+def test_failed_persistent_write_still_returns_the_transcript():
+    cache = TranscriptCache(BrokenTier())
+    started = threading.Event()
+    release = threading.Event()
+
+    def compute():
+        started.set()
+        release.wait(5)
+        return 'transcript'
+
+    results = []
+    owner = threading.Thread(target=lambda: results.append(cache.get_or_compute('key', compute)))
+    owner.start()
+    started.wait(5)
+    waiter = threading.Thread(target=lambda: results.append(cache.get_or_compute('key', compute)))
+    waiter.start()
+    time.sleep(0.05)
+    release.set()
+    owner.join(5)
+    waiter.join(5)
+
+    assert results == ['transcript'] * 2
+    assert cache.get('key') == 'transcript'  # Still cached in memory
+
+
+def test_recording_key_changes_with_processing_settings():
+    backend = FakeBackend()
+    assert recording_key('abc', backend, 16000, 120) == recording_key('abc', backend, 16000, 120)
+    assert recording_key('abc', backend, 16000, 120) != recording_key('abc', backend, 16000, 60)
+    assert recording_key('abc', backend, 16000, 120) != recording_key('abd', backend, 16000, 120)
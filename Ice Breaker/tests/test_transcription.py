@@ -0,0 +1,72 @@
+import threading
+
+import pytest
+
+import transcription
+from transcription import IncompleteTranscript, collect_transcripts, submit_chunk, transcribe_chunks, transcribe_with_retry
+
+
+class Flaky:
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = 0
+
+    def __call__(self, chunk):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise ConnectionError('try again')
+        return chunk.upper()
+
+
+def test_retries_until_the_recognizer_answers():
+    recognize = Flaky(failures=2)
+    assert transcribe_with_retry(recognize, 'hello', max_retries=2, backoff=0) == 'HELLO'
+    assert recognize.calls == 3
+
+
+def test_gives_up_after_the_last_retry():
+    recognize = Flaky(failures=5)
+    with pytest.raises(ConnectionError):
+        transcribe_with_retry(recognize, 'hello', max_retries=1, backoff=0)
+    assert recognize.calls == 2
+
+
+def test_only_retryable_errors_are_retried():
+    recognize = Flaky(failures=1)
+    with pytest.raises(ConnectionError):
+        transcribe_with_retry(recognize, 'hello', retry_on=(TimeoutError,), backoff=0)
+    assert recognize.calls == 1
+
+
+def test_chunks_come_back_in_order():
+    reported = {}
+    texts = transcribe_chunks(['a', 'b', 'c'], str.upper, backoff=0,
+                              on_chunk=lambda index, text: reported.__setitem__(index, text))
+    assert texts == ['A', 'B', 'C']
+    assert reported == {0: 'A', 1: 'B', 2: 'C'}
+
+
+def test_failed_chunks_are_reported_with_what_was_recognized():
+    def recognize(chunk):
+        if chunk == 'b':
+            raise ConnectionError('down')
+        return chunk.upper()
+
+    with pytest.raises(IncompleteTranscript) as raised:
+        transcribe_chunks(['a', 'b', 'c'], recognize, max_retries=0, backoff=0)
+    assert raised.value.texts == ['A', '', 'C']
+    assert raised.value.failed == [1]
+
+
+def test_a_hung_call_holds_its_worker_until_it_returns():
+    release = threading.Event()
+    before = transcription.backlog()
+    submitted = [submit_chunk(lambda chunk: release.wait(5) and chunk, 'a', max_retries=0, backoff=0)]
+
+    with pytest.raises(IncompleteTranscript):
+        collect_transcripts(submitted, timeout=0.05, max_retries=0, backoff=0)
+    assert transcription.backlog() == before + 1
+
+    release.set()
+    submitted[0][1].result(5)
+    assert transcription.backlog() == before
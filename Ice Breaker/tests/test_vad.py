@@ -0,0 +1,46 @@
+from audio import VAD_FRAME_MS, find_pause, split_on_silence, trim_silence
+from tests.signals import RATE, layout, rms
+
+
+def test_silence_has_no_chunks():
+    silence = layout(('pause', 3))
+    assert split_on_silence(silence, RATE, 2) == []
+    assert trim_silence(silence, RATE) is None
+
+
+def test_leading_and_trailing_silence_is_trimmed():
+    samples = layout(('pause', 1), ('speech', 2), ('pause', 1))
+    trimmed = trim_silence(samples, RATE)
+    # The speech plus up to the hangover on each side
+    assert 2 * RATE <= trimmed.size <= 2.7 * RATE
+
+
+def test_chunks_are_cut_in_pauses():
+    samples = layout(('pause', 0.5), ('speech', 3), ('pause', 0.8), ('speech', 3), ('pause', 0.8), ('speech', 3),
+                     ('pause', 0.5))
+    chunks = split_on_silence(samples, RATE, 4)
+
+    assert len(chunks) == 3
+    frame = RATE * VAD_FRAME_MS // 1000
+    for chunk in chunks:
+        assert chunk.size <= 5 * RATE  # Target plus the search window
+        # Every chunk starts and ends in a pause, not mid-word
+        assert rms(chunk[:frame]) < 100 and rms(chunk[-frame:]) < 100
+        assert rms(chunk) > 1000
+
+
+def test_speech_without_pauses_is_cut_near_the_target():
+    # The lead-in gives the VAD a noise floor; the speech then never pauses
+    samples = layout(('pause', 1.5), ('speech', 10))
+    chunks = split_on_silence(samples, RATE, 3)
+    assert 10 * RATE <= sum(chunk.size for chunk in chunks) <= 10.3 * RATE
+    assert all(chunk.size <= 3.75 * RATE for chunk in chunks)
+    assert len(chunks) >= 3
+
+
+def test_find_pause_waits_for_audio_past_the_target():
+    samples = layout(('speech', 2.5), ('pause', 0.8), ('speech', 2))
+    assert find_pause(samples[:int(2.5 * RATE)], RATE, 3) is None
+
+    cut = find_pause(samples, RATE, 3)
+    assert 2.5 * RATE <= cut <= 3.3 * RATE  # Inside the pause
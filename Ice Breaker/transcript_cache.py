@@ -0,0 +1,234 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import datetime
+
+import pymongo
+
+logger = logging.getLogger(__name__)
+
+# Transcript cache settings
+TRANSCRIPT_CACHE = os.getenv('TRANSCRIPT_CACHE', 'mongo')  # mongo, disk, memory (in-process only) or off
+TRANSCRIPT_CACHE_DIR = os.getenv('TRANSCRIPT_CACHE_DIR', 'transcript_cache')  # Used by the disk tier
+TRANSCRIPT_CACHE_MEMORY_BYTES = int(os.getenv('TRANSCRIPT_CACHE_MEMORY_BYTES', str(8 * 1024 * 1024)))  # In-process LRU budget
+TRANSCRIPT_CACHE_MAX_BYTES = int(os.getenv('TRANSCRIPT_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))  # Persistent tier budget
+EVICTION_BATCH = 100  # Persistent entries removed per eviction pass
+
+# Transcripts are cached under a hash of the audio plus the backend's name and
+# model version, so switching recognizers or models never serves stale text.
+# Only successful recognitions are cached; "" for silence is a valid result.
+
+
+# Function to build a cache key for a recognizer input (an sr.AudioData)
+def chunk_key(audio_data, backend):
+    digest = hashlib.sha256(audio_data.frame_data)
+    digest.update(f":{audio_data.sample_rate}:{audio_data.sample_width}".encode())
+    return f"chunk:{digest.hexdigest()}:{backend.name}:{backend.model_version}"
+
+
+# Function to build a cache key for a whole recording's transcript.
+# params are the processing settings that change how the audio is chunked.
+def recording_key(content_hash, backend, *params):
+    settings = ":".join(str(param) for param in params)
+    return f"recording:{content_hash}:{settings}:{backend.name}:{backend.model_version}"
+
+
+# In-process LRU of transcripts, evicted by total text size
+class MemoryTier:
+    def __init__(self, max_bytes=TRANSCRIPT_CACHE_MEMORY_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            text = self._entries.get(key)
+            if text is not None:
+                self._entries.move_to_end(key)
+            return text
+
+    def put(self, key, text):
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= entry_size(key, previous)
+            self._entries[key] = text
+            self.size += entry_size(key, text)
+            while self.size > self.max_bytes and self._entries:
+                old_key, old_text = self._entries.popitem(last=False)
+                self.size -= entry_size(old_key, old_text)
+
+
+# Persistent tier in a Mongo collection; least recently used entries are removed
+# once the stored text exceeds max_bytes
+class MongoTier:
+    def __init__(self, collection, max_bytes=TRANSCRIPT_CACHE_MAX_BYTES):
+        self.collection = collection
+        self.max_bytes = max_bytes
+        self.size = None  # Counted (and the eviction index created) on first write
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        document = self.collection.find_one_and_update(
+            {'_id': key}, {'$set': {'last_used': datetime.utcnow()}}, {'text': 1}
+        )
+        return document['text'] if document else None
+
+    def put(self, key, text):
+        size = entry_size(key, text)
+        result = self.collection.update_one(
+            {'_id': key},
+            {'$set': {'text': text, 'size': size, 'last_used': datetime.utcnow()}},
+            upsert=True
+        )
+        with self._lock:
+            if self.size is None:
+                self.collection.create_index([('last_used', pymongo.ASCENDING)])
+                totals = list(self.collection.aggregate([{'$group': {'_id': None, 'size': {'$sum': '$size'}}}]))
+                self.size = totals[0]['size'] if totals else 0
+            elif result.upserted_id is not None:
+                self.size += size
+            while self.size > self.max_bytes:
+                oldest = self.collection.find({}, {'size': 1}).sort('last_used', pymongo.ASCENDING).limit(EVICTION_BATCH)
+                evicted = []
+                for entry in oldest:
+                    if self.size <= self.max_bytes:
+                        break
+                    evicted.append(entry['_id'])
+                    self.size -= entry.get('size', 0)
+                if not evicted:
+                    break
+                self.collection.delete_many({'_id': {'$in': evicted}})
+
+
+# Persistent tier as one file per entry; least recently used files (by mtime)
+# are removed once the directory exceeds max_bytes
+class DiskTier:
+    def __init__(self, directory=TRANSCRIPT_CACHE_DIR, max_bytes=TRANSCRIPT_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.size = sum(entry.stat().st_size for entry in os.scandir(directory) if entry.is_file())
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest() + '.txt')
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, encoding='utf-8') as f:
+                text = f.read()
+            os.utime(path)  # Mark as recently used
+            return text
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, text):
+        path = self._path(key)
+        temporary = f"{path}.{threading.get_ident()}.tmp"
+        with open(temporary, 'w', encoding='utf-8') as f:
+            f.write(text)
+        with self._lock:
+            replaced = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(temporary, path)
+            self.size += os.path.getsize(path) - replaced
+            if self.size > self.max_bytes:
+                self._evict()
+
+    # Caller must hold the lock
+    def _evict(self):
+        entries = sorted((entry for entry in os.scandir(self.directory) if entry.name.endswith('.txt')),
+                         key=lambda entry: entry.stat().st_mtime)
+        for entry in entries:
+            if self.size <= self.max_bytes:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                self.size -= size
+            except FileNotFoundError:
+                pass
+
+
+# Two-tier transcript cache: the in-process LRU in front of an optional persistent
+# tier. Concurrent requests for the same key share one computation.
+class TranscriptCache:
+    def __init__(self, persistent=None, memory_bytes=TRANSCRIPT_CACHE_MEMORY_BYTES):
+        self.memory = MemoryTier(memory_bytes)
+        self.persistent = persistent
+        self.hits = 0
+        self.misses = 0
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        text = self.memory.get(key)
+        if text is None and self.persistent is not None:
+            text = self.persistent.get(key)
+            if text is not None:
+                self.memory.put(key, text)
+        with self._lock:
+            if text is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return text
+
+    # The cache is best-effort: a failed write to the persistent tier is logged, not raised
+    def put(self, key, text):
+        self.memory.put(key, text)
+        if self.persistent is not None:
+            try:
+                self.persistent.put(key, text)
+            except Exception:
+                logger.warning("Could not write transcript %s to the persistent cache", key, exc_info=True)
+
+    # Return the cached text for key, or compute and cache it. Failures are not cached.
+    def get_or_compute(self, key, compute):
+        text = self.get(key)
+        if text is not None:
+            return text
+
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+        if not owner:
+            return future.result()
+
+        try:
+            text = compute()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(text)  # Waiters get the text even if caching it fails
+            self.put(key, text)
+            return text
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+
+# Function to create the configured cache; db is needed for the mongo tier
+def create_cache(db=None, kind=TRANSCRIPT_CACHE):
+    if kind == 'off':
+        return None
+    if kind == 'mongo':
+        return TranscriptCache(MongoTier(db['transcript_cache']))
+    if kind == 'disk':
+        return TranscriptCache(DiskTier())
+    if kind == 'memory':
+        return TranscriptCache()
+    raise ValueError(f"Unknown TRANSCRIPT_CACHE '{kind}'; choose mongo, disk, memory or off")
+
+
+# Function to estimate the bytes an entry takes
+def entry_size(key, text):
+    return len(key) + len(text.encode('utf-8'))
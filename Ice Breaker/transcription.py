@@ -0,0 +1,268 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+import numpy as np
+
+from audio import find_pause, split_on_silence, split_samples, to_audio_data, trim_silence, VAD_ENABLED
+from metrics import STT_FAILURES
+
+# Transcription settings
+STT_MAX_WORKERS = int(os.getenv('STT_MAX_WORKERS', '4'))  # Chunks recognized at once across all requests
+STT_CHUNK_TIMEOUT = float(os.getenv('STT_CHUNK_TIMEOUT', '30'))  # Seconds allowed per recognition attempt
+STT_MAX_RETRIES = int(os.getenv('STT_MAX_RETRIES', '2'))  # Extra attempts after a failed request
+STT_RETRY_BACKOFF = float(os.getenv('STT_RETRY_BACKOFF', '0.5'))  # Base delay, doubled on every retry
+STREAM_CHUNK_LENGTH = float(os.getenv('STREAM_CHUNK_LENGTH', '10'))  # Seconds per chunk while audio is still arriving
+
+# Shared pool so the number of in-flight recognizer calls stays bounded
+# no matter how many requests are transcribing at once
+_executor = ThreadPoolExecutor(max_workers=STT_MAX_WORKERS, thread_name_prefix='stt')
+_backlog = 0  # Chunks submitted to the pool that have not started yet
+_stalled = 0  # Chunks whose caller gave up on them but which still hold a worker
+_backlog_lock = threading.Lock()
+
+
+# Raised once every chunk is collected if any of them could not be recognized, so
+# a transcript with missing words is never scored. texts holds what was recognized,
+# failed the indexes of the missing chunks, and retry_after the seconds the
+# recognizer asked callers to wait, when it did.
+class IncompleteTranscript(Exception):
+    def __init__(self, texts, failed, retry_after=None):
+        super().__init__(f"{len(failed)} of {len(texts)} chunks could not be recognized")
+        self.texts = texts
+        self.failed = failed
+        self.retry_after = retry_after
+
+
+# Function to get the number of chunks waiting for a free recognizer. A call that
+# ran past its deadline keeps its worker until the recognizer returns (a thread
+# can't be interrupted), so it still counts here rather than as a free slot.
+def backlog():
+    return _backlog + _stalled
+
+
+# Function to recognize one chunk, retrying retryable errors with exponential backoff
+def transcribe_with_retry(recognize, chunk, retry_on=(Exception,),
+                          max_retries=STT_MAX_RETRIES, backoff=STT_RETRY_BACKOFF):
+    attempt = 0
+    while True:
+        try:
+            return recognize(chunk)
+        except retry_on as e:
+            if attempt >= max_retries:
+                raise
+            delay = backoff * (2 ** attempt)
+            print(f"Transcription attempt {attempt + 1} failed ({e}); retrying in {delay:.1f}s")
+            time.sleep(delay)
+            attempt += 1
+
+
+# Tracks when a queued chunk actually starts so its deadline excludes time spent waiting for a worker
+class _ChunkJob:
+    def __init__(self, recognize, chunk, retry_on, max_retries, backoff):
+        self.started = None
+        self._finished = False
+        self._abandoned = False
+        self._args = (recognize, chunk, retry_on, max_retries, backoff)
+
+    def __call__(self):
+        global _backlog, _stalled
+        self.started = time.monotonic()
+        with _backlog_lock:
+            _backlog -= 1
+        try:
+            return transcribe_with_retry(*self._args)
+        finally:
+            with _backlog_lock:
+                self._finished = True
+                if self._abandoned:
+                    _stalled -= 1
+
+    # Called when the caller stops waiting; the worker stays busy until the call returns
+    def abandon(self):
+        global _stalled
+        with _backlog_lock:
+            if not self._finished and not self._abandoned:
+                self._abandoned = True
+                _stalled += 1
+
+
+# Function to queue one chunk on the shared pool; returns a handle for collect_transcripts.
+# on_done(text) is called from the pool as soon as the chunk is recognized.
+def submit_chunk(recognize, chunk, retry_on=(Exception,), max_retries=STT_MAX_RETRIES,
+                 backoff=STT_RETRY_BACKOFF, on_done=None):
+    global _backlog
+    job = _ChunkJob(recognize, chunk, retry_on, max_retries, backoff)
+    with _backlog_lock:
+        _backlog += 1
+    future = _executor.submit(job)
+    if on_done:
+        future.add_done_callback(_notify(on_done))
+    return job, future
+
+
+# Function to wrap a result callback as a future callback that skips failed chunks
+def _notify(on_done):
+    def done(future):
+        if future.cancelled() or future.exception() is not None:
+            return
+        try:
+            on_done(future.result())
+        except Exception as e:
+            print(f"Chunk callback failed: {e}")
+    return done
+
+
+# Function to wait for submitted chunks and return their texts in order.
+# Raises IncompleteTranscript if a chunk keeps failing or runs past its deadline.
+# The deadline only bounds how long the caller waits: a hung call is ended by the
+# recognizer's own request timeout (GoogleBackend sets it to STT_CHUNK_TIMEOUT per
+# attempt), and until then its worker counts towards backlog().
+def collect_transcripts(submitted, timeout=STT_CHUNK_TIMEOUT, max_retries=STT_MAX_RETRIES,
+                        backoff=STT_RETRY_BACKOFF):
+    # Every attempt gets its own timeout plus the backoff sleeps in between
+    budget = timeout * (max_retries + 1) + backoff * (2 ** max_retries)
+
+    texts = []
+    failed = []
+    retry_after = None
+    for i, (job, future) in enumerate(submitted):
+        while True:
+            started = job.started
+            wait = budget if started is None else started + budget - time.monotonic()
+            try:
+                texts.append(future.result(timeout=max(wait, 0)))
+            except TimeoutError:
+                if started is None:
+                    continue  # Still queued behind other chunks; its clock hasn't started
+                print(f"Transcription of chunk {i} timed out")
+                job.abandon()
+                STT_FAILURES.inc(reason='timeout')
+                texts.append("")
+                failed.append(i)
+            except Exception as e:
+                print(f"Transcription of chunk {i} failed: {e}")
+                # Chunks refused by admission control (see admission.py) carry their own reason
+                STT_FAILURES.inc(reason=getattr(e, 'reason', 'gave_up'))
+                texts.append("")
+                failed.append(i)
+                if getattr(e, 'retry_after', None):
+                    retry_after = max(retry_after or 0, e.retry_after)
+            break
+    if failed:
+        raise IncompleteTranscript(texts, failed, retry_after)
+    return texts
+
+
+# Function to transcribe chunks concurrently, returning the texts in chunk order.
+# on_chunk(index, text) reports each chunk as it finishes, in completion order.
+def transcribe_chunks(chunks, recognize, retry_on=(Exception,), timeout=STT_CHUNK_TIMEOUT,
+                      max_retries=STT_MAX_RETRIES, backoff=STT_RETRY_BACKOFF, on_chunk=None):
+    submitted = [
+        submit_chunk(recognize, chunk, retry_on, max_retries, backoff,
+                     on_done=_bind_index(on_chunk, index) if on_chunk else None)
+        for index, chunk in enumerate(chunks)
+    ]
+    return collect_transcripts(submitted, timeout, max_retries, backoff)
+
+
+def _bind_index(on_chunk, index):
+    return lambda text: on_chunk(index, text)
+
+
+# Transcribes audio while it is still arriving: uploaded PCM blocks are appended
+# to a buffer and every time a chunk's worth has built up it is cut at a pause
+# and sent to the pool, so only the tail is left to recognize when the stream ends
+class StreamingTranscriber:
+    def __init__(self, recognize, sample_rate, chunk_length=STREAM_CHUNK_LENGTH,
+                 retry_on=(Exception,), max_seconds=None, on_chunk=None):
+        self.recognize = recognize
+        self.on_chunk = on_chunk  # on_chunk(index, text) as each chunk is recognized
+        self.sample_rate = sample_rate
+        self.chunk_length = chunk_length
+        self.retry_on = retry_on
+        self.max_bytes = int(max_seconds * sample_rate) * 2 if max_seconds else None
+
+        self._buffer = bytearray()  # int16 PCM at sample_rate
+        self._cut = 0  # Byte offset of the first sample not yet sent for transcription
+        self._next_seq = 0
+        self._early = {}  # Blocks that arrived ahead of a missing sequence number
+        self._submitted = []
+        self._finished = False
+        self._lock = threading.Lock()
+
+    @property
+    def seconds(self):
+        return len(self._buffer) / 2 / self.sample_rate
+
+    # Append a block of int16 PCM. Blocks are ordered by seq and repeats are
+    # ignored, so clients can retry uploads. Returns False for a repeat.
+    def feed(self, pcm, seq=None):
+        with self._lock:
+            if self._finished:
+                raise RuntimeError("Stream has already finished")
+            if seq is None:
+                seq = self._next_seq
+            if seq < self._next_seq or seq in self._early:
+                return False
+
+            size = len(self._buffer) + sum(len(block) for block in self._early.values()) + len(pcm)
+            if self.max_bytes and size > self.max_bytes:
+                raise ValueError("Stream is longer than allowed")
+
+            self._early[seq] = pcm
+            while self._next_seq in self._early:
+                self._buffer.extend(self._early.pop(self._next_seq))
+                self._next_seq += 1
+
+            self._submit_ready()
+            return True
+
+    # Close the stream, send the remaining audio and wait for every chunk
+    def finish(self):
+        with self._lock:
+            if not self._finished:
+                self._finished = True
+                # Anything after a gap that never got filled is still appended in order
+                for seq in sorted(self._early):
+                    self._buffer.extend(self._early.pop(seq))
+
+                tail = self._pending()
+                if VAD_ENABLED:
+                    chunks = split_on_silence(tail, self.sample_rate, self.chunk_length)
+                else:
+                    chunks = split_samples(tail, self.sample_rate, self.chunk_length)
+                for chunk in chunks:
+                    self._submit(chunk)
+                self._cut = len(self._buffer)
+
+        return collect_transcripts(self._submitted)
+
+    # All audio received so far as int16 PCM bytes
+    def pcm(self):
+        with self._lock:
+            return bytes(self._buffer)
+
+    # Caller must hold the lock. Copies the untranscribed tail, which is at most
+    # about one chunk, so the bytearray can keep growing underneath.
+    def _pending(self):
+        return np.frombuffer(bytes(self._buffer[self._cut:]), dtype='<i2')
+
+    # Caller must hold the lock
+    def _submit_ready(self):
+        while True:
+            pending = self._pending()
+            cut = find_pause(pending, self.sample_rate, self.chunk_length)
+            if cut is None:
+                return
+            chunk = trim_silence(pending[:cut], self.sample_rate) if VAD_ENABLED else pending[:cut]
+            if chunk is not None:
+                self._submit(chunk)
+            self._cut += cut * 2
+
+    # Caller must hold the lock
+    def _submit(self, samples):
+        audio_data = to_audio_data(samples, self.sample_rate)
+        on_done = _bind_index(self.on_chunk, len(self._submitted)) if self.on_chunk else None
+        self._submitted.append(submit_chunk(self.recognize, audio_data, self.retry_on, on_done=on_done))
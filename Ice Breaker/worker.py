@@ -0,0 +1,237 @@
+import argparse
+import os
+import signal
+import threading
+import time
+from datetime import datetime, timedelta
+
+from jobs import FAILED, worker_name
+from repository import WRITE_BATCH_SIZE, WRITE_BATCH_DELAY
+
+# Processes the recordings queued in the jobs collection (see jobs.py) with the
+# same transcription and scoring code the web app uses.
+#
+#   python worker.py [--threads 2] [--sweep-interval 60] [--once]
+#
+# Start as many workers as the STT quota and CPUs allow, on any machine that
+# reaches the database; they share the queue through Mongo. A worker that dies
+# mid-job loses its lease and another one retries the job. Workers also sweep
+# for recordings that never got a score (a crash mid-request, a failed session)
+# and queue them.
+
+# Worker settings
+WORKER_THREADS = int(os.getenv('WORKER_THREADS', '2'))  # Jobs processed at once per worker process
+WORKER_POLL_INTERVAL = float(os.getenv('WORKER_POLL_INTERVAL', '1'))  # Seconds an idle thread waits before asking again
+SWEEP_INTERVAL = int(os.getenv('SWEEP_INTERVAL', '60'))  # Seconds between sweeps for unscored recordings (0 = off)
+SWEEP_GRACE = int(os.getenv('SWEEP_GRACE', '600'))  # Age an unscored recording must reach before it is queued
+SWEEP_BATCH = 500  # Recordings queued per sweep at most
+
+
+# Leases jobs on a few threads and renews the leases while they run.
+# process(record_id) does the work; it returns None when the recording is gone.
+# admit() returns the seconds to hold off leasing (speech recognition is
+# overloaded or failing), or 0 to go ahead. When process only queues its results
+# for a batched write, flush() writes them: jobs stay leased until their batch is
+# flushed, so a crash before the write leaves them to be retried.
+class Worker:
+    def __init__(self, queue, process, threads=WORKER_THREADS, poll_interval=WORKER_POLL_INTERVAL, admit=None,
+                 flush=None, batch_size=WRITE_BATCH_SIZE, max_delay=WRITE_BATCH_DELAY):
+        self.queue = queue
+        self.process = process
+        self.admit = admit
+        self.flush = flush
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.name = worker_name()
+        self.threads = threads
+        self.poll_interval = poll_interval
+        self.completed = 0
+        self.failed = 0
+        self._held = set()  # Ids of the jobs this worker is running or waiting to complete
+        self._finished = []  # Processed jobs whose results are waiting in the batch
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._complete_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+
+    # Lease and run one job; False when none was available
+    def run_one(self):
+        job = self.queue.lease(self.name)
+        if job is None:
+            return False
+
+        with self._lock:
+            self._held.add(job['_id'])
+        try:
+            if job['attempts'] > self.queue.max_attempts:
+                # Every lease so far ran out: whatever runs this job dies or stalls on it
+                raise RuntimeError('Lease expired on every attempt')
+            if self.process(job['record_id']) is None:
+                print(f"Job {job['_id']}: recording not found, nothing to do")
+        except Exception as e:
+            with self._lock:
+                self._held.discard(job['_id'])
+            state = self.queue.fail(job, e, getattr(e, 'retry_after', None))
+            with self._lock:
+                self.failed += 1
+            retry = 'given up' if state == FAILED else 'will retry'
+            print(f"Job {job['_id']} failed on attempt {job['attempts']} ({retry}): {e}")
+            return True
+
+        if self.flush is None:
+            self._complete([job])
+            return True
+        with self._lock:
+            self._finished.append(job)
+            full = len(self._finished) >= self.batch_size
+        if full:
+            self.complete_finished()
+        return True
+
+    # Write the batched results, then mark the jobs behind them done; returns how many were.
+    # If the write fails the jobs wait for the next attempt, their leases still renewed.
+    def complete_finished(self):
+        with self._complete_lock:
+            with self._lock:
+                jobs, self._finished = self._finished, []
+            self._last_flush = time.monotonic()
+            if not jobs:
+                return 0
+            try:
+                self.flush()
+            except Exception:
+                with self._lock:
+                    self._finished[:0] = jobs
+                raise
+            self._complete(jobs)
+            return len(jobs)
+
+    def _complete(self, jobs):
+        for job in jobs:
+            if self.queue.complete(job):
+                with self._lock:
+                    self.completed += 1
+            else:
+                print(f"Job {job['_id']} finished after its lease ran out; another worker may repeat it")
+            with self._lock:
+                self._held.discard(job['_id'])
+
+    # Run jobs until there are none left; returns how many ran
+    def drain(self):
+        count = 0
+        while self.run_one():
+            count += 1
+        if self.flush:
+            self.complete_finished()
+        return count
+
+    def _loop(self):
+        while not self._stop.is_set():
+            wait = self.admit() if self.admit else 0
+            if wait:
+                # Leave the jobs queued rather than fail them against a recognizer that refuses work
+                self._stop.wait(wait)
+                continue
+            try:
+                ran = self.run_one()
+            except Exception as e:
+                print(f"Leasing a job failed: {e}")
+                ran = False
+            if self.flush and (not ran or time.monotonic() - self._last_flush >= self.max_delay):
+                try:
+                    self.complete_finished()
+                except Exception as e:
+                    print(f"Writing batched results failed: {e}")
+            if not ran:
+                self._stop.wait(self.poll_interval)
+
+    # Renew held leases well before they run out
+    def _heartbeat(self):
+        while not self._stop.wait(self.queue.visibility_timeout / 3):
+            with self._lock:
+                held = list(self._held)
+            try:
+                self.queue.extend(held, self.name)
+            except Exception as e:
+                print(f"Renewing leases failed: {e}")
+
+    def start(self):
+        self._threads = [threading.Thread(target=self._loop, name=f'worker-{i}') for i in range(self.threads)]
+        self._threads.append(threading.Thread(target=self._heartbeat, name='heartbeat', daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    # Stop leasing and wait for the running jobs to finish
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            if not thread.daemon:
+                thread.join()
+        if self.flush:
+            self.complete_finished()
+
+
+# Function to queue recordings older than grace seconds that have no score; returns how many were found.
+# Jobs that already exist, failed ones included, are left as they are. Swept recordings
+# are marked so the next sweep moves on to newer ones instead of finding them again.
+def sweep(recordings, queue, grace=SWEEP_GRACE, limit=SWEEP_BATCH):
+    record_ids = recordings.unscored(datetime.now() - timedelta(seconds=grace), limit)
+    for record_id in record_ids:
+        queue.enqueue(record_id, requeue=False)
+    recordings.mark_queued(record_ids)
+    return len(record_ids)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Process queued recordings')
+    parser.add_argument('--threads', type=int, default=WORKER_THREADS, help='Jobs processed at once')
+    parser.add_argument('--sweep-interval', type=int, default=SWEEP_INTERVAL,
+                        help='Seconds between sweeps for unscored recordings (0 = off)')
+    parser.add_argument('--once', action='store_true', help='Sweep once, process every available job and exit')
+    args = parser.parse_args()
+
+    # The app module holds the configured STT backend, transcript cache, prompts and
+    # rollups; importing it does not start the web server
+    import app
+
+    app.load_prompt_registry()
+    app.job_queue.ensure_indexes()
+    app.recordings.ensure_indexes()
+    app.leaderboard.warm()
+    # Results are written in bulk; each job is completed once its batch is written
+    worker = Worker(app.job_queue, lambda record_id: app.process_recording(record_id, batched=True), args.threads,
+                    admit=app.stt_retry_after, flush=app.result_batcher.flush)
+
+    if args.once:
+        found = sweep(app.recordings, app.job_queue)
+        count = worker.drain()
+        app.leaderboard.sync()
+        app.leaderboard.persist()
+        print(f"Swept {found} unscored recordings; ran {count} jobs ({worker.failed} failed)")
+    else:
+        app.leaderboard.start()
+        worker.start()
+        print(f"Worker {worker.name} processing with {args.threads} threads")
+
+        stopping = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: stopping.set())
+        last_sweep = float('-inf')
+        try:
+            while not stopping.wait(1):
+                if args.sweep_interval and time.monotonic() - last_sweep >= args.sweep_interval:
+                    last_sweep = time.monotonic()
+                    try:
+                        found = sweep(app.recordings, app.job_queue)
+                        if found:
+                            print(f"Queued {found} unscored recordings")
+                    except Exception as e:
+                        print(f"Sweep failed: {e}")
+        except KeyboardInterrupt:
+            pass
+
+        print("Stopping; waiting for running jobs to finish")
+        worker.stop()
+        app.leaderboard.sync()
+        app.leaderboard.persist()
+        print(f"Ran {worker.completed + worker.failed} jobs ({worker.failed} failed)")